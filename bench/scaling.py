@@ -0,0 +1,241 @@
+"""How sustained fps scales with the number of cores.
+
+Runs the capture node pipeline pinned to 1, 2, ... cores and reports
+frames/sec for each core count, for both pipelines of
+new_running_client.py:
+
+    threads    one process (bench.throughput.run_case), frames pickled to
+               the encoder processes
+    processes  capture, detection, encoding and upload in processes of
+               their own, frames passed through a shared-memory FrameRing
+               (smartspace.pipeline)
+
+Every case runs in a fresh process restricted to its cores with
+os.sched_setaffinity, which every stage it forks inherits; worker counts
+default to the number of cores. The VDMS stand-in runs unpinned (point
+--server at a real one to keep it off the node entirely).
+
+    python -m bench.scaling --resolution 4656x3496 --cores 1,2,3,4 \\
+        --frames 60 --output scaling.json
+"""
+
+import os
+import json
+import time
+import resource
+import platform
+import argparse
+import multiprocessing
+
+from smartspace.encoding import FrameEncoder, UPLOAD_CODECS
+from smartspace.frame_ring import FrameRing
+from smartspace.pipeline import CaptureProcess, DetectorPool, UploadProcess
+from smartspace.sources import SyntheticSource
+
+from . import throughput, vdms_standin
+
+_context = multiprocessing.get_context("fork")
+
+
+def run_processes_case(server, width, height, codec, cores, args):
+    """Pushes args.frames frames through the multi-process pipeline."""
+    detect_size = tuple(args.detectSize) if args.detectSize else None
+    planes = [((height, width, 3), "uint8")]
+    if detect_size:
+        planes.append(((detect_size[1], detect_size[0], 3), "uint8"))
+    ring = FrameRing(args.ringSlots, planes)
+
+    host, port = server.rsplit(":", 1)
+    sent = []
+    upload = UploadProcess([host], int(port), batch_size=args.batchSize,
+                           batch_bytes=args.batchBytes,
+                           batch_latency=args.batchLatency, spool_dir="",
+                           queue_size=args.queueSize, queue_policy="block",
+                           on_batch=lambda report: sent.append(report["nbytes"]))
+    upload.start()
+    detector = None
+    if args.model:
+        detector = DetectorPool({"model": args.model}, ring,
+                                args.detectWorkers or cores).start()
+    capture = CaptureProcess(SyntheticSource(width, height, 0, detect_size),
+                             ring).launch()
+    encoder = FrameEncoder(codec, args.quality, args.encodeWorkers or cores,
+                           ring=ring)
+    encoder.start()
+
+    def queue_encoded(fut):
+        encoded, _ = fut.result()
+        upload.put({"props": {"ID": "bench"}, "format": encoder.vdms_format,
+                    "queued_at": time.time()}, encoded)
+
+    # The clock starts with the first frame, once the source has rendered
+    # its frames, as in bench.throughput
+    capture.start()
+    capture.wait()
+    children_start = resource.getrusage(resource.RUSAGE_CHILDREN)
+    usage_start = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.time()
+    for i in range(args.frames):
+        if i:
+            capture.wait()
+        frame, detect_frame = capture.read()
+        if detector is not None:
+            detector.submit(i, detect_frame, block=True)
+        encoder.submit(frame).add_done_callback(queue_encoded)
+        del frame, detect_frame
+
+    capture.close()
+    if detector is not None:
+        detector.close()
+    encoder.close()
+    upload.close()
+    elapsed = time.time() - start
+    ring.close()
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    frames = upload.uploader_stats.get("frames_sent", 0)
+    cpu = ((usage.ru_utime - usage_start.ru_utime)
+           + (usage.ru_stime - usage_start.ru_stime)
+           + (children.ru_utime - children_start.ru_utime)
+           + (children.ru_stime - children_start.ru_stime))
+    return {
+        "frames": frames,
+        "seconds": round(elapsed, 3),
+        "fps": round(frames / elapsed, 3) if elapsed else 0.0,
+        "mbytes_per_sec": round(sum(sent) / 1e6 / elapsed, 3),
+        "cpu_seconds": round(cpu, 3),
+        "ring_mb": round(ring.nbytes / 1e6, 1),
+        "capture": capture.stats(),
+    }
+
+
+def run_threads_case(server, width, height, codec, cores, args):
+    """The threaded pipeline, via bench.throughput."""
+    case_args = argparse.Namespace(**dict(
+        vars(args), sourceFps=0, encodeWorkers=args.encodeWorkers or cores))
+    r = throughput.run_case(server, width, height, codec, args.quality,
+                            args.batchSize, case_args)
+    return {
+        "frames": r["frames"],
+        "seconds": r["seconds"],
+        "fps": r["fps"],
+        "mbytes_per_sec": r["mbytes_per_sec"],
+        "cpu_seconds": round(r["cpu_seconds"] + r["cpu_seconds_encoders"], 3),
+    }
+
+
+CASES = {"threads": run_threads_case, "processes": run_processes_case}
+
+
+def _pinned(cpus, results, fn, *fn_args):
+    os.sched_setaffinity(0, cpus)
+    results.put(fn(*fn_args))
+
+
+def run_pinned(cpus, fn, *fn_args):
+    """Runs fn in a child process restricted to cpus; returns its result."""
+    results = _context.Queue()
+    # Not a daemon: the cases fork stages of their own
+    process = _context.Process(target=_pinned, args=(cpus, results, fn) + fn_args)
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def _serve(port, latency, bandwidth):
+    server = vdms_standin.StandinServer(("127.0.0.1", port), latency,
+                                        bandwidth, keep_blobs=False)
+    server.serve_forever()
+
+
+def main():
+    available = sorted(os.sched_getaffinity(0))
+    parser = argparse.ArgumentParser(
+        description="Capture node fps against core count",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--resolution', default="4656x3496", help='WIDTHxHEIGHT')
+    parser.add_argument('--codec', default="jpg", choices=UPLOAD_CODECS)
+    parser.add_argument('--quality', type=int, default=None,
+                        help='Codec quality, defaults to the codec default.')
+    parser.add_argument('--cores', default=",".join(str(n + 1) for n in range(len(available))),
+                        help='Comma separated core counts.')
+    parser.add_argument('--pipelines', default="threads,processes",
+                        help='Comma separated pipelines (threads, processes).')
+    parser.add_argument('--frames', type=int, default=40,
+                        help='Frames pushed through each case.')
+    parser.add_argument('--ringSlots', type=int, default=8)
+    parser.add_argument('--encodeWorkers', type=int, default=0,
+                        help='Encoder processes, 0 for one per core.')
+    parser.add_argument('--detectWorkers', type=int, default=0,
+                        help='Landmarker processes, 0 for one per core.')
+    parser.add_argument('--batchSize', type=int, default=8)
+    parser.add_argument('--batchBytes', type=int, default=64 * 1024 * 1024)
+    parser.add_argument('--batchLatency', type=float, default=2.0)
+    parser.add_argument('--queueSize', type=int, default=32)
+    parser.add_argument('--detectSize', type=int, nargs=2, default=None,
+                        metavar=('WIDTH', 'HEIGHT'),
+                        help='Low-res detection frame size.')
+    parser.add_argument('--model', default=None,
+                        help='Face landmarker model; enables the detect stage.')
+    parser.add_argument('--serverLatency', type=float, default=0.0,
+                        help='Seconds the stand-in waits before replying.')
+    parser.add_argument('--serverBandwidth', type=float, default=0.0,
+                        help='Stand-in link bandwidth in bytes/sec, 0 unlimited.')
+    parser.add_argument('--server', default=None,
+                        help='HOST:PORT of a real server instead of the stand-in.')
+    parser.add_argument('--output', default=None,
+                        help='Write results as JSON to this file.')
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.resolution.lower().split("x"))
+    core_counts = [int(n) for n in args.cores.split(",")]
+    if max(core_counts) > len(available):
+        parser.error(f"Only {len(available)} cores available")
+
+    server_proc = None
+    server = args.server
+    if server is None:
+        port = 56556
+        server_proc = _context.Process(
+            target=_serve, args=(port, args.serverLatency, args.serverBandwidth),
+            daemon=True)
+        server_proc.start()
+        time.sleep(0.5)
+        server = f"127.0.0.1:{port}"
+
+    results = []
+    try:
+        for pipeline in args.pipelines.split(","):
+            single = None
+            for cores in core_counts:
+                r = run_pinned(set(available[:cores]), CASES[pipeline], server,
+                               width, height, args.codec, cores, args)
+                r.update(pipeline=pipeline, cores=cores)
+                if single is None:
+                    single = r["fps"]
+                r["speedup"] = round(r["fps"] / single, 2) if single else 0.0
+                results.append(r)
+                print(f"{pipeline:>9} {cores:>2} cores {r['fps']:7.2f} fps "
+                      f"x{r['speedup']:.2f} {r['mbytes_per_sec']:7.2f} MB/s "
+                      f"cpu={r['cpu_seconds']:.1f}s")
+    finally:
+        if server_proc is not None:
+            server_proc.terminate()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "host": platform.node(),
+                "machine": platform.machine(),
+                "python": platform.python_version(),
+                "cpus": len(available),
+                "args": vars(args),
+                "results": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Local stand-ins for the stats endpoints of capture nodes.
+
+Serves one /stats (and /metrics) endpoint per simulated node, with the
+same counters, timers and gauges new_running_client reports, so
+`control.py --status` can be tried without the Pis:
+
+    python -m bench.status_standin --nodes 3 --port 18765
+    python control.py --status 2 --statusUrls http://127.0.0.1:18765 \
+        http://127.0.0.1:18766 http://127.0.0.1:18767
+"""
+
+import time
+import random
+import argparse
+import threading
+
+from smartspace.stats import Stats, StatsServer
+
+
+class SimulatedNode(object):
+    """Feeds a Stats registry with a capture node's metrics at fps."""
+
+    def __init__(self, node_id: str, fps: float = 1.0, batch_size: int = 8,
+                 upload_latency: float = 0.2, seed: int = None):
+        self.fps = fps
+        self.batch_size = batch_size
+        self.upload_latency = upload_latency
+        self.random = random.Random(seed)
+
+        self.backlog = 0
+        self.dropped = 0
+        self.disk = self.random.uniform(20, 60)
+
+        self.stats = Stats()
+        self.stats.label("id", node_id)
+        self.stats.gauge("queue_depth", lambda: self.backlog)
+        self.stats.gauge("upload_backlog", lambda: self.backlog)
+        self.stats.gauge("dropped_frames", lambda: self.dropped)
+        self.stats.gauge("detect_fps", lambda: round(self.fps * self.random.uniform(0.9, 1.1), 2))
+        self.stats.gauge("disk_used_pct", lambda: round(self.disk, 1))
+
+    def step(self):
+        self.stats.incr("frames_captured")
+        self.stats.record("capture", self.random.uniform(0.01, 0.03))
+        self.stats.record("detect", self.random.uniform(0.03, 0.08))
+        self.backlog += 1
+        self.disk = min(100.0, self.disk + 0.001)
+        if self.backlog >= self.batch_size:
+            # An occasional slow link lets the backlog build up
+            if self.random.random() < 0.1:
+                if self.backlog > 4 * self.batch_size:
+                    self.dropped += 1
+                    self.backlog -= 1
+                return
+            self.stats.record("vdms_round_trip",
+                              self.random.expovariate(1 / self.upload_latency))
+            self.stats.incr("frames_sent", self.batch_size)
+            self.backlog -= self.batch_size
+
+    def run(self):
+        while True:
+            time.sleep(1 / self.fps)
+            self.step()
+
+
+def start(nodes: int, host: str = "127.0.0.1", port: int = 18765, fps: float = 1.0):
+    """Starts the simulated nodes and their endpoints; returns the URLs."""
+    urls = []
+    for i in range(nodes):
+        node = SimulatedNode(f"ss{i + 1}", fps, seed=i)
+        StatsServer(node.stats, host, port + i).start()
+        threading.Thread(target=node.run, name=f"node-{i + 1}", daemon=True).start()
+        urls.append(f"http://{host}:{port + i}")
+    return urls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in capture node stats endpoints")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18765,
+                        help="Port of the first node; the others follow")
+    parser.add_argument("--nodes", type=int, default=13)
+    parser.add_argument("--fps", type=float, default=1.0)
+    args = parser.parse_args()
+
+    urls = start(args.nodes, args.host, args.port, args.fps)
+    print("Stats stand-ins serving:")
+    print("    python control.py --status --statusUrls " + " ".join(urls))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""End-to-end throughput benchmark of the capture node pipeline.
+
+Runs source -> (detect) -> encode -> spool or queue -> batched upload,
+built from the same smartspace components as new_running_client.py,
+against a local VDMS stand-in with configurable latency and bandwidth.
+The spool path is the client's default (--spoolDir): frames are appended
+to an on-disk Spool and uploaded by BatchUploader.drain_spool(); the queue
+path is the in-memory FrameQueue and BatchUploader.run(). For every
+combination of upload path, resolution, codec and batch size it reports
+sustained frames/sec, per-stage latency percentiles, CPU time and RSS, and
+writes everything to JSON so a later run can be checked against it:
+
+    python -m bench.throughput --resolutions 4656x3496,1920x1080 \\
+        --codecs jpg,png --batchSizes 1,4,8 --frames 40 --output bench.json
+    python -m bench.throughput ... --baseline bench.json --tolerance 0.15
+"""
+
+import os
+import sys
+import json
+import time
+import resource
+import platform
+import shutil
+import argparse
+import tempfile
+import threading
+import multiprocessing
+
+import vdms
+from smartspace import FrameQueue, FrameEncoder, BatchUploader, Spool
+from smartspace.encoding import UPLOAD_CODECS
+from smartspace.sources import SyntheticSource
+
+from . import vdms_standin
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    s = sorted(samples)
+
+    def pick(q):
+        return s[min(len(s) - 1, int(q * len(s)))]
+
+    return {
+        "p50_ms": round(pick(0.50) * 1000, 2),
+        "p90_ms": round(pick(0.90) * 1000, 2),
+        "p99_ms": round(pick(0.99) * 1000, 2),
+        "max_ms": round(s[-1] * 1000, 2),
+        "n": len(s),
+    }
+
+
+def _rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+def _load_detector(model):
+    # Imported only when detection is benchmarked; mediapipe is heavy and
+    # not needed for the encode/upload path
+    import mediapipe as mp
+    from mediapipe.tasks import python
+    from mediapipe.tasks.python import vision
+
+    options = vision.FaceLandmarkerOptions(
+        base_options=python.BaseOptions(model_asset_path=model),
+        running_mode=vision.RunningMode.IMAGE,
+        output_face_blendshapes=True)
+    detector = vision.FaceLandmarker.create_from_options(options)
+
+    def detect(frame):
+        return detector.detect(mp.Image(image_format=mp.ImageFormat.SRGB, data=frame))
+
+    return detect, detector.close
+
+
+def run_case(server, width, height, codec, quality, batch_size, args,
+             upload="queue", spool_dir=None):
+    """Pushes args.frames frames through the pipeline; returns a result dict.
+
+    upload is "queue" or "spool"; the spool is created in a temporary
+    directory under spool_dir (default the system's) and removed after.
+    """
+    stages = {name: [] for name in
+              ("capture", "detect", "encode", "spool_write", "queue_wait",
+               "upload", "end_to_end")}
+    lock = threading.Lock()
+
+    source = SyntheticSource(width, height, args.sourceFps,
+                             tuple(args.detectSize) if args.detectSize else None)
+    source.start()
+    encoder = FrameEncoder(codec, quality, args.encodeWorkers)
+    encoder.start()
+    frame_queue = FrameQueue(args.queueSize, "block")
+    spool = None
+    if upload == "spool":
+        spool_path = tempfile.mkdtemp(prefix="bench-spool-", dir=spool_dir)
+        spool = Spool(spool_path)
+    capture_done = threading.Event()
+
+    db = vdms.vdms_pool([server], health_interval=0)
+    db.connect()
+
+    def on_batch(batch, nbytes, latency, response):
+        done = time.time()
+        with lock:
+            stages["upload"].append(latency)
+            for image in batch:
+                stages["queue_wait"].append(done - latency - image["queued_at"])
+                stages["end_to_end"].append(done - image["captured_at"])
+
+    uploader = BatchUploader(db, frame_queue, batch_size, args.batchBytes,
+                             args.batchLatency, on_batch=on_batch)
+    if spool is not None:
+        # As the client: everything spooled is uploaded once capture stops
+        upload_thread = threading.Thread(
+            target=uploader.drain_spool, args=(spool,),
+            kwargs={"stop": capture_done, "drain_timeout": float("inf")})
+    else:
+        upload_thread = threading.Thread(target=uploader.run)
+    upload_thread.start()
+
+    detect, close_detector = (None, None)
+    if args.model:
+        detect, close_detector = _load_detector(args.model)
+
+    def queue_encoded(captured_at, fut):
+        encoded, encode_time = fut.result()
+        with lock:
+            stages["encode"].append(encode_time)
+        meta = {"props": {"ID": "bench"}, "format": encoder.vdms_format,
+                "captured_at": captured_at, "queued_at": time.time()}
+        if spool is not None:
+            t = time.time()
+            spool.append(meta, encoded)
+            with lock:
+                stages["spool_write"].append(time.time() - t)
+        else:
+            frame_queue.put(dict(meta, image=encoded))
+
+    usage_start = resource.getrusage(resource.RUSAGE_SELF)
+    children_start = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.time()
+
+    for _ in range(args.frames):
+        t0 = time.time()
+        frame, detect_frame = source.read()
+        t1 = time.time()
+        stages["capture"].append(t1 - t0)
+        if detect is not None:
+            detect(detect_frame)
+            stages["detect"].append(time.time() - t1)
+        encoder.submit(frame).add_done_callback(
+            lambda fut, t=t0: queue_encoded(t, fut))
+
+    encoder.close()
+    frame_queue.close()
+    capture_done.set()
+    upload_thread.join()
+    elapsed = time.time() - start
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    if close_detector is not None:
+        close_detector()
+    db.close()
+    source.close()
+    dropped = frame_queue.dropped()
+    if spool is not None:
+        dropped = spool.evicted
+        spool.close()
+        shutil.rmtree(spool_path, ignore_errors=True)
+
+    sent = uploader.frames_sent
+    cpu = ((usage.ru_utime - usage_start.ru_utime)
+           + (usage.ru_stime - usage_start.ru_stime))
+    cpu_children = ((children.ru_utime - children_start.ru_utime)
+                    + (children.ru_stime - children_start.ru_stime))
+    return {
+        "upload": upload,
+        "resolution": f"{width}x{height}",
+        "codec": codec,
+        "quality": encoder.quality,
+        "batch_size": batch_size,
+        "frames": sent,
+        "seconds": round(elapsed, 3),
+        "fps": round(sent / elapsed, 3) if elapsed else 0.0,
+        "mbytes_per_sec": round(uploader.bytes_sent / 1e6 / elapsed, 3),
+        "mean_frame_kb": round(uploader.bytes_sent / 1e3 / sent, 1) if sent else 0.0,
+        "cpu_seconds": round(cpu, 3),
+        "cpu_seconds_encoders": round(cpu_children, 3),
+        "rss_mb": round(_rss_mb(), 1),
+        "peak_rss_mb": round(usage.ru_maxrss / 1e3, 1),
+        "peak_rss_encoders_mb": round(children.ru_maxrss / 1e3, 1),
+        "dropped": dropped,
+        "stages": {name: percentiles(v) for name, v in stages.items() if v},
+    }
+
+
+def case_key(result):
+    # Results from before the spool path were all through the queue
+    return (result.get("upload", "queue"), result["resolution"], result["codec"],
+            result["batch_size"])
+
+
+def compare(results, baseline_path, tolerance):
+    """Returns the cases whose fps fell more than tolerance below baseline."""
+    with open(baseline_path) as f:
+        baseline = {case_key(r): r for r in json.load(f)["results"]}
+    regressions = []
+    for r in results:
+        base = baseline.get(case_key(r))
+        if base and r["fps"] < base["fps"] * (1 - tolerance):
+            regressions.append((r, base))
+    return regressions
+
+
+def _serve(port, latency, bandwidth):
+    server = vdms_standin.StandinServer(("127.0.0.1", port), latency,
+                                        bandwidth, keep_blobs=False)
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Capture node throughput benchmark",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--uploads', default="spool,queue",
+                        help='Comma separated upload paths: spool (the client '
+                             'default) and queue (in-memory, --spoolDir "").')
+    parser.add_argument('--spoolDir', default=None,
+                        help='Where the spool path writes, defaults to the '
+                             'system temp directory.')
+    parser.add_argument('--resolutions', default="4656x3496,1920x1080",
+                        help='Comma separated WIDTHxHEIGHT list.')
+    parser.add_argument('--codecs', default="jpg,png",
+                        help='Comma separated codecs (jpg, png).')
+    parser.add_argument('--quality', type=int, default=None,
+                        help='Codec quality, defaults to the codec default.')
+    parser.add_argument('--batchSizes', default="1,4,8",
+                        help='Comma separated upload batch sizes.')
+    parser.add_argument('--frames', type=int, default=40,
+                        help='Frames pushed through each case.')
+    parser.add_argument('--sourceFps', type=float, default=0,
+                        help='Source frame rate, 0 for as fast as possible.')
+    parser.add_argument('--encodeWorkers', type=int, default=2)
+    parser.add_argument('--queueSize', type=int, default=32)
+    parser.add_argument('--batchBytes', type=int, default=64 * 1024 * 1024)
+    parser.add_argument('--batchLatency', type=float, default=2.0)
+    parser.add_argument('--detectSize', type=int, nargs=2, default=None,
+                        metavar=('WIDTH', 'HEIGHT'),
+                        help='Downscale frames for detection.')
+    parser.add_argument('--model', default=None,
+                        help='Face landmarker model; enables the detect stage.')
+    parser.add_argument('--serverLatency', type=float, default=0.0,
+                        help='Seconds the stand-in waits before replying.')
+    parser.add_argument('--serverBandwidth', type=float, default=0.0,
+                        help='Stand-in link bandwidth in bytes/sec, 0 unlimited.')
+    parser.add_argument('--server', default=None,
+                        help='HOST:PORT of a real server instead of the stand-in.')
+    parser.add_argument('--output', default=None,
+                        help='Write results as JSON to this file.')
+    parser.add_argument('--baseline', default=None,
+                        help='JSON results of an earlier run to compare fps with.')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='Allowed fractional fps drop against the baseline.')
+    args = parser.parse_args()
+    for codec in args.codecs.split(","):
+        if codec not in UPLOAD_CODECS:
+            parser.error(f"Codec {codec} cannot be uploaded to VDMS")
+    for upload in args.uploads.split(","):
+        if upload not in ("spool", "queue"):
+            parser.error(f"Unknown upload path: {upload}")
+
+    server_proc = None
+    server = args.server
+    if server is None:
+        # The stand-in runs in its own process so its CPU use is not
+        # charged to the pipeline
+        port = 56555
+        server_proc = multiprocessing.get_context("fork").Process(
+            target=_serve, args=(port, args.serverLatency, args.serverBandwidth),
+            daemon=True)
+        server_proc.start()
+        time.sleep(0.5)
+        server = f"127.0.0.1:{port}"
+
+    results = []
+    try:
+        cases = [(upload, res, codec, int(batch_size))
+                 for upload in args.uploads.split(",")
+                 for res in args.resolutions.split(",")
+                 for codec in args.codecs.split(",")
+                 for batch_size in args.batchSizes.split(",")]
+        for upload, res, codec, batch_size in cases:
+            width, height = (int(v) for v in res.lower().split("x"))
+            r = run_case(server, width, height, codec, args.quality,
+                         batch_size, args, upload, args.spoolDir)
+            results.append(r)
+            stages = " ".join(f"{k}={v['p50_ms']:.0f}/{v['p99_ms']:.0f}ms"
+                              for k, v in r["stages"].items())
+            print(f"{upload:>5} {r['resolution']:>10} {codec:>4} batch={batch_size:<3} "
+                  f"{r['fps']:7.2f} fps {r['mbytes_per_sec']:7.2f} MB/s "
+                  f"cpu={r['cpu_seconds'] + r['cpu_seconds_encoders']:.1f}s "
+                  f"rss={r['peak_rss_mb']:.0f}MB  p50/p99 {stages}")
+    finally:
+        if server_proc is not None:
+            server_proc.terminate()
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "host": platform.node(),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "args": vars(args),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for r, base in regressions:
+            print(f"REGRESSION {r['upload']} {r['resolution']} {r['codec']} "
+                  f"batch={r['batch_size']}: "
+                  f"{r['fps']:.2f} fps vs {base['fps']:.2f} baseline")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
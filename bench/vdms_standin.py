@@ -0,0 +1,225 @@
+"""Local stand-in for a VDMS server, for benchmarks and offline testing.
+
+Speaks the same 4-byte length + queryMessage framing as vdms.vdms and
+answers AddImage and FindImage from an in-memory store. Server latency and
+link bandwidth are configurable so the capture pipeline can be measured
+against a slow or distant server without one.
+
+    python -m bench.vdms_standin --port 55555 --latency 0.02 --bandwidth 12.5e6
+"""
+
+import json
+import time
+import socket
+import argparse
+import threading
+import socketserver
+
+from vdms import framing
+
+_OPS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+}
+
+
+class _ThrottledSocket(object):
+    """Wraps a socket so reads and writes together stay under a byte rate."""
+
+    CHUNK = 64 * 1024
+
+    def __init__(self, sock, bandwidth: float):
+        self.sock = sock
+        self.bandwidth = bandwidth
+        self._next = time.monotonic()
+
+    def _pace(self, n):
+        now = time.monotonic()
+        self._next = max(self._next, now) + n / self.bandwidth
+        if self._next > now:
+            time.sleep(self._next - now)
+
+    def recv_into(self, view, nbytes=0):
+        n = self.sock.recv_into(view, min(nbytes or len(view), self.CHUNK))
+        self._pace(n)
+        return n
+
+    def sendmsg(self, buffers):
+        sent = 0
+        for b in buffers:
+            mv = memoryview(b).cast("B")
+            for i in range(0, len(mv), self.CHUNK):
+                chunk = mv[i:i + self.CHUNK]
+                self.sock.sendall(chunk)
+                self._pace(len(chunk))
+                sent += len(chunk)
+        return sent
+
+
+def _matches(props, constraints):
+    for key, cond in (constraints or {}).items():
+        if key not in props:
+            return False
+        for op, value in zip(cond[0::2], cond[1::2]):
+            try:
+                if not _OPS[op](props[key], value):
+                    return False
+            except TypeError:
+                return False
+    return True
+
+
+# AddImage formats VDMS accepts
+IMAGE_FORMATS = ("jpg", "png", "tdb", "bin")
+
+
+class ImageStore(object):
+    """Thread-safe in-memory image store.
+
+    With keep_blobs False only properties are kept, so long benchmarks
+    don't hold every uploaded frame in RAM.
+    """
+
+    def __init__(self, keep_blobs: bool = True):
+        self.keep_blobs = keep_blobs
+        self.images = []
+        self.bytes_received = 0
+        self.lock = threading.Lock()
+
+    def add(self, props, blob):
+        with self.lock:
+            self.bytes_received += len(blob)
+            # Like VDMS, every image gets an _uniqueid clients can list
+            props = dict(props, _uniqueid=str(len(self.images)))
+            self.images.append((props, bytes(blob) if self.keep_blobs else b""))
+
+    def find(self, constraints, results):
+        with self.lock:
+            found = [img for img in self.images if _matches(img[0], constraints)]
+        sort = results.get("sort")
+        if sort:
+            key = sort["key"] if isinstance(sort, dict) else sort
+            reverse = isinstance(sort, dict) and sort.get("order") == "descending"
+            found.sort(key=lambda img: img[0].get(key), reverse=reverse)
+        if "limit" in results:
+            found = found[:results["limit"]]
+        return found
+
+
+def execute(store, commands, blobs):
+    """Runs a VDMS transaction against store. Returns (response, blobs).
+
+    Like VDMS, an AddImage with a format it does not know fails the whole
+    transaction: nothing is stored and the response is one error dict.
+    """
+    for command in commands:
+        (name, body), = command.items()
+        if name == "AddImage" and body.get("format", "jpg") not in IMAGE_FORMATS:
+            return {"status": -1, "FailedCommand": name,
+                    "info": f"Unsupported image format: {body['format']}"}, []
+
+    response = []
+    out_blobs = []
+    blob_iter = iter(blobs)
+    for command in commands:
+        (name, body), = command.items()
+        if name == "AddImage":
+            store.add(body.get("properties", {}), next(blob_iter, b""))
+            response.append({"AddImage": {"status": 0}})
+        elif name in ("FindImage", "FindEntity"):
+            results = body.get("results", {})
+            found = store.find(body.get("constraints"), results)
+            res = {"status": 0, "returned": len(found)}
+            if "count" in results:
+                res["count"] = len(found)
+            keys = results.get("list")
+            if keys:
+                res["entities"] = [{k: p[k] for k in keys if k in p} for p, _ in found]
+            if name == "FindImage" and body.get("blob", True):
+                out_blobs.extend(blob for _, blob in found)
+            response.append({name: res})
+        elif name == "CreateIndex":
+            # Finds are linear scans here; indexes only need to be accepted
+            response.append({name: {"status": 0}})
+        else:
+            response.append({name: {"status": -1,
+                                    "info": f"{name} not supported by stand-in"}})
+    return response, out_blobs
+
+
+class StandinServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, latency: float = 0.0, bandwidth: float = 0.0,
+                 keep_blobs: bool = True):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.store = ImageStore(keep_blobs)
+        self.queries = 0
+        super().__init__(address, _Handler)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server
+        conn = self.request
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if server.bandwidth > 0:
+            conn = _ThrottledSocket(conn, server.bandwidth)
+        while True:
+            try:
+                query, blobs = framing.recv_message(conn)
+            except (ConnectionError, OSError):
+                return
+            try:
+                response, out_blobs = execute(server.store, json.loads(query), blobs)
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                response, out_blobs = {"status": -1, "info": str(e)}, []
+            server.queries += 1
+            if server.latency > 0:
+                time.sleep(server.latency)
+            try:
+                framing.send_message(conn, response, out_blobs)
+            except OSError:
+                return
+
+
+def start(host="127.0.0.1", port=0, latency=0.0, bandwidth=0.0, keep_blobs=True):
+    """Starts a stand-in server on a background thread and returns it.
+
+    port 0 picks a free port; read it back from server.server_address.
+    """
+    server = StandinServer((host, port), latency, bandwidth, keep_blobs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local VDMS stand-in server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=55555)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds added before every response")
+    parser.add_argument("--bandwidth", type=float, default=0.0,
+                        help="Link bandwidth in bytes/sec, 0 for unlimited")
+    parser.add_argument("--noBlobs", action="store_true",
+                        help="Discard image data, keeping only properties")
+    args = parser.parse_args()
+
+    server = StandinServer((args.host, args.port), args.latency,
+                           args.bandwidth, not args.noBlobs)
+    print(f"VDMS stand-in listening on {args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+
+if __name__ == "__main__":
+    main()
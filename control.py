@@ -4,6 +4,11 @@ import sys
 import os
 import shutil
 import time
+import json
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
 # Define the list of hosts and credentials
 HOSTS = [
@@ -22,6 +27,90 @@ HOSTS = [
     {"hostname": "ss13.local", "username": "smartspace13", "password": "smartspace"},
 ]
 
+# One multiplexed SSH connection per host, reused by every command sent to
+# it for ControlPersist seconds, so fleet operations pay one handshake
+SSH_CONTROL_DIR = os.path.expanduser("~/.ssh/smartspace-control")
+SSH_OPTIONS = [
+    "-o", "ControlMaster=auto",
+    "-o", f"ControlPath={SSH_CONTROL_DIR}/%C",
+    "-o", "ControlPersist=120",
+    "-o", "ConnectTimeout=5",
+    # Hosts run in parallel, so there is no terminal to type a password
+    # into; SSH keys are required (ssh-copy-id)
+    "-o", "BatchMode=yes",
+]
+DEFAULT_TIMEOUT = 30
+
+# Port of the stats endpoint every new_running_client serves (--statsPort);
+# it only listens on the node's loopback, so it is read over SSH
+STATS_PORT = 8765
+
+# vdms servers - 10.8.1.150 (L), 10.8.1.149 (R)
+VDMS_SERVERS = ["10.8.1.150", "10.8.1.149"]
+VDMS_PORT = 55555
+
+
+def ssh_command(host, remote_command):
+    """
+    Returns the argument list running remote_command on host
+    """
+    os.makedirs(SSH_CONTROL_DIR, mode=0o700, exist_ok=True)
+    return ["ssh", *SSH_OPTIONS, f"{host['username']}@{host['hostname']}", remote_command]
+
+
+def run_on_host(host, command, timeout=None, stdin=None):
+    """
+    Runs command (a string, or a function of the host returning one) on one
+    host. Returns a result dict: hostname, ok, output, error, seconds
+    """
+    timeout = DEFAULT_TIMEOUT if timeout is None else timeout
+    start = time.time()
+    result = {"hostname": host["hostname"], "ok": False, "output": "", "error": ""}
+    try:
+        remote_command = command(host) if callable(command) else command
+        proc = subprocess.run(ssh_command(host, remote_command), input=stdin,
+                              capture_output=True, text=True, timeout=timeout)
+        result["ok"] = proc.returncode == 0
+        result["output"] = proc.stdout.strip()
+        result["error"] = proc.stderr.strip()
+        if not result["ok"] and not result["error"]:
+            result["error"] = f"exit status {proc.returncode}"
+    except subprocess.TimeoutExpired:
+        result["error"] = f"timed out after {timeout:g}s"
+    except Exception as e:
+        result["error"] = str(e)
+    result["seconds"] = time.time() - start
+    return result
+
+
+def run_on_fleet(command, hosts=None, timeout=None, stdin=None):
+    """
+    Runs command on every host concurrently and returns the results in
+    host order; takes as long as the slowest host (at most timeout)
+    """
+    hosts = HOSTS if hosts is None else hosts
+    with ThreadPoolExecutor(max_workers=len(hosts) or 1) as pool:
+        return list(pool.map(lambda host: run_on_host(host, command, timeout, stdin), hosts))
+
+
+def print_results(title, results):
+    """
+    Prints one row per host: status, time taken and first line of output
+    """
+    print(f"\n{title}")
+    width = max([len(r["hostname"]) for r in results] + [4])
+    print(f"{'HOST':<{width}}  {'STATUS':<6}  {'TIME':>6}  OUTPUT")
+    for r in results:
+        text = r["output"] if r["ok"] else (r["error"] or r["output"])
+        lines = text.splitlines()
+        first = lines[0] if lines else ""
+        if len(lines) > 1:
+            first += f" (+{len(lines) - 1} lines)"
+        status = "ok" if r["ok"] else "FAILED"
+        print(f"{r['hostname']:<{width}}  {status:<6}  {r['seconds']:>5.1f}s  {first}")
+    failed = sum(not r["ok"] for r in results)
+    print(f"{len(results) - failed}/{len(results)} hosts ok")
+
 def create_gnome_terminal_command():
     """
     Creates a gnome-terminal command that opens all SSH sessions in tabs
@@ -63,26 +152,26 @@ def start_all_clients():
 
 def stop_all_clients():
     """
-    Stops all running client processes by sending Ctrl+C and closing the terminals
+    Stops all running clients with Ctrl+C (SIGINT, so they flush their
+    queues and logs) and closes the terminals
     """
     try:
-        # Get all SSH processes for our hostnames
-        for host in HOSTS:
-            # Kill any existing SSH sessions to this host
-            hostname = host['hostname']
-            username = host['username']
-            
-            # Find and kill the SSH process
-            ps_command = f"ps aux | grep 'ssh {username}@{hostname}' | grep -v grep"
-            ps_output = subprocess.getoutput(ps_command)
-            
-            if ps_output:
-                print(f"Stopping session for {hostname}...")
-                # Extract PID and send SIGINT (Ctrl+C)
-                pid = ps_output.split()[1]
+        results = run_on_fleet(
+            # "[n]" keeps the pattern from matching the remote shell that
+            # runs this command, whose own command line contains it
+            "pkill -INT -f '[n]ew_running_client.py' && echo stopped || echo 'not running'")
+        print_results("Stopping clients", results)
+
+        # Then end the local SSH sessions, from a single process listing
+        ps_output = subprocess.run(["ps", "-eo", "pid=,args="], capture_output=True,
+                                   text=True).stdout
+        targets = {f"ssh {host['username']}@{host['hostname']}" for host in HOSTS}
+        for line in ps_output.splitlines():
+            pid, _, args = line.strip().partition(" ")
+            if any(args.startswith(target) for target in targets):
                 try:
-                    subprocess.run(['kill', '-SIGINT', pid])
-                except subprocess.CalledProcessError:
+                    os.kill(int(pid), 2)
+                except OSError:
                     print(f"Warning: Could not send SIGINT to process {pid}")
 
         # Close all gnome-terminal windows running our SSH sessions
@@ -95,43 +184,301 @@ def stop_all_clients():
         print(f"Error stopping clients: {str(e)}")
         sys.exit(1)
 
-def sync_time():
+# Echoes the remote clock (ns) for every line read, for measure_offset()
+CLOCK_PROBE = ("python3 -u -c 'import sys, time\n"
+               "for _ in sys.stdin: print(time.time_ns(), flush=True)'")
+
+# Steps the remote clock by -offset ns relative to itself, so the SSH
+# latency of this command does not matter
+CLOCK_STEP = ("python3 -c 'import sys, time; "
+              "time.clock_settime_ns(time.CLOCK_REALTIME, "
+              "time.clock_gettime_ns(time.CLOCK_REALTIME) - int(sys.argv[1]))' {offset}")
+
+
+def measure_offset(host, probes=8, timeout=None):
+    """
+    Measures how far host's clock is ahead of this one, NTP style: each
+    probe is one round trip over a single SSH session, and the remote time
+    is compared with the midpoint of the round trip. The offset of the
+    probe with the smallest round trip is the estimate, its error bounded
+    by half that round trip. Returns offset_ms, rtt_ms, jitter_ms (spread
+    of all probe offsets) or error
+    """
+    timeout = DEFAULT_TIMEOUT if timeout is None else timeout
+    result = {"hostname": host["hostname"], "ok": False}
+    proc = subprocess.Popen(ssh_command(host, CLOCK_PROBE), stdin=subprocess.PIPE,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    timer = threading.Timer(timeout, proc.kill)
+    timer.start()
+    samples = []
+    try:
+        # The first probe also waits for the interpreter to start; drop it
+        for _ in range(probes + 1):
+            t0 = time.time_ns()
+            proc.stdin.write("\n")
+            proc.stdin.flush()
+            line = proc.stdout.readline()
+            t1 = time.time_ns()
+            if not line:
+                raise ConnectionError(proc.stderr.read().strip() or "no reply")
+            samples.append((t1 - t0, int(line) - (t0 + t1) // 2))
+        samples.pop(0)
+        rtt, offset = min(samples)
+        offsets = [o for _, o in samples]
+        result.update(ok=True, offset_ms=offset / 1e6, rtt_ms=rtt / 1e6,
+                      jitter_ms=(max(offsets) - min(offsets)) / 1e6)
+    except (OSError, ValueError) as e:
+        result["error"] = "timed out" if not timer.is_alive() else str(e) or "failed"
+    finally:
+        timer.cancel()
+        try:
+            proc.stdin.close()
+        except OSError:
+            pass
+        proc.kill()
+        proc.wait()
+    return result
+
+
+def measure_fleet(hosts=None, probes=8):
+    hosts = HOSTS if hosts is None else hosts
+    with ThreadPoolExecutor(max_workers=len(hosts) or 1) as pool:
+        return list(pool.map(lambda host: measure_offset(host, probes), hosts))
+
+
+def print_offsets(title, results, before=None, max_offset_ms=None):
+    """
+    Prints one row per host: offset (and the offset before correction),
+    round trip and jitter, in milliseconds
+    """
+    print(f"\n{title}")
+    width = max([len(r["hostname"]) for r in results] + [4])
+    header = f"{'HOST':<{width}}  {'OFFSET':>9}  {'RTT':>7}  {'JITTER':>7}"
+    if before is not None:
+        header += f"  {'BEFORE':>9}"
+    print(header)
+    for i, r in enumerate(results):
+        if not r["ok"]:
+            print(f"{r['hostname']:<{width}}  FAILED: {r['error']}")
+            continue
+        row = (f"{r['hostname']:<{width}}  {r['offset_ms']:>+9.2f}  "
+               f"{r['rtt_ms']:>7.2f}  {r['jitter_ms']:>7.2f}")
+        if before is not None:
+            row += f"  {before[i]['offset_ms']:>+9.2f}" if before[i]["ok"] else f"  {'-':>9}"
+        if max_offset_ms is not None and abs(r["offset_ms"]) > max_offset_ms:
+            row += "  DRIFT"
+        print(row)
+    worst = [abs(r["offset_ms"]) for r in results if r["ok"]]
+    if worst:
+        print(f"worst offset {max(worst):.2f} ms across {len(worst)}/{len(results)} hosts")
+
+
+def sync_time(max_offset_ms=1.0, rounds=3):
     """
     Synchronizes date, time, and timezone of all hosts with the current system
     """
     # Get current system's timezone
     local_timezone = subprocess.getoutput('timedatectl show --property=Timezone --value')
-    # Get current system's date and time in a format suitable for the date command
-    local_datetime = subprocess.getoutput('date "+%Y-%m-%d %H:%M:%S.%N"')
-    
-    for host in HOSTS:
+
+    def timezone_command(host):
+        # Command to handle sudo with password
+        sudo_prefix = f"echo {host['password']} | sudo -S"
+        return f"{sudo_prefix} timedatectl set-timezone {local_timezone} 2>/dev/null && date +%Z"
+
+    print_results("Timezone", run_on_fleet(timezone_command))
+
+    # Measure, step every clock by its own offset, and measure again; hosts
+    # still off by more than max_offset_ms are corrected again
+    hosts = {host["hostname"]: host for host in HOSTS}
+    before = measure_fleet()
+    results = before
+    for _ in range(rounds):
+        off = [hosts[r["hostname"]] for r in results
+               if r["ok"] and abs(r["offset_ms"]) > max_offset_ms]
+        if not off:
+            break
+        offsets = {r["hostname"]: r["offset_ms"] for r in results if r["ok"]}
+
+        def step_command(host):
+            sudo_prefix = f"echo {host['password']} | sudo -S"
+            return f"{sudo_prefix} {CLOCK_STEP.format(offset=int(offsets[host['hostname']] * 1e6))}"
+
+        failed = [r for r in run_on_fleet(step_command, off) if not r["ok"]]
+        if failed:
+            print_results("Clock step failures", failed)
+        remeasured = {r["hostname"]: r for r in measure_fleet(off)}
+        results = [remeasured.get(r["hostname"], r) for r in results]
+
+    print_offsets("Clock offsets after sync (ms, + is ahead of this machine)",
+                  results, before, max_offset_ms)
+
+
+def check_time(interval=10.0, max_offset_ms=5.0):
+    """
+    Measures every host's clock offset each interval seconds until
+    interrupted (once for an interval of 0), flagging hosts that drift
+    beyond max_offset_ms
+    """
+    try:
+        while True:
+            start = time.time()
+            print_offsets(f"Clock offsets at {datetime.now():%H:%M:%S} (ms)",
+                          measure_fleet(probes=4), max_offset_ms=max_offset_ms)
+            if interval <= 0:
+                break
+            time.sleep(max(0.0, interval - (time.time() - start)))
+    except KeyboardInterrupt:
+        pass
+
+
+def fetch_stats_url(url, timeout=5):
+    with urllib.request.urlopen(url.rstrip("/") + "/stats", timeout=timeout) as response:
+        return json.load(response)
+
+
+def fetch_stats(host, timeout=5):
+    """
+    Reads a node's /stats snapshot through the multiplexed SSH connection
+    """
+    fetch = ("python3 -c 'import sys, urllib.request; sys.stdout.write(urllib.request."
+             f"urlopen(\"http://127.0.0.1:{STATS_PORT}/stats\", timeout={timeout})"
+             ".read().decode())'")
+    result = run_on_host(host, fetch, timeout + 5)
+    if not result["ok"]:
+        err = result["error"].splitlines()
+        raise ConnectionError(err[-1] if err else "no stats")
+    return json.loads(result["output"])
+
+
+def status_row(name, snap, previous, elapsed):
+    """
+    One status table row from a node's stats snapshot; the capture rate is
+    measured from the counters of the previous refresh when there is one
+    """
+    gauges = snap.get("gauges", {})
+    counters = snap.get("counters", {})
+    upload = snap.get("timers", {}).get("vdms_round_trip", {})
+
+    captured = counters.get("frames_captured", 0)
+    if previous is not None and elapsed > 0:
+        fps = (captured - previous.get("counters", {}).get("frames_captured", 0)) / elapsed
+    else:
+        fps = captured / snap["uptime_s"] if snap.get("uptime_s") else 0.0
+
+    archive = gauges.get("archive") or {}
+    dropped = ((gauges.get("dropped_frames") or 0) + (gauges.get("spool_evicted") or 0)
+               + archive.get("dropped", 0))
+    return {
+        "name": name,
+        "up": f"{snap.get('uptime_s', 0) / 60:.0f}m",
+        "fps": f"{fps:.2f}",
+        "detect": f"{gauges.get('detect_fps') or 0:.1f}",
+        "queue": str(gauges.get("queue_depth", "-")),
+        "backlog": str(gauges.get("upload_backlog", "-")),
+        "dropped": str(dropped),
+        "sent": str(counters.get("frames_sent", 0)),
+        "upload": f"{upload.get('p50_ms', 0):.0f}/{upload.get('p99_ms', 0):.0f}",
+        "disk": f"{gauges.get('disk_used_pct', '-')}%",
+    }
+
+
+STATUS_COLUMNS = [("name", "HOST"), ("up", "UP"), ("fps", "FPS"), ("detect", "DET/S"),
+                  ("queue", "QUEUE"), ("backlog", "BACKLOG"), ("dropped", "DROPPED"),
+                  ("sent", "SENT"), ("upload", "UPLOAD ms p50/p99"), ("disk", "DISK")]
+
+
+def show_status(interval=0.0, urls=None):
+    """
+    Queries every node's stats endpoint concurrently and prints a table,
+    refreshed every interval seconds (once if interval is 0). With urls,
+    stats are fetched from those addresses directly instead of over SSH,
+    e.g. from bench.status_standin
+    """
+    if urls:
+        targets = [(url, lambda url=url: fetch_stats_url(url)) for url in urls]
+    else:
+        targets = [(host["hostname"], lambda host=host: fetch_stats(host)) for host in HOSTS]
+
+    def fetch(target):
+        name, fn = target
         try:
-            hostname = host['hostname']
-            username = host['username']
-            password = host['password']
-            
-            # Command to handle sudo with password
-            sudo_prefix = f"echo {password} | sudo -S"
-            
-            # Set timezone first
-            timezone_cmd = f"{sudo_prefix} timedatectl set-timezone {local_timezone}"
-            ssh_cmd = f"ssh {username}@{hostname} '{timezone_cmd}'"
-            subprocess.run(ssh_cmd, shell=True, stderr=subprocess.PIPE)
-            
-            # Set date and time
-            time_cmd = f"{sudo_prefix} date -s '{local_datetime}'"
-            ssh_cmd = f"ssh {username}@{hostname} '{time_cmd}'"
-            subprocess.run(ssh_cmd, shell=True, stderr=subprocess.PIPE)
-            
-            # Get the synchronized time from the remote host to confirm
-            verify_cmd = "date '+%Y-%m-%d %H:%M:%S %Z'"
-            ssh_cmd = f"ssh {username}@{hostname} '{verify_cmd}'"
-            synced_time = subprocess.getoutput(ssh_cmd)
-            
-            print(f"{hostname} sync'd to {synced_time}")
-            
+            return name, fn(), None
         except Exception as e:
-            print(f"Error syncing time on {hostname}: {str(e)}")
+            return name, None, str(e) or type(e).__name__
+
+    previous = {}
+    last = None
+    clear = interval > 0 and sys.stdout.isatty()
+    try:
+        with ThreadPoolExecutor(max_workers=len(targets)) as pool:
+            while True:
+                start = time.time()
+                results = list(pool.map(fetch, targets))
+                elapsed = start - last if last is not None else 0.0
+                last = start
+
+                rows, errors = [], []
+                for name, snap, error in results:
+                    if snap is None:
+                        errors.append((name, error))
+                        previous.pop(name, None)
+                        continue
+                    rows.append(status_row(name, snap, previous.get(name), elapsed))
+                    previous[name] = snap
+
+                widths = {key: max([len(title)] + [len(row[key]) for row in rows])
+                          for key, title in STATUS_COLUMNS}
+                widths["name"] = max([widths["name"]] + [len(name) for name, _ in errors])
+                if clear:
+                    print("\033[H\033[J", end="")
+                print(f"Fleet status at {datetime.now():%H:%M:%S}")
+                print("  ".join(f"{title:>{widths[key]}}" if key != "name"
+                                else f"{title:<{widths[key]}}" for key, title in STATUS_COLUMNS))
+                for row in rows:
+                    print("  ".join(f"{row[key]:>{widths[key]}}" if key != "name"
+                                    else f"{row[key]:<{widths[key]}}" for key, _ in STATUS_COLUMNS))
+                for name, error in errors:
+                    print(f"{name:<{widths['name']}}  DOWN: {error}")
+                print(f"{len(rows)}/{len(targets)} nodes reporting")
+
+                if interval <= 0:
+                    return
+                time.sleep(max(0.0, interval - (time.time() - start)))
+    except KeyboardInterrupt:
+        pass
+
+def bootstrap_servers(servers=None):
+    """
+    Creates the image property indexes (smartspace.properties.INDEXES) on
+    every VDMS server, so per-camera, per-interval queries stay fast
+    """
+    import vdms
+    from smartspace.properties import INDEXES, create_indexes
+
+    def bootstrap(server):
+        host, _, port = server.partition(":")
+        result = {"hostname": server, "ok": False, "output": "", "error": ""}
+        start = time.time()
+        try:
+            db = vdms.vdms()
+            db.connect(host, int(port) if port else VDMS_PORT, timeout=DEFAULT_TIMEOUT)
+            response = create_indexes(db)
+            db.disconnect()
+            if not isinstance(response, tuple):
+                raise ConnectionError("no response")
+            statuses = [next(iter(r.values())).get("status", -1) for r in response[0]]
+            result["ok"] = all(status == 0 for status in statuses)
+            result["output"] = ", ".join(f"{key}:{'ok' if status == 0 else status}"
+                                         for key, status in zip(INDEXES, statuses))
+            result["error"] = result["output"]
+        except Exception as e:
+            result["error"] = str(e)
+        result["seconds"] = time.time() - start
+        return result
+
+    servers = VDMS_SERVERS if servers is None else servers
+    with ThreadPoolExecutor(max_workers=len(servers)) as pool:
+        print_results("VDMS property indexes", list(pool.map(bootstrap, servers)))
 
 def login_bitsnet(username, password):
     """
@@ -139,6 +486,7 @@ def login_bitsnet(username, password):
     """
     # Login script as a Python string with proper escaping
     login_script = f'''
+import subprocess
 import requests
 import xml.etree.ElementTree as ElementTree
 
@@ -181,25 +529,15 @@ except Exception as e:
     print(f"Error: {{str(e)}}")
 '''
 
-    for host in HOSTS:
-        try:
-            hostname = host['hostname']
-            username_ssh = host['username']
-            
-            print(f"\nConnecting to {hostname}...")
-            
-            # Save the script to a temporary file on the remote host and execute it
-            ssh_cmd = f"""ssh {username_ssh}@{hostname} 'python3 -c "{login_script}"'"""
-            result = subprocess.run(ssh_cmd, shell=True, capture_output=True, text=True)
-            
-            print(result.stdout)
-            if result.stderr:
-                print(f"Errors: {result.stderr}")
-                
-        except Exception as e:
-            print(f"Error on {hostname}: {str(e)}")
+    # The script is fed to python3 on stdin, so it needs no shell quoting
+    results = run_on_fleet("python3 -", stdin=login_script)
+    for r in results:
+        # One line per host in the table
+        r["output"] = ", ".join(r["output"].splitlines())
+    print_results("BITS network login", results)
 
 def main():
+    global DEFAULT_TIMEOUT, STATS_PORT
     parser = argparse.ArgumentParser(description="Control script for smart-space clients")
     group = parser.add_mutually_exclusive_group()
     group.add_argument("--start", choices=["all"], nargs="?", const="all", 
@@ -210,15 +548,42 @@ def main():
                       help="Synchronize date, time, and timezone of all hosts with this system")
     group.add_argument("--login", nargs=2, metavar=('USERNAME', 'PASSWORD'),
                       help="Login to BITS network on all Pis. Usage: --login username password")
+    group.add_argument("--clockcheck", type=float, nargs="?", const=10.0, metavar="INTERVAL",
+                      help="Measure every host's clock offset every INTERVAL seconds "
+                           "(default 10, 0 for once)")
+    group.add_argument("--bootstrap", nargs="*", metavar="SERVER",
+                      help="Create the image property indexes on the VDMS servers "
+                           f"(host or host:port, default {' '.join(VDMS_SERVERS)})")
+    group.add_argument("--status", type=float, nargs="?", const=5.0, metavar="INTERVAL",
+                      help="Show fps, queues, drops, upload latency and disk use of every "
+                           "node, refreshed every INTERVAL seconds (default 5, 0 for once)")
+    parser.add_argument("--statusUrls", nargs="+", metavar="URL",
+                        help="With --status, read these stats endpoints directly instead "
+                             "of the hosts' (e.g. a local bench.status_standin)")
+    parser.add_argument("--statsPort", type=int, default=STATS_PORT,
+                        help="Stats port of the clients on the hosts")
+    parser.add_argument("--maxOffset", type=float, default=None,
+                        help="Clock offset in ms that --synctime corrects and --clockcheck "
+                             "flags (default 1 and 5)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help="Seconds to wait for each host")
     
     args = parser.parse_args()
+    DEFAULT_TIMEOUT = args.timeout
     
     if args.start:
         start_all_clients()
     elif args.stop:
         stop_all_clients()
     elif args.synctime:
-        sync_time()
+        sync_time(1.0 if args.maxOffset is None else args.maxOffset)
+    elif args.clockcheck is not None:
+        check_time(args.clockcheck, 5.0 if args.maxOffset is None else args.maxOffset)
+    elif args.status is not None:
+        STATS_PORT = args.statsPort
+        show_status(args.status, args.statusUrls)
+    elif args.bootstrap is not None:
+        bootstrap_servers(args.bootstrap or None)
     elif args.login:
         login_bitsnet(args.login[0], args.login[1])
     else:
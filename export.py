@@ -0,0 +1,410 @@
+"""Bulk export of archived frames from VDMS.
+
+Pulls every frame of a set of cameras within a time range from all VDMS
+servers (frames are spread over both, see vdms.vdms_pool) and writes them
+to disk:
+
+    <out>/<ID>/<YYYY-MM-DD>/<YYYYmmdd_HHMMSS_mmm>.<ext>
+    <out>/<ID>/metadata.jsonl     one line of properties per frame
+
+The range is split into work units of one server, one camera and one time
+window each. Units run concurrently over several connections per server,
+and each is read in pages (FindImage sorted by the indexed integer
+TimestampMs, limit pageSize, continuing from the last timestamp seen and
+skipping the frames at that timestamp already written, by _uniqueid;
+frames uploaded before typed properties existed need --stringTimestamps,
+which pages on the Timestamp string instead), with the blobs streamed
+straight to files. A frame whose file name is taken (another frame of the
+same millisecond, on this server or the other) gets the next free _<n>
+suffix, unless the file there is the same frame, which is then kept
+rather than written twice. Progress is journaled per page together with the size of each
+metadata.jsonl, so an interrupted export resumes where it stopped when run
+again with the same arguments, and metadata lines of pages that were not
+journaled are cut off rather than written twice.
+
+    python export.py --cameras ss3-ss7 --start "2024-03-01 10:00" \\
+        --end "2024-03-01 11:00" --out export/
+"""
+
+import os
+import sys
+import json
+import filecmp
+import time
+import queue
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+
+import vdms
+from smartspace.properties import format_timestamp, TIMESTAMP_FORMAT
+
+# vdms servers - 10.8.1.150 (L), 10.8.1.149 (R)
+DEFAULT_SERVERS = ["10.8.1.150", "10.8.1.149"]
+JOURNAL = ".export_journal.jsonl"
+
+_MAGIC = [(b"\xff\xd8\xff", ".jpg"), (b"\x89PNG", ".png"), (b"RIFF", ".webp")]
+
+
+def parse_cameras(spec):
+    """"ss3-ss7,ss10" -> ["ss3", ..., "ss7", "ss10"]"""
+    cameras = []
+    for part in spec.split(","):
+        part = part.strip()
+        if "-" in part:
+            first, last = part.split("-")
+            prefix = first.rstrip("0123456789")
+            cameras += [f"{prefix}{n}" for n in range(int(first[len(prefix):]),
+                                                       int(last[len(prefix):]) + 1)]
+        elif part:
+            cameras.append(part)
+    return cameras
+
+
+def parse_time(text, utc=False):
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            t = datetime.strptime(text, fmt)
+            break
+        except ValueError:
+            continue
+    else:
+        raise argparse.ArgumentTypeError(f"Unrecognised time: {text}")
+    return t.replace(tzinfo=timezone.utc) if utc else t.astimezone(timezone.utc)
+
+
+def sniff_extension(path):
+    with open(path, "rb") as f:
+        head = f.read(12)
+    for magic, ext in _MAGIC:
+        if head.startswith(magic):
+            return ext
+    return ".bin"
+
+
+class Journal(object):
+    """Append-only record of finished pages, read back on resume.
+
+    metadata holds the size of each camera's metadata.jsonl as of its last
+    journaled page; cameras lists every camera with a journaled page.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.state = {}
+        self.metadata = {}
+        self.cameras = set()
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line
+                    self._load(entry)
+        self._file = open(path, "a")
+
+    def _load(self, entry):
+        self.state[entry["unit"]] = entry
+        camera = entry["unit"].split("|")[1]
+        self.cameras.add(camera)
+        if entry.get("metadata") is not None:
+            self.metadata[camera] = entry["metadata"]
+
+    def record(self, unit, after, done, frames, seen=(), metadata=None):
+        """seen: _uniqueids of the frames at timestamp after already
+        written; metadata: the camera's metadata.jsonl size."""
+        entry = {"unit": unit, "after": after, "seen": list(seen), "done": done,
+                 "frames": frames, "metadata": metadata}
+        with self._lock:
+            self._load(entry)
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class Exporter(object):
+    def __init__(self, servers, port, cameras, start, end, out,
+                 window=timedelta(minutes=10), page_size=64, connections=4,
+                 properties=("ID", "Timestamp"), retries=3, time_key="TimestampMs"):
+        self.servers = servers
+        self.port = port
+        self.out = out
+        self.page_size = page_size
+        self.connections = connections
+        self.properties = list(dict.fromkeys(["ID", "Timestamp", time_key,
+                                              "_uniqueid", *properties]))
+        self.retries = retries
+        self.time_key = time_key
+        self._hidden = set() if "_uniqueid" in properties else {"_uniqueid"}
+
+        os.makedirs(out, exist_ok=True)
+        self.journal = Journal(os.path.join(out, JOURNAL))
+        self._metadata = {}
+        self._metadata_lock = threading.Lock()
+        for camera in cameras:
+            self._truncate_metadata(camera)
+
+        self.units = {server: queue.Queue() for server in servers}
+        self.total_units = 0
+        self.skipped_units = 0
+        for camera in cameras:
+            t = start
+            while t < end:
+                t_end = min(end, t + window)
+                for server in servers:
+                    unit = (server, camera, self._bound(t), self._bound(t_end))
+                    self.total_units += 1
+                    if self.journal.state.get(self.unit_key(unit), {}).get("done"):
+                        self.skipped_units += 1
+                        continue
+                    self.units[server].put(unit)
+                t = t_end
+
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.bytes = 0
+        self.failed_units = []
+
+    def _bound(self, t):
+        ms = round(t.timestamp() * 1000)
+        return ms if self.time_key == "TimestampMs" else format_timestamp(ms)
+
+    @staticmethod
+    def unit_key(unit):
+        return "|".join(map(str, unit))
+
+    def _metadata_path(self, camera):
+        return os.path.join(self.out, camera, "metadata.jsonl")
+
+    def _truncate_metadata(self, camera):
+        """Cuts metadata.jsonl back to its size at the last journaled page,
+        dropping the lines of pages that will be fetched again."""
+        path = self._metadata_path(camera)
+        if not os.path.exists(path):
+            return
+        size = self.journal.metadata.get(camera)
+        if size is None:
+            if camera in self.journal.cameras:
+                return  # journaled before sizes were recorded
+            size = 0
+        if os.path.getsize(path) > size:
+            with open(path, "r+") as f:
+                f.truncate(size)
+
+    def _connect(self, server):
+        # "host" or "host:port"
+        host, _, port = server.partition(":")
+        db = vdms.vdms()
+        db.connect(host, int(port) if port else self.port, timeout=60)
+        return db
+
+    def _worker(self, server):
+        db = None
+        while True:
+            try:
+                unit = self.units[server].get_nowait()
+            except queue.Empty:
+                break
+            for attempt in range(self.retries + 1):
+                try:
+                    if db is None:
+                        db = self._connect(server)
+                    self._export_unit(db, unit)
+                    break
+                except (OSError, ValueError) as e:
+                    # ConnectionError and socket timeouts are OSErrors; the
+                    # unit restarts from its last journaled page
+                    db = None
+                    if attempt == self.retries:
+                        print(f"Giving up on {self.unit_key(unit)}: {e}")
+                        with self._lock:
+                            self.failed_units.append(unit)
+                    else:
+                        time.sleep(min(30, 2 ** attempt))
+        if db is not None:
+            db.disconnect()
+
+    def _export_unit(self, db, unit):
+        server, camera, start, end = unit
+        key = self.unit_key(unit)
+        state = self.journal.state.get(key, {})
+        after = state.get("after")
+        seen = set(state.get("seen", ()))
+        frames = state.get("frames", 0)
+
+        while True:
+            # Frames sharing the last timestamp may straddle pages, so each
+            # page starts at that timestamp and skips the ones written;
+            # asking for len(seen) more keeps a full page of new frames
+            limit = self.page_size + len(seen)
+            query = [{"FindImage": {
+                "constraints": {"ID": ["==", camera],
+                                self.time_key: [">=", start if after is None else after,
+                                                "<", end]},
+                "results": {"list": self.properties, "sort": self.time_key,
+                            "limit": limit},
+            }}]
+            response = db.query_stream(query)
+            if not isinstance(response, tuple):
+                raise ConnectionError(f"{server}: no response")
+            response, stream = response
+            with stream:
+                result = response[0]["FindImage"] if isinstance(response, list) else response
+                if result.get("status", 0) != 0:
+                    raise ValueError(f"{server}: {result.get('info', result)}")
+                entities = result.get("entities", [])
+                fresh = []
+                paths = []
+                for i, props in enumerate(entities):
+                    uid = self._uid(props)
+                    if props[self.time_key] == after and uid in seen:
+                        paths.append(None)
+                        continue
+                    if props[self.time_key] != after:
+                        after, seen = props[self.time_key], set()
+                    paths.append(self._part_path(props, i))
+                    seen.add(uid)
+                    fresh.append(props)
+                saved = stream.save(lambda i: paths[i])
+
+            nbytes = 0
+            for path, size in saved:
+                self._finish(path)
+                nbytes += size
+
+            frames += len(saved)
+            with self._lock:
+                self.frames += len(saved)
+                self.bytes += nbytes
+
+            done = len(entities) < limit
+            if len(saved) < len(fresh):
+                raise ConnectionError(f"{server}: response ended early")
+            self._commit_page(camera, key, fresh, after, seen, done, frames)
+            if done:
+                return
+
+    def _uid(self, props):
+        uid = props.get("_uniqueid")
+        return uid if uid is not None else json.dumps(props, sort_keys=True)
+
+    def _part_path(self, props, index):
+        # Unique to this thread and page position: frames of the same
+        # millisecond may be streaming in on other connections
+        t = datetime.strptime(props["Timestamp"], TIMESTAMP_FORMAT)  # UTC
+        directory = os.path.join(self.out, props["ID"], t.strftime("%Y-%m-%d"))
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, t.strftime("%Y%m%d_%H%M%S_")
+                            + f"{t.microsecond // 1000:03d}"
+                            + f".{threading.get_ident()}.{index}.part")
+
+    def _finish(self, part):
+        """Moves a downloaded .part file to the first free name of its
+        millisecond, claimed with "xb" so a collision never overwrites."""
+        base = part.rsplit(".", 3)[0]
+        ext = sniff_extension(part)
+        path = base + ext
+        n = 1
+        while True:
+            try:
+                open(path, "xb").close()
+            except FileExistsError:
+                if filecmp.cmp(part, path, shallow=False):
+                    os.remove(part)  # this frame, from a page fetched again
+                    return path
+                path = f"{base}_{n}{ext}"
+                n += 1
+                continue
+            os.replace(part, path)
+            return path
+
+    def _commit_page(self, camera, key, entities, after, seen, done, frames):
+        """Appends the page's metadata and journals the page, together, so
+        the journaled size covers exactly the journaled pages."""
+        lines = "".join(json.dumps({k: v for k, v in props.items() if k not in self._hidden})
+                        + "\n" for props in entities)
+        with self._metadata_lock:
+            f = self._metadata.get(camera)
+            if f is None and lines:
+                os.makedirs(os.path.join(self.out, camera), exist_ok=True)
+                f = self._metadata[camera] = open(self._metadata_path(camera), "a")
+            if lines:
+                f.write(lines)
+                f.flush()
+            size = f.tell() if f is not None else self.journal.metadata.get(camera)
+            self.journal.record(key, after, done, frames, seen, size)
+
+    def run(self, progress_interval=5.0):
+        threads = [threading.Thread(target=self._worker, args=(server,),
+                                    name=f"export-{server}-{i}", daemon=True)
+                   for server in self.servers for i in range(self.connections)]
+        started = time.time()
+        for t in threads:
+            t.start()
+        try:
+            next_report = started + progress_interval
+            for t in threads:
+                while t.is_alive():
+                    t.join(max(0.0, next_report - time.time()))
+                    if time.time() >= next_report:
+                        self.print_progress(started)
+                        next_report += progress_interval
+        finally:
+            self.journal.close()
+            for f in self._metadata.values():
+                f.close()
+        self.print_progress(started)
+        return not self.failed_units
+
+    def print_progress(self, started):
+        elapsed = max(time.time() - started, 1e-9)
+        remaining = sum(q.qsize() for q in self.units.values())
+        print(f"{self.frames} frames, {self.bytes / 1e6:.1f} MB "
+              f"({self.bytes / 1e6 / elapsed:.1f} MB/s, {self.frames / elapsed:.1f} frames/s), "
+              f"{remaining} units queued, {len(self.failed_units)} failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export archived frames from VDMS",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--cameras", required=True,
+                        help="Camera IDs, e.g. ss3-ss7 or ss1,ss4")
+    parser.add_argument("--start", required=True, help="Start time, YYYY-MM-DD HH:MM[:SS]")
+    parser.add_argument("--end", required=True, help="End time (exclusive)")
+    parser.add_argument("--utc", action="store_true",
+                        help="Times are UTC rather than this machine's local time")
+    parser.add_argument("--out", default="export", help="Output directory")
+    parser.add_argument("--servers", nargs="+", default=DEFAULT_SERVERS,
+                        help="VDMS servers, host or host:port")
+    parser.add_argument("--port", type=int, default=55555)
+    parser.add_argument("--connections", type=int, default=4,
+                        help="Concurrent connections to each server")
+    parser.add_argument("--window", type=float, default=10,
+                        help="Minutes of one camera's frames per work unit")
+    parser.add_argument("--pageSize", type=int, default=64,
+                        help="Frames per FindImage query")
+    parser.add_argument("--properties", default="ID,Timestamp,Tick,Gate,Detection,Landmark",
+                        help="Properties written to metadata.jsonl")
+    parser.add_argument("--stringTimestamps", action="store_true",
+                        help="Page on the Timestamp string, for frames uploaded "
+                             "without the integer TimestampMs property")
+    args = parser.parse_args()
+
+    start = parse_time(args.start, args.utc)
+    end = parse_time(args.end, args.utc)
+    exporter = Exporter(args.servers, args.port, parse_cameras(args.cameras), start, end,
+                        args.out, timedelta(minutes=args.window), args.pageSize,
+                        args.connections, args.properties.split(","),
+                        time_key="Timestamp" if args.stringTimestamps else "TimestampMs")
+    print(f"Exporting {exporter.total_units} units ({exporter.skipped_units} already done) "
+          f"from {len(args.servers)} servers")
+    sys.exit(0 if exporter.run() else 1)
+
+
+if __name__ == "__main__":
+    main()
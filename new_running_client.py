@@ -20,17 +20,19 @@ config.json format
 	"hostname": "ss<n>.local",
 	"username": "smartspace<n>",
 	"ID": "ss<n>"
-	"vdms_servers": ["10.8.1.150", "10.8.1.149"]
+	"vdms_servers": ["10.8.1.150", "10.8.1.149"],
+	"vdms_policy": "least_outstanding"   (optional, or "round_robin")
 }
 '''
 
 import argparse
+import base64
+import functools
 import sys
 import time
-from datetime import datetime, timezone, date
 import os
+import shutil
 
-from picamera2 import Picamera2
 import cv2
 import mediapipe as mp
 from mediapipe.tasks import python
@@ -42,6 +44,21 @@ import json
 import queue
 import threading
 
+from smartspace import FrameQueue, FrameEncoder, BatchUploader, Spool
+from smartspace import landmarks, sources
+from smartspace.stats import Stats, StatsServer
+from smartspace.gating import CaptureGate, MotionDetector
+from smartspace.correlator import ResultCorrelator
+from smartspace.detection_log import DetectionLog
+from smartspace.archive import ArchiveWriter
+from smartspace.scheduler import CaptureScheduler
+from smartspace.properties import frame_properties
+from smartspace.adaptive import QualityController
+from smartspace.uploader import batch_report
+from smartspace.frame_ring import FrameRing
+from smartspace.encoding import UPLOAD_CODECS
+from smartspace.pipeline import CaptureProcess, DetectorPool, UploadProcess, Detection
+
 mp_face_mesh = mp.solutions.face_mesh
 mp_drawing = mp.solutions.drawing_utils
 mp_drawing_styles = mp.solutions.drawing_styles
@@ -56,9 +73,8 @@ HOSTNAME = config["hostname"]
 USERNAME = config["username"]
 ID = config["ID"]
 VDMS_SERVERS = config["vdms_servers"]
-
-# Select the first VDMS server (can be modified for load balancing)
-VDMS_SERVER = VDMS_SERVERS[0]
+# "least_outstanding" or "round_robin", see vdms.vdms_pool
+VDMS_POLICY = config.get("vdms_policy", "least_outstanding")
 
 
 # Global variables to calculate FPS
@@ -66,50 +82,118 @@ COUNTER, FPS = 0, 0
 START_TIME = time.time()
 DETECTION_RESULT = None
 
-imageQueue = queue.Queue()
-queueLock = threading.Lock()
+# Bounded queue of encoded frames waiting for upload, created in main()
+imageQueue = None
+# Durable on-disk spool used instead of imageQueue when --spoolDir is set
+imageSpool = None
+# Set once capture has stopped and every frame has been encoded
+captureDone = threading.Event()
+# Picks encode quality and scale from upload throughput with --adaptive
+qualityController = None
+# Uploads in a process of its own with --pipeline processes
+uploadProcess = None
 
+# Per-stage timings, counters and gauges, served on --statsPort
+STATS = Stats()
 
-def send_images_to_vdms(record_duration: int):
-    #Connext to VDMS Server
-    db = vdms.vdms()
-    db.connect(VDMS_SERVER, 55555)
 
-    end_time = time.time() + record_duration
-    while time.time() + 5 < end_time:
-        if not imageQueue.empty():
-            queueLock.acquire()
-            image = imageQueue.get()
-            queueLock.release()
+def log_batch(batch, nbytes, latency, response):
+    log_upload(batch_report(batch, nbytes, latency, response))
+
+
+def log_upload(report):
+    # report is a smartspace.uploader.batch_report(), made here or in the
+    # upload process
+    frames, nbytes, latency = report["frames"], report["nbytes"], report["latency"]
+    STATS.record("vdms_round_trip", latency)
+    for wait in report["queue_waits"]:
+        STATS.record("queue_wait", wait)
+    STATS.incr("frames_sent", frames)
+    STATS.incr("bytes_sent", nbytes)
+    if qualityController is not None:
+        qualityController.observe(nbytes, latency)
+
+    if report["failed"]:
+        STATS.incr("frames_rejected", report["failed_frames"])
+        print(f"VDMS rejected {report['failed_frames']} of {frames} frames: "
+              f"{report.get('info', '')}")
+        print(report["failed"])
+
+    print(f"Uploaded batch of {frames} frames, {nbytes / 1e6:.2f} MB "
+          f"in {latency * 1000:.0f} ms "
+          f"({nbytes / 1e6 / latency:.2f} MB/s, {frames / latency:.1f} frames/s), "
+          f"mean encode {report['encode_ms']:.0f} ms, backlog {upload_backlog()}, "
+          f"dropped {dropped_frames()}")
 
-            blob_arr = []
-            blob_arr.append(image["image"])
-            
-            addImage = {}
-            addImage["format"] = "jpg"
-            addImage["properties"] = image["props"]
 
-            query = {}
-            query["AddImage"] = addImage
+def log_dropped_batch(batch, error):
+    log_upload_error(len(batch), error)
 
-            all_queries = []
-            all_queries.append(query)
 
-            print("Query Sent:")
-            print(all_queries)
+def log_upload_error(frames, error):
+    STATS.incr("frames_failed", frames)
+    print(f"Dropping batch of {frames} frames: {error}")
 
-            response, res_arr = db.query(all_queries, [blob_arr])
 
-            print("Response:")
-            print(response, res_arr)
+def upload_backlog():
+    """Frames captured but not yet accepted by VDMS."""
+    if uploadProcess is not None:
+        return uploadProcess.backlog()
+    if imageSpool is not None:
+        return imageSpool.pending
+    return imageQueue.qsize()
+
+
+def dropped_frames():
+    if uploadProcess is not None:
+        return uploadProcess.dropped()
+    return imageQueue.dropped()
+
+
+def disk_used_pct():
+    """How full the disk holding the archive, spool and logs is."""
+    usage = shutil.disk_usage(".")
+    return round(100 * (1 - usage.free / usage.total), 1)
+
+
+def send_images_to_vdms(batch_size: int, batch_bytes: int,
+                        batch_latency: float, drain_timeout: float):
+    """Drains the spool (or image queue) into VDMS in batched transactions.
+
+    See smartspace.uploader.BatchUploader for when batches are flushed. With
+    a spool, failed batches are retried with backoff and whatever is left
+    after drain_timeout once capture stops is uploaded on the next run;
+    with the in-memory queue, uploading stops when the queue is drained.
+    """
+    # Connect to every VDMS server; queries are balanced across the live ones
+    db = vdms.vdms_pool(VDMS_SERVERS, 55555, policy=VDMS_POLICY)
+    if db.connect() == 0:
+        print("Warning: no VDMS server reachable yet, retrying in background")
+
+    uploader = BatchUploader(db, imageQueue, batch_size, batch_bytes,
+                             batch_latency, on_batch=log_batch,
+                             on_error=log_dropped_batch)
+    if imageSpool is not None:
+        uploader.drain_spool(imageSpool, stop=captureDone,
+                             drain_timeout=drain_timeout)
+        print(f"Spool: {imageSpool.stats()}")
+    else:
+        uploader.run()
+
+    print(f"Frame queue: {imageQueue.stats()}")
+    print(f"Uploader: {uploader.stats()}")
+    db.close()
 
 
 def run(model: str, num_faces: int,
         min_face_detection_confidence: float,
         min_face_presence_confidence: float, min_tracking_confidence: float,
-        camera_id: int, width: int, height: int, record_duration: int,
-        frame_rate: int) -> None:
-    """Continuously run inference on images acquired from the camera and save them as JPG files.
+        source: sources.FrameSource, record_duration: int,
+        scheduler: CaptureScheduler, encoder: FrameEncoder, gate: CaptureGate,
+        detection_log: DetectionLog, archive: ArchiveWriter = None,
+        result_capacity: int = 16, result_timeout: float = 1.0,
+        detector_pool: DetectorPool = None) -> None:
+    """Continuously run inference on images acquired from a frame source and save them.
 
     Args:
         model: Name of the face landmarker model bundle.
@@ -120,24 +204,29 @@ def run(model: str, num_faces: int,
             presence score in the face landmark detection.
         min_tracking_confidence: The minimum confidence score for the face
             tracking to be considered successful.
-        camera_id: The camera id to be passed to OpenCV.
-        width: The width of the frame captured from the camera.
-        height: The height of the frame captured from the camera.
-        frame_rate: The frame rate for saving images.
+        source: Where frames come from: the Pi camera, synthetic frames or
+            a replayed recording (see smartspace.sources), or a
+            smartspace.pipeline.CaptureProcess.
+        record_duration: Duration in seconds to record for.
+        scheduler: Triggers each capture on a wall-clock tick (every
+            1/fps seconds), so all nodes capture at the same instants. A
+            CaptureProcess is both the source and the scheduler.
+        encoder: Encodes each frame once; the same bytes are saved locally
+            and uploaded to VDMS.
+        gate: Decides which frames are kept, from faces and motion.
+        detection_log: Receives every frame's timestamp and landmarks.
+        archive: Keeps a local copy of every stored frame, None for none.
+        result_capacity: Max frames waiting for their landmarker result,
+            and max frames with a result waiting to be labelled.
+        result_timeout: Seconds a frame waits for its result before it is
+            processed without one.
+        detector_pool: Landmarker processes to detect in instead of a
+            live-stream landmarker in this process.
     """
 
 
-    # Start capturing video input from the camera
-    picam2 = Picamera2()
-    picam2.configure(picam2.create_preview_configuration(main={"format": 'RGB888', "size": (width, height)}))
-    picam2.set_controls({"AfMode": 0, "LensPosition": 4}) 
-    picam2.start()
-    f = open("output.txt", "w")
-
-    # Create output directory for images
-    today = date.today()
-    output_dir = f'output/{today}'
-    os.makedirs(output_dir, exist_ok=True)
+    # Start capturing frames
+    source.start()
 
     end_time = time.time() + record_duration
         
@@ -155,6 +244,17 @@ def run(model: str, num_faces: int,
     
     def save_result(result: vision.FaceLandmarkerResult,
                     unused_output_image: mp.Image, timestamp_ms: int):
+        STATS.record("detect", time.time() - timestamp_ms / 1000)
+        correlator.add_result(timestamp_ms, result)
+        count_result(result)
+
+    def save_detection(timestamp_ms: int, detection: Detection, seconds: float):
+        # From the DetectorPool's result thread, in submission order
+        STATS.record("detect", seconds)
+        correlator.add_result(timestamp_ms, detection)
+        count_result(detection)
+
+    def count_result(result):
         global FPS, COUNTER, START_TIME, DETECTION_RESULT
 
         # Calculate the FPS
@@ -165,73 +265,170 @@ def run(model: str, num_faces: int,
         DETECTION_RESULT = result
         COUNTER += 1
 
-    # Initialize the face landmarker model
-    base_options = python.BaseOptions(model_asset_path=model)
-    options = vision.FaceLandmarkerOptions(
-        base_options=base_options,
-        running_mode=vision.RunningMode.LIVE_STREAM,
-        num_faces=num_faces,
-        min_face_detection_confidence=min_face_detection_confidence,
-        min_face_presence_confidence=min_face_presence_confidence,
-        min_tracking_confidence=min_tracking_confidence,
-        output_face_blendshapes=True,
-        result_callback=save_result)
-    detector = vision.FaceLandmarker.create_from_options(options)
-
-    # Time between image captures
-    capture_interval = 1 / frame_rate
+    # Frames wait here, keyed by their detect_async() timestamp, until
+    # their own landmarker result arrives (or result_timeout passes). Its
+    # policy is not --queuePolicy: "block" would stall capture, and
+    # "faces_only" would starve the gate of its pre-roll and heartbeat
+    # frames, so a labeller that falls behind loses the oldest frames
+    correlator = ResultCorrelator(result_capacity, result_timeout,
+                                  policy="drop_oldest")
+    STATS.gauge("results", correlator.stats)
+
+    # Initialize the face landmarker model; a DetectorPool loads its own
+    # in every worker
+    detector = None
+    if detector_pool is not None:
+        detector_pool.on_result = save_detection
+    else:
+        base_options = python.BaseOptions(model_asset_path=model)
+        options = vision.FaceLandmarkerOptions(
+            base_options=base_options,
+            running_mode=vision.RunningMode.LIVE_STREAM,
+            num_faces=num_faces,
+            min_face_detection_confidence=min_face_detection_confidence,
+            min_face_presence_confidence=min_face_presence_confidence,
+            min_tracking_confidence=min_tracking_confidence,
+            output_face_blendshapes=True,
+            result_callback=save_result)
+        detector = vision.FaceLandmarker.create_from_options(options)
+
+    def save_encoded(timestamp_ms, props, faces, level, fut):
+        # Runs on the encoder's result thread, not the capture loop
+        try:
+            encoded, encode_time = fut.result()
+        except Exception as e:
+            print(f"Encoding frame {props['Timestamp']} failed: {e}")
+            return
+        STATS.record("encode", encode_time)
+        if qualityController is not None:
+            qualityController.observe_frame(level, encoded.nbytes)
+        if archive is not None:
+            # Written by the archive thread; a full queue skips the copy
+            archive.submit(encoded, timestamp_ms, encoder.extension)
+        meta = {"props": props, "faces": faces, "format": encoder.vdms_format,
+                "encode_ms": encode_time * 1000, "queued_at": time.time()}
+        if uploadProcess is not None:
+            uploadProcess.put(meta, encoded)
+        elif imageSpool is not None:
+            with STATS.time("spool_write"):
+                imageSpool.append(meta, encoded)
+        else:
+            imageQueue.put(dict(meta, image=encoded))
+
+    motion_detector = MotionDetector()
+    use_motion = gate.mode in ("motion", "any")
+
+    def process_detections():
+        # Labels, gates and encodes frames once their result is known, in
+        # capture order, off the capture thread
+        while True:
+            try:
+                frame, result, status = correlator.get(timeout=1.0)
+            except queue.Empty:
+                if capture_finished.is_set() and correlator.pending() == 0:
+                    return
+                continue
+            STATS.record("result_wait", frame.pop("result_wait"))
+            STATS.incr(f"results_{status}")
+
+            props = frame["props"]
+            # Packed float16 arrays, see smartspace.landmarks; base64 in
+            # the VDMS property, raw bytes in the detection log. Results
+            # from a DetectorPool come packed already.
+            if isinstance(result, Detection):
+                packed, faces = result.packed, result.faces
+            else:
+                packed = landmarks.encode_result(result)
+                faces = len(result.face_landmarks) if result else 0
+            props["Landmark"] = base64.b64encode(packed).decode("ascii")
+            props["Detection"] = status
+
+            # The gate keeps frames with faces or motion (plus pre/post-roll
+            # and heartbeats); only those are encoded, in the worker pool,
+            # then written to disk and queued for upload
+            frame["faces"] = faces
+            props["Faces"] = faces
+            motion = 0.0
+            if use_motion:
+                with STATS.time("motion"):
+                    motion = motion_detector.score(frame.pop("detect_image"))
+            frame.pop("detect_image", None)
+            for kept in gate.offer(frame, faces, motion):
+                kept["props"]["Gate"] = kept["gate"]
+                # With --adaptive, quality and then resolution step down
+                # while the upload backlog grows; both are recorded
+                level, quality, scale = 0, encoder.quality, 1.0
+                if qualityController is not None:
+                    level, quality, scale = qualityController.settings(upload_backlog())
+                height, width = kept["image"].shape[:2]
+                kept["props"]["Quality"] = quality
+                kept["props"]["Width"] = round(width * scale)
+                kept["props"]["Height"] = round(height * scale)
+                encoder.submit(kept["image"], quality, scale).add_done_callback(
+                    functools.partial(save_encoded, kept["timestamp_ms"],
+                                      kept["props"], kept["faces"], level))
+
+            with STATS.time("log_write"):
+                detection_log.append(frame["timestamp_ms"], packed, faces, status)
+
+    capture_finished = threading.Event()
+    labeller = threading.Thread(target=process_detections, name="labeller")
+    labeller.start()
 
     # Continuously capture images from the camera and run inference
     try:
         while time.time() < end_time:
-            start_time = time.time()
-            image = picam2.capture_array()
-            rgb_image = image
-            mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_image)
-
-            # Converting Image to Bytes
-            image_data = mp_image.numpy_view()
-            success, png_bytes = cv2.imencode('.png', image_data)
-            png_bytes = png_bytes.tobytes()
-
-            # Run face landmarker using the model
-            detector.detect_async(mp_image, time.time_ns() // 1_000_000)
-
-            # Save the image at the specified frame rate
-            image_filename = os.path.join(output_dir, f'image_{datetime.now().strftime("%Y%m%d_%H%M%S")}.jpg')
-            cv2.imwrite(image_filename, image)
-
-            #Set the properties for the image
-            props = {}
-            props["ID"] = ID
-            props["Timestamp"] = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
-            props["Landmark"] = str(DETECTION_RESULT)
-            props["Date"] = str(date.today())
-            props["Data"] = "YES"
-
-            # Add the image to the queue
-            queueLock.acquire()
-            imageQueue.put({"image": png_bytes, "props": props})
-            queueLock.release()
-    
-            # Write the timestamp and detection result to the output file
-            f.write(datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3])
-            f.write(" ")
-            f.write(str(DETECTION_RESULT))
-            f.write("\n")
-            
-            # Wait for the remaining time to meet the desired frame rate
-            elapsed_time = time.time() - start_time
-            if elapsed_time < capture_interval:
-                time.sleep(capture_interval - elapsed_time)
-
-
-    except KeyboardInterrupt:
+            # Capture on the next wall-clock tick, not a fixed sleep after
+            # the previous frame, so the rate does not drift
+            tick, jitter = scheduler.wait()
+            STATS.record("trigger_jitter", jitter)
+
+            # The landmarker gets the low-res frame when one is configured
+            with STATS.time("capture"):
+                image, rgb_image = source.read()
+            STATS.incr("frames_captured")
+
+            # Run face landmarker using the model; the frame is parked in
+            # the correlator until its result comes back
+            timestamp_ms = correlator.next_timestamp()
+
+            #Set the properties for the image; typed ones (epoch ms, date,
+            # camera number) are indexed on the servers, see
+            # smartspace.properties
+            props = frame_properties(ID, timestamp_ms, tick)
+            correlator.add_frame(timestamp_ms, {
+                "image": image, "detect_image": rgb_image,
+                "props": props,
+                "timestamp_ms": timestamp_ms})
+            if detector_pool is not None:
+                # Skipped when every worker is busy; the frame then times
+                # out in the correlator
+                detector_pool.submit(timestamp_ms, rgb_image)
+            else:
+                mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_image)
+                detector.detect_async(mp_image, timestamp_ms)
+            # Frames in a FrameRing free their slot once nothing holds
+            # them, so don't keep this one alive through the next wait
+            del image, rgb_image
+            correlator.expire()
+
+
+    except (KeyboardInterrupt, EOFError):
         pass
 
-    detector.close()
+    # Give the last frames a chance to get their results before labelling
+    # stops, then let the labeller drain
+    correlator.flush()
+    capture_finished.set()
+    labeller.join()
+
+    source.close()
+    if detector_pool is not None:
+        detector_pool.close()
+    else:
+        detector.close()
     cv2.destroyAllWindows()
-    f.close()
+    detection_log.close()
 
 def main():
     parser = argparse.ArgumentParser(
@@ -285,26 +482,400 @@ def main():
         '--fps',
         help='Frame rate for saving images.',
         required=False,
+        type=float,
         default=1)  # Default to 1 frame per second
+    parser.add_argument(
+        '--phase',
+        help='Offset in seconds of the capture ticks from the wall-clock '
+             'multiples of 1/fps.',
+        required=False,
+        type=float,
+        default=0)
+    parser.add_argument(
+        '--overrun',
+        help='After a capture overruns its tick, skip the missed ticks or '
+             'catch up by capturing them immediately.',
+        required=False,
+        choices=["skip", "catch_up"],
+        default="skip")
+    parser.add_argument(
+        '--batchSize',
+        help='Max number of frames uploaded to VDMS in one transaction.',
+        required=False,
+        type=int,
+        default=8)
+    parser.add_argument(
+        '--batchBytes',
+        help='Max bytes of image data uploaded to VDMS in one transaction.',
+        required=False,
+        type=int,
+        default=64 * 1024 * 1024)
+    parser.add_argument(
+        '--batchLatency',
+        help='Max seconds a frame waits for its batch to fill before upload.',
+        required=False,
+        type=float,
+        default=2.0)
+    parser.add_argument(
+        '--queueSize',
+        help='Max number of encoded frames held in memory for upload, '
+             'when --spoolDir is empty.',
+        required=False,
+        type=int,
+        default=32)
+    parser.add_argument(
+        '--queuePolicy',
+        help='What to do when the upload queue is full. With the spool '
+             '(--spoolDir) frames never wait in memory and only '
+             '--spoolBytes evicts them, so the policy does not apply.',
+        required=False,
+        choices=["block", "drop_oldest", "drop_newest", "faces_only"],
+        default="drop_oldest")
+    parser.add_argument(
+        '--codec',
+        help='Format frames are encoded to, for both local storage and VDMS '
+             '(which has no webp format).',
+        required=False,
+        choices=UPLOAD_CODECS,
+        default="jpg")
+    parser.add_argument(
+        '--quality',
+        help='JPEG/WebP quality (0-100) or PNG compression level (0-9). '
+             'Defaults to the codec\'s own default.',
+        required=False,
+        type=int,
+        default=None)
+    parser.add_argument(
+        '--encodeWorkers',
+        help='Number of processes encoding frames.',
+        required=False,
+        type=int,
+        default=2)
+    parser.add_argument(
+        '--detectWidth',
+        help='Width of the low-res frame used for face detection, a '
+             'multiple of 64 for the Pi camera (e.g. 1024). Other sources '
+             'downscale to it. 0 detects on the full-res frame.',
+        required=False,
+        type=int,
+        default=0)
+    parser.add_argument(
+        '--detectHeight',
+        help='Height of the low-res stream used for face detection.',
+        required=False,
+        type=int,
+        default=0)
+    parser.add_argument(
+        '--source',
+        help='Frame source: "picamera", "synthetic", or a directory of '
+             'images or a video file to replay.',
+        required=False,
+        default="picamera")
+    parser.add_argument(
+        '--sourceFps',
+        help='Rate at which synthetic/replay sources produce frames, '
+             '0 for as fast as possible.',
+        required=False,
+        type=float,
+        default=0)
+    parser.add_argument(
+        '--statsPort',
+        help='Port serving stage timings as JSON (/stats) and Prometheus '
+             'text (/metrics). 0 disables it.',
+        required=False,
+        type=int,
+        default=8765)
+    parser.add_argument(
+        '--statsHost',
+        help='Address the stats endpoint listens on.',
+        required=False,
+        default="127.0.0.1")
+    parser.add_argument(
+        '--statsInterval',
+        help='Seconds between stats summary log lines, 0 disables them.',
+        required=False,
+        type=float,
+        default=60)
+    parser.add_argument(
+        '--spoolDir',
+        help='Directory of the on-disk upload spool. Frames wait there '
+             'until VDMS accepts them, across outages and restarts, and '
+             'are only dropped by --spoolBytes. Empty uses the in-memory '
+             'queue and its --queuePolicy instead.',
+        required=False,
+        default="spool")
+    parser.add_argument(
+        '--spoolBytes',
+        help='Disk budget of the spool; the oldest frames are evicted '
+             'beyond it.',
+        required=False,
+        type=int,
+        default=2 * 1024 ** 3)
+    parser.add_argument(
+        '--drainTimeout',
+        help='Seconds to keep uploading the spool after capture stops.',
+        required=False,
+        type=float,
+        default=30)
+    parser.add_argument(
+        '--gate',
+        help='Keep only frames with faces, motion, or either ("any"); '
+             '"off" keeps every frame.',
+        required=False,
+        choices=["off", "faces", "motion", "any"],
+        default="off")
+    parser.add_argument(
+        '--motionThreshold',
+        help='Mean absolute frame difference (0-255) that counts as motion.',
+        required=False,
+        type=float,
+        default=8.0)
+    parser.add_argument(
+        '--preRoll',
+        help='Frames kept from before each gated event.',
+        required=False,
+        type=int,
+        default=2)
+    parser.add_argument(
+        '--postRoll',
+        help='Frames kept after each gated event.',
+        required=False,
+        type=int,
+        default=2)
+    parser.add_argument(
+        '--heartbeat',
+        help='Seconds between frames kept from an empty room, 0 for none.',
+        required=False,
+        type=float,
+        default=60)
+    parser.add_argument(
+        '--resultCapacity',
+        help='Max frames held while waiting for their landmarker result, '
+             'and again while waiting to be labelled; beyond that the '
+             'oldest are dropped.',
+        required=False,
+        type=int,
+        default=16)
+    parser.add_argument(
+        '--resultTimeout',
+        help='Seconds a frame waits for its landmarker result.',
+        required=False,
+        type=float,
+        default=1.0)
+    parser.add_argument(
+        '--logDir',
+        help='Directory of the binary detection log (smartspace.detection_log).',
+        required=False,
+        default="logs")
+    parser.add_argument(
+        '--logRotateBytes',
+        help='Start a new detection log file beyond this size.',
+        required=False,
+        type=int,
+        default=64 * 1024 * 1024)
+    parser.add_argument(
+        '--logRotateSeconds',
+        help='Start a new detection log file after this many seconds.',
+        required=False,
+        type=float,
+        default=3600)
+    parser.add_argument(
+        '--archiveDir',
+        help='Directory of the local image archive, one folder per day. '
+             'Empty disables the archive.',
+        required=False,
+        default="output")
+    parser.add_argument(
+        '--archiveBytes',
+        help='Disk budget of the archive; the oldest images are deleted '
+             'beyond it.',
+        required=False,
+        type=int,
+        default=8 * 1024 ** 3)
+    parser.add_argument(
+        '--archiveQueue',
+        help='Images waiting for the archive writer before new ones are '
+             'skipped.',
+        required=False,
+        type=int,
+        default=64)
+    parser.add_argument(
+        '--adaptive',
+        help='Lower JPEG/WebP quality, then resolution, while the upload '
+             'backlog grows beyond --targetBacklog, and restore them when the '
+             'link recovers. PNG only steps the resolution.',
+        action='store_true')
+    parser.add_argument(
+        '--minQuality',
+        help='Lowest quality --adaptive goes down to (ignored for PNG).',
+        required=False,
+        type=int,
+        default=50)
+    parser.add_argument(
+        '--minScale',
+        help='Smallest fraction of the full resolution --adaptive uploads.',
+        required=False,
+        type=float,
+        default=0.5)
+    parser.add_argument(
+        '--targetBacklog',
+        help='Upload backlog (frames) --adaptive holds the link to; '
+             'defaults to twice --batchSize.',
+        required=False,
+        type=int,
+        default=0)
+    parser.add_argument(
+        '--rttLimit',
+        help='Upload round trip in seconds beyond which --adaptive steps '
+             'down regardless of the backlog, 0 for none.',
+        required=False,
+        type=float,
+        default=0)
+    parser.add_argument(
+        '--pipeline',
+        help='Run capture, detection, encoding and upload as threads of '
+             'this process, or as separate processes that pass frames '
+             'through shared memory (smartspace.pipeline).',
+        required=False,
+        choices=["threads", "processes"],
+        default="threads")
+    parser.add_argument(
+        '--ringSlots',
+        help='Frames the shared-memory ring of --pipeline processes holds. '
+             'Frames waiting for detection, encoding or in the gate\'s '
+             'pre-roll keep their slot; with none free a tick is skipped.',
+        required=False,
+        type=int,
+        default=8)
+    parser.add_argument(
+        '--detectWorkers',
+        help='Landmarker processes with --pipeline processes.',
+        required=False,
+        type=int,
+        default=1)
     args = parser.parse_args()
 
+    global imageQueue, imageSpool, qualityController, uploadProcess
+
+    detect_size = None
+    if args.detectWidth > 0 and args.detectHeight > 0:
+        detect_size = (args.detectWidth, args.detectHeight)
+    source = sources.open_source(args.source, int(args.frameWidth),
+                                 int(args.frameHeight), args.sourceFps,
+                                 detect_size, int(args.cameraId))
+
+    ring = None
+    detector_pool = None
+    if args.pipeline == "processes":
+        # Each stage gets processes of its own; raw frames go through a
+        # ring in shared memory, never through a pipe
+        planes = [((int(args.frameHeight), int(args.frameWidth), 3), "uint8")]
+        if detect_size:
+            planes.append(((detect_size[1], detect_size[0], 3), "uint8"))
+        ring = FrameRing(args.ringSlots, planes)
+        uploadProcess = UploadProcess(
+            VDMS_SERVERS, 55555, VDMS_POLICY, args.batchSize, args.batchBytes,
+            args.batchLatency, args.spoolDir, args.spoolBytes, args.queueSize,
+            args.queuePolicy, args.drainTimeout, on_batch=log_upload,
+            on_error=log_upload_error).start()
+        detector_pool = DetectorPool({
+            "model": args.model,
+            "num_faces": int(args.numFaces),
+            "min_face_detection_confidence": float(args.minFaceDetectionConfidence),
+            "min_face_presence_confidence": float(args.minFacePresenceConfidence),
+            "min_tracking_confidence": float(args.minTrackingConfidence),
+        }, ring, args.detectWorkers, timeout=args.resultTimeout).start()
+        # Also the scheduler: capture runs on the ticks in the child
+        source = CaptureProcess(source, ring, args.fps, args.phase,
+                                args.overrun).launch()
+        scheduler = source
+    else:
+        imageQueue = FrameQueue(args.queueSize, args.queuePolicy)
+        if args.spoolDir:
+            imageSpool = Spool(args.spoolDir, max_bytes=args.spoolBytes)
+        scheduler = CaptureScheduler(args.fps, args.phase, args.overrun)
+
+    # Fork the encoder processes before any other thread is started
+    encoder = FrameEncoder(args.codec, args.quality, args.encodeWorkers,
+                           ring=ring)
+    encoder.start()
+
+    if args.adaptive:
+        qualityController = QualityController(
+            encoder.quality, args.minQuality, min_scale=args.minScale,
+            target_backlog=args.targetBacklog or 2 * args.batchSize,
+            rtt_limit=args.rttLimit, codec=args.codec)
+        STATS.gauge("quality", qualityController.stats)
+
+    archive = None
+    if args.archiveDir:
+        archive = ArchiveWriter(args.archiveDir, args.archiveBytes,
+                                args.archiveQueue,
+                                on_write=lambda path, nbytes, secs:
+                                STATS.record("disk_write", secs))
+        archive.start()
+        STATS.gauge("archive", archive.stats)
+
+    STATS.label("id", ID)
+    STATS.gauge("queue_depth", imageQueue.qsize if imageQueue is not None
+                else upload_backlog)
+    STATS.gauge("upload_backlog", upload_backlog)
+    if imageSpool is not None:
+        STATS.gauge("spool_bytes", imageSpool.total_bytes)
+        STATS.gauge("spool_evicted", lambda: imageSpool.evicted)
+    if uploadProcess is not None:
+        STATS.gauge("upload_process", uploadProcess.stats)
+        STATS.gauge("detector_pool", detector_pool.stats)
+    STATS.gauge("dropped_frames", dropped_frames)
+    STATS.gauge("detect_fps", lambda: round(FPS, 2))
+    STATS.gauge("disk_used_pct", disk_used_pct)
+    if args.statsPort:
+        StatsServer(STATS, args.statsHost, args.statsPort).start()
+    if args.statsInterval > 0:
+        STATS.start_reporter(args.statsInterval)
+
     # run(args.model, int(args.numFaces), args.minFaceDetectionConfidence,
     #     args.minFacePresenceConfidence, args.minTrackingConfidence,
     #     int(args.cameraId), args.frameWidth, args.frameHeight,
     #     int(args.recordDuration), int(args.fps))
     
+    gate = CaptureGate(args.gate, args.motionThreshold, args.preRoll,
+                       args.postRoll, args.heartbeat)
+    STATS.gauge("gate", gate.stats)
+    detection_log = DetectionLog(args.logDir, ID, args.logRotateBytes,
+                                 args.logRotateSeconds)
+
+    STATS.gauge("scheduler", scheduler.stats)
+
     thread1 = threading.Thread(target=run, args=(args.model, int(args.numFaces), args.minFaceDetectionConfidence,
         args.minFacePresenceConfidence, args.minTrackingConfidence,
-        int(args.cameraId), args.frameWidth, args.frameHeight,
-        int(args.recordDuration), int(args.fps)))
-    
-    thread2 = threading.Thread(target=send_images_to_vdms, args=(int(args.recordDuration),))
+        source, int(args.recordDuration), scheduler, encoder, gate,
+        detection_log, archive, args.resultCapacity, args.resultTimeout,
+        detector_pool))
 
     thread1.start()
-    thread2.start()
+    thread2 = None
+    if uploadProcess is None:
+        thread2 = threading.Thread(target=send_images_to_vdms, args=(args.batchSize,
+            args.batchBytes, args.batchLatency, args.drainTimeout))
+        thread2.start()
 
+    # Let in-flight encodes land before telling the sender capture is over
     thread1.join()
-    thread2.join()
+    encoder.close()
+    if archive is not None:
+        archive.close()
+    if uploadProcess is not None:
+        uploadProcess.close()
+        print(f"Uploader: {uploadProcess.stats()}")
+    else:
+        captureDone.set()
+        imageQueue.close()
+        thread2.join()
+    if imageSpool is not None:
+        imageSpool.close()
+    if ring is not None:
+        ring.close()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,6 @@
+name = "smartspace"
+
+from .frame_queue import FrameQueue
+from .encoding import FrameEncoder
+from .uploader import BatchUploader
+from .spool import Spool
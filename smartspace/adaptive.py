@@ -0,0 +1,149 @@
+"""Upload quality that adapts to what the link can carry.
+
+QualityController holds a ladder of encode settings, from full quality
+and resolution down to configured floors: JPEG or WebP quality drops in
+steps to min_quality, then the resolution steps down to min_scale. PNG is
+lossless and its "quality" is the zlib compression level, which barely
+changes the size, so for PNG the ladder skips the quality rungs and only
+steps the resolution, at the configured level. Every upload
+reports its bytes and round trip. Each interval the controller compares
+the upload backlog with its target, and the round trip with rtt_limit.
+A backlog growing above the target, or a slow round trip, moves one rung
+down. A backlog held below the target for hold seconds, on a link with
+headroom for the next rung up, moves one rung back up. Full quality thus
+returns once the link recovers.
+"""
+
+import time
+import threading
+
+
+def _ewma(previous, value, alpha=0.3):
+    return value if previous is None else previous + alpha * (value - previous)
+
+
+class QualityController(object):
+    """Chooses (quality, scale) per frame from measured upload throughput.
+
+    observe() is called after every upload, with its size and round trip,
+    and observe_frame() with each uploaded frame's level and size;
+    settings(backlog) is called before every encode.
+    """
+
+    def __init__(self, quality: int = 90, min_quality: int = 50,
+                 quality_step: int = 10, scales=(1.0, 0.75, 0.5),
+                 min_scale: float = 0.5, target_backlog: int = 16,
+                 rtt_limit: float = 0.0, interval: float = 2.0,
+                 hold: float = 10.0, codec: str = "jpg"):
+        # Best first: lower quality at full size, then smaller frames at
+        # the lowest quality
+        qualities = list(range(quality, min_quality - 1, -quality_step)) or [quality]
+        if qualities[-1] != min_quality and min_quality < quality:
+            qualities.append(min_quality)
+        if codec == "png":
+            qualities = [quality]
+        self.levels = [(q, 1.0) for q in qualities]
+        self.levels += [(qualities[-1], s) for s in scales if min_scale <= s < 1.0]
+
+        self.target_backlog = target_backlog
+        self.rtt_limit = rtt_limit
+        self.interval = interval
+        self.hold = hold
+
+        self.level = 0
+        self._lock = threading.Lock()
+        self._last_update = None
+        self._last_change = 0.0
+        self._below_since = None
+        self._last_backlog = 0
+        self._window_bytes = 0
+
+        self.throughput = None  # bytes/sec while an upload is in flight
+        self.demand = None  # bytes/sec uploaded over wall-clock time
+        self.rtt = None
+        self.frame_bytes = {}  # level -> mean encoded frame size
+        self.steps_down = 0
+        self.steps_up = 0
+
+    def observe(self, nbytes: int, latency: float):
+        """Records one upload's size and round trip."""
+        if latency <= 0:
+            return
+        with self._lock:
+            self.throughput = _ewma(self.throughput, nbytes / latency)
+            self.rtt = _ewma(self.rtt, latency)
+            self._window_bytes += nbytes
+
+    def observe_frame(self, level: int, nbytes: int):
+        """Records the size of a frame encoded at level."""
+        with self._lock:
+            self.frame_bytes[level] = _ewma(self.frame_bytes.get(level), nbytes)
+
+    def settings(self, backlog: int, now: float = None):
+        """Returns (level, quality, scale) for the next frame."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self._last_update is None:
+                self._last_update = now
+            elif now - self._last_update >= self.interval:
+                self.demand = _ewma(self.demand,
+                                    self._window_bytes / (now - self._last_update))
+                self._window_bytes = 0
+                self._last_update = now
+                self._update(backlog, now)
+                self._last_backlog = backlog
+            return (self.level,) + self.levels[self.level]
+
+    def _update(self, backlog, now):
+        slow = self.rtt_limit > 0 and self.rtt is not None and self.rtt > self.rtt_limit
+        growing = backlog > self.target_backlog and backlog >= self._last_backlog
+        if slow or growing:
+            self._below_since = None
+            if self.level < len(self.levels) - 1:
+                self.level += 1
+                self.steps_down += 1
+                self._last_change = now
+            return
+
+        if backlog > self.target_backlog // 2:
+            self._below_since = None
+            return
+        if self._below_since is None:
+            self._below_since = now
+        if self.level == 0 or now - self._below_since < self.hold \
+                or now - self._last_change < self.hold:
+            return
+        if not self._has_headroom():
+            return
+        self.level -= 1
+        self.steps_up += 1
+        self._last_change = now
+        self._below_since = now
+
+    def _has_headroom(self):
+        """Whether the link could carry the better rung's frames.
+
+        With the backlog low, the upload rate over wall-clock time is what
+        the current frames need; the better rung needs that times the ratio
+        of frame sizes (measured there before, else assumed double). Without
+        measurements the backlog alone decides.
+        """
+        current = self.frame_bytes.get(self.level)
+        if self.throughput is None or self.demand is None or not current:
+            return True
+        better = self.frame_bytes.get(self.level - 1, 2 * current)
+        return self.demand * better / current < 0.8 * self.throughput
+
+    def stats(self):
+        with self._lock:
+            quality, scale = self.levels[self.level]
+            return {
+                "level": self.level,
+                "quality": quality,
+                "scale": scale,
+                "throughput_mbps": round((self.throughput or 0.0) * 8 / 1e6, 2),
+                "demand_mbps": round((self.demand or 0.0) * 8 / 1e6, 2),
+                "rtt_ms": round((self.rtt or 0.0) * 1000, 1),
+                "steps_down": self.steps_down,
+                "steps_up": self.steps_up,
+            }
@@ -0,0 +1,207 @@
+"""Local archive of encoded frames, written off the capture path.
+
+ArchiveWriter takes encoded frames through a bounded queue and writes them
+on its own thread in batches, so a stalling SD card delays the archive
+instead of the capture loop. Files are named from the frame's millisecond
+timestamp and never overwrite each other:
+
+    <directory>/<YYYY-MM-DD>/image_<YYYYmmdd_HHMMSS>_<mmm><ext>
+
+The archive is kept under max_bytes by deleting the oldest files first
+(and the day directories they leave empty).
+"""
+
+import os
+import time
+import queue
+import threading
+import collections
+from datetime import datetime, timezone
+
+
+class ArchiveWriter(object):
+    """Bounded, batched background writer with retention by disk budget.
+
+    submit() never blocks: when the queue is full the frame is not archived
+    and counted in dropped. Each batch is everything queued when the writer
+    wakes, up to batch_size frames; with fsync the batch is synced once,
+    after all its files are written. on_write(path, nbytes, secs) is called
+    for every file written, secs being the time the write took.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 8 * 1024 ** 3,
+                 queue_size: int = 64, batch_size: int = 16,
+                 fsync: bool = False, on_write=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.on_write = on_write
+
+        self._queue = queue.Queue(queue_size)
+        self._thread = None
+        self._files = collections.deque()
+        self._lock = threading.Lock()
+
+        self.total_bytes = 0
+        self.written = 0
+        self.bytes_written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.evicted = 0
+        self.write_time = 0.0
+        self.max_write_time = 0.0
+
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        # Day directories and file names both sort chronologically
+        for day in sorted(os.listdir(self.directory)):
+            day_dir = os.path.join(self.directory, day)
+            if not os.path.isdir(day_dir):
+                continue
+            for name in sorted(os.listdir(day_dir)):
+                path = os.path.join(day_dir, name)
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    continue
+                self._files.append((path, size))
+                self.total_bytes += size
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="archive",
+                                        daemon=True)
+        self._thread.start()
+
+    def path_for(self, timestamp_ms: int, extension: str) -> str:
+        stamp = datetime.fromtimestamp(timestamp_ms / 1000, timezone.utc).astimezone()
+        return os.path.join(
+            self.directory, stamp.strftime("%Y-%m-%d"),
+            f"image_{stamp.strftime('%Y%m%d_%H%M%S')}_{timestamp_ms % 1000:03d}{extension}")
+
+    def submit(self, data, timestamp_ms: int, extension: str):
+        """Queues one encoded frame; returns its path, or None if dropped."""
+        path = self.path_for(timestamp_ms, extension)
+        try:
+            self._queue.put_nowait((path, data))
+        except queue.Full:
+            self.dropped += 1
+            return None
+        return path
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._write_batch(batch)
+            if stop:
+                return
+
+    def _write_batch(self, batch):
+        opened = []
+        for path, data in batch:
+            start = time.monotonic()
+            try:
+                f, path = self._create(path)
+            except OSError as e:
+                self.failed += 1
+                print(f"Archiving {path} failed: {e}")
+                continue
+            try:
+                f.write(memoryview(data).cast("B"))
+            except OSError as e:
+                f.close()
+                self.failed += 1
+                print(f"Archiving {path} failed: {e}")
+                continue
+            opened.append((f, path, memoryview(data).nbytes, time.monotonic() - start))
+
+        if self.fsync and opened:
+            start = time.monotonic()
+            for f, *_ in opened:
+                f.flush()
+                os.fsync(f.fileno())
+            # Charge the shared sync to every file in the batch
+            share = (time.monotonic() - start) / len(opened)
+            opened = [(f, path, n, secs + share) for f, path, n, secs in opened]
+
+        for f, path, nbytes, secs in opened:
+            f.close()
+            with self._lock:
+                self._files.append((path, nbytes))
+                self.total_bytes += nbytes
+                self.written += 1
+                self.bytes_written += nbytes
+                self.write_time += secs
+                self.max_write_time = max(self.max_write_time, secs)
+            if self.on_write is not None:
+                self.on_write(path, nbytes, secs)
+        self._enforce_budget()
+
+    def _create(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        base, ext = os.path.splitext(path)
+        n = 1
+        while True:
+            try:
+                return open(path, "xb"), path
+            except FileExistsError:
+                # Same millisecond after a restart or a clock step back
+                path = f"{base}_{n}{ext}"
+                n += 1
+
+    def _enforce_budget(self):
+        while self.total_bytes > self.max_bytes and len(self._files) > 1:
+            with self._lock:
+                path, size = self._files.popleft()
+                self.total_bytes -= size
+                self.evicted += 1
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            day_dir = os.path.dirname(path)
+            try:
+                os.rmdir(day_dir)  # only succeeds once the day is empty
+            except OSError:
+                pass
+
+    def close(self, timeout: float = None):
+        """Writes everything still queued, then stops the writer."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def mean_write_time(self):
+        with self._lock:
+            return self.write_time / self.written if self.written else 0.0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "evicted": self.evicted,
+                "bytes": self.total_bytes,
+                "mean_write_ms": round(self.write_time / self.written * 1000, 2)
+                if self.written else 0.0,
+                "max_write_ms": round(self.max_write_time * 1000, 2),
+            }
@@ -0,0 +1,156 @@
+"""Joins asynchronous landmarker results to the frames they were run on.
+
+FaceLandmarker.detect_async() reports results through a callback, tagged
+with the timestamp_ms the frame was submitted with. ResultCorrelator keeps
+submitted frames in a small ring keyed by that timestamp, pairs each
+result with its exact frame, and hands (item, result, status) triples to
+a consumer in submission order through a queue, so the capture loop never
+waits on detection.
+
+status is "matched", "skipped" (the landmarker dropped the frame, which it
+does in live-stream mode when busy: a later frame's result arrived first),
+"timeout" (no result within timeout) or "evicted" (the ring was full).
+
+The queue to the consumer is a FrameQueue of ready_size, with its
+overflow policy: a consumer that falls behind makes released frames
+drop (counted in stats()) or, with "block", holds up the producers,
+rather than raw frames piling up in memory. Frames are handed to it
+after the correlator's own lock is released, so a blocked put never
+stalls add_frame() or add_result() calls that release nothing.
+"""
+
+import time
+import threading
+import collections
+
+from .frame_queue import FrameQueue
+
+
+def _has_faces(entry):
+    _, result, _ = entry
+    if result is None:
+        return False
+    faces = getattr(result, "faces", None)  # pipeline.Detection
+    if faces is None:
+        faces = len(result.face_landmarks)
+    return faces > 0
+
+
+class ResultCorrelator(object):
+    def __init__(self, capacity: int = 16, timeout: float = 1.0,
+                 ready_size: int = None, policy: str = "drop_oldest"):
+        self.capacity = capacity
+        self.timeout = timeout
+        self.ready = FrameQueue(ready_size or capacity, policy, has_faces=_has_faces)
+
+        self._pending = collections.OrderedDict()
+        self._lock = threading.Lock()
+        # Releases are numbered under _lock and put in that order after it
+        # is let go, so the consumer still sees submission order
+        self._turn = threading.Condition(threading.Lock())
+        self._next_ticket = 0
+        self._serving = 0
+        self._last_ts = -1
+
+        self.counts = collections.Counter()
+
+    def next_timestamp(self) -> int:
+        """A strictly increasing millisecond timestamp for detect_async()."""
+        with self._lock:
+            self._last_ts = max(self._last_ts + 1, time.time_ns() // 1_000_000)
+            return self._last_ts
+
+    def add_frame(self, timestamp_ms: int, item):
+        """Registers a frame submitted with timestamp_ms. Never blocks,
+        unless it evicts a frame into a full "block" ready queue."""
+        released = []
+        with self._lock:
+            self._pending[timestamp_ms] = (item, time.monotonic())
+            while len(self._pending) > self.capacity:
+                released.append(self._release_first(None, "evicted"))
+            ticket = self._ticket(released)
+        self._publish(ticket, released)
+
+    def add_result(self, timestamp_ms: int, result):
+        """Called from the landmarker callback with the frame's timestamp."""
+        released = []
+        with self._lock:
+            if timestamp_ms not in self._pending:
+                self.counts["late"] += 1
+                return
+            # Results come back in order, so earlier frames still waiting
+            # were dropped by the landmarker and will never get one
+            while next(iter(self._pending)) != timestamp_ms:
+                released.append(self._release_first(None, "skipped"))
+            released.append(self._release_first(result, "matched"))
+            ticket = self._ticket(released)
+        self._publish(ticket, released)
+
+    def expire(self):
+        """Releases frames that have waited longer than timeout."""
+        now = time.monotonic()
+        released = []
+        with self._lock:
+            while self._pending:
+                _, (_, added) = next(iter(self._pending.items()))
+                if now - added < self.timeout:
+                    break
+                released.append(self._release_first(None, "timeout"))
+            ticket = self._ticket(released)
+        self._publish(ticket, released)
+
+    def flush(self, wait: float = None):
+        """Waits up to wait seconds (default timeout) for outstanding
+        results, then releases every frame still pending."""
+        deadline = time.monotonic() + (self.timeout if wait is None else wait)
+        while time.monotonic() < deadline:
+            with self._lock:
+                if not self._pending:
+                    return
+            time.sleep(0.01)
+        released = []
+        with self._lock:
+            while self._pending:
+                released.append(self._release_first(None, "timeout"))
+            ticket = self._ticket(released)
+        self._publish(ticket, released)
+
+    def _release_first(self, result, status):
+        # Caller holds _lock and publishes the entry once it is released
+        _, (item, added) = self._pending.popitem(last=False)
+        self.counts[status] += 1
+        item["result_wait"] = time.monotonic() - added
+        return item, result, status
+
+    def _ticket(self, released):
+        # Caller holds _lock
+        if not released:
+            return None
+        self._next_ticket += 1
+        return self._next_ticket - 1
+
+    def _publish(self, ticket, released):
+        if ticket is None:
+            return
+        with self._turn:
+            self._turn.wait_for(lambda: self._serving == ticket)
+            try:
+                for entry in released:
+                    self.ready.put(entry)
+            finally:
+                self._serving += 1
+                self._turn.notify_all()
+
+    def get(self, timeout: float = None):
+        """Next (item, result, status) in submission order; raises
+        queue.Empty after timeout."""
+        return self.ready.get(timeout=timeout)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts, pending=len(self._pending),
+                        ready=self.ready.qsize(), dropped=self.ready.dropped())
@@ -0,0 +1,254 @@
+"""Buffered, rotating, binary log of per-frame detection results.
+
+Replaces the text output.txt. Records are buffered in memory and written
+as columnar chunks, and files rotate by size or age:
+
+    file   "SSDL" magic, u8 version, then chunks
+    chunk  u32 records, u32 landmark bytes,
+           int64 timestamp_ms[records], u8 faces[records],
+           u8 status[records], u32 landmark_len[records],
+           landmark records (smartspace.landmarks format), concatenated
+
+load() reads a day's records back into NumPy arrays in one call.
+"""
+
+import os
+import glob
+import time
+import struct
+from datetime import datetime, timezone
+
+import numpy as np
+
+from . import landmarks
+
+MAGIC = b"SSDL"
+VERSION = 1
+SUFFIX = ".sdl"
+
+STATUS_CODES = {"matched": 0, "skipped": 1, "timeout": 2, "evicted": 3}
+STATUS_NAMES = {v: k for k, v in STATUS_CODES.items()}
+
+_FILE_HEADER = struct.Struct("<4sB")
+_CHUNK_HEADER = struct.Struct("<II")
+_DAY_MS = 86_400_000
+
+
+class DetectionLog(object):
+    """Single-writer detection log.
+
+    A chunk is written every flush_records records or flush_interval
+    seconds, whichever comes first; a new file is started once the
+    current one exceeds max_bytes or is older than max_age seconds.
+    """
+
+    def __init__(self, directory: str, prefix: str = "detections",
+                 max_bytes: int = 64 * 1024 * 1024, max_age: float = 3600,
+                 flush_records: int = 256, flush_interval: float = 10.0):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.flush_records = flush_records
+        self.flush_interval = flush_interval
+
+        self._file = None
+        self._opened = 0.0
+        self._day = None
+        self._size = 0
+        self._last_flush = time.monotonic()
+        self._timestamps = []
+        self._faces = []
+        self._status = []
+        self._records = []
+
+        self.records = 0
+        self.bytes_written = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def append(self, timestamp_ms: int, packed: bytes, faces: int = 0,
+               status: str = "matched"):
+        """Buffers one frame's packed landmarks (landmarks.encode_result)."""
+        self._timestamps.append(timestamp_ms)
+        self._faces.append(min(faces, 255))
+        self._status.append(STATUS_CODES.get(status, 255))
+        self._records.append(packed)
+        self.records += 1
+        if (len(self._records) >= self.flush_records
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        if not self._records:
+            return
+        # Files also rotate at UTC midnight so load() can pick a day by name;
+        # the day comes from the record timestamps, and a buffer that spans
+        # midnight is written as one chunk per day
+        days = np.asarray(self._timestamps, dtype=np.int64) // _DAY_MS
+        splits = np.flatnonzero(np.diff(days)) + 1
+        start = 0
+        for end in splits.tolist() + [len(self._records)]:
+            self._write_chunk(start, end, int(days[start]))
+            start = end
+
+        self._timestamps = []
+        self._faces = []
+        self._status = []
+        self._records = []
+
+    def _write_chunk(self, start, end, day):
+        if self._file is None or self._size >= self.max_bytes \
+                or time.monotonic() - self._opened >= self.max_age \
+                or day != self._day:
+            self._rotate(self._timestamps[start])
+
+        records = self._records[start:end]
+        lengths = np.fromiter((len(r) for r in records), dtype="<u4",
+                              count=len(records))
+        body = b"".join(records)
+        chunk = b"".join((
+            _CHUNK_HEADER.pack(len(records), len(body)),
+            np.asarray(self._timestamps[start:end], dtype="<i8").tobytes(),
+            np.asarray(self._faces[start:end], dtype=np.uint8).tobytes(),
+            np.asarray(self._status[start:end], dtype=np.uint8).tobytes(),
+            lengths.tobytes(),
+            body,
+        ))
+        self._file.write(chunk)
+        self._file.flush()
+        self._size += len(chunk)
+        self.bytes_written += len(chunk)
+
+    def _rotate(self, timestamp_ms):
+        if self._file is not None:
+            self._file.close()
+        stamp = datetime.fromtimestamp(timestamp_ms / 1000, timezone.utc)
+        name = f"{self.prefix}_{stamp.strftime('%Y%m%d_%H%M%S')}_{timestamp_ms % 1000:03d}"
+        path = os.path.join(self.directory, name + SUFFIX)
+        # A restart within the same millisecond must not clobber a file
+        n = 1
+        while os.path.exists(path):
+            path = os.path.join(self.directory, f"{name}_{n}{SUFFIX}")
+            n += 1
+        self._file = open(path, "wb")
+        self._file.write(_FILE_HEADER.pack(MAGIC, VERSION))
+        self._size = _FILE_HEADER.size
+        self._opened = time.monotonic()
+        self._day = timestamp_ms // _DAY_MS
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_file(path):
+    """Returns (timestamp_ms, faces, status, list of packed records)."""
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version = _FILE_HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} detection log")
+
+    view = memoryview(data)
+    pos = _FILE_HEADER.size
+    timestamps, faces, status, records = [], [], [], []
+    while pos + _CHUNK_HEADER.size <= len(view):
+        n, body_len = _CHUNK_HEADER.unpack_from(view, pos)
+        pos += _CHUNK_HEADER.size
+        end = pos + n * 14 + body_len
+        if end > len(view):
+            break  # chunk cut short by a crash
+        timestamps.append(np.frombuffer(view, "<i8", n, pos))
+        pos += n * 8
+        faces.append(np.frombuffer(view, np.uint8, n, pos))
+        pos += n
+        status.append(np.frombuffer(view, np.uint8, n, pos))
+        pos += n
+        lengths = np.frombuffer(view, "<u4", n, pos)
+        pos += n * 4
+        for length in lengths.tolist():
+            records.append(view[pos:pos + length])
+            pos += length
+
+    def cat(parts, dtype):
+        return np.concatenate(parts) if parts else np.zeros(0, dtype)
+
+    return cat(timestamps, np.int64), cat(faces, np.uint8), cat(status, np.uint8), records
+
+
+def _pad(arrays, width_axis, dtype):
+    """Concatenates arrays along axis 0, NaN-padding axis width_axis to the
+    widest of them."""
+    width = max(a.shape[width_axis] for a in arrays)
+    padded = []
+    for a in arrays:
+        if a.shape[width_axis] < width:
+            pad = [(0, 0)] * a.ndim
+            pad[width_axis] = (0, width - a.shape[width_axis])
+            a = np.pad(a, pad, constant_values=np.nan)
+        padded.append(a)
+    return np.concatenate(padded).astype(dtype, copy=False)
+
+
+def load(directory: str, day: str = None, prefix: str = "*"):
+    """Loads every log in directory (optionally only the records of one UTC
+    day, "YYYY-MM-DD") into NumPy arrays.
+
+    Returns a dict with per-frame arrays "timestamp_ms", "faces" and
+    "status", and per-face arrays "landmarks" (faces, N, 3), "blendshapes"
+    (faces, B) and "frame" (index of the frame each face belongs to).
+    Faces with fewer landmarks or blendshapes than the widest record, or
+    none stored, are padded with NaN.
+    """
+    patterns = [f"{prefix}_*{SUFFIX}"]
+    start = end = None
+    if day:
+        start = int(datetime.strptime(day, "%Y-%m-%d").replace(
+            tzinfo=timezone.utc).timestamp() * 1000)
+        end = start + _DAY_MS
+        # Logs written before chunks were split at midnight can hold the
+        # first records of the day in a file named for the day before
+        before = datetime.fromtimestamp((start - _DAY_MS) / 1000, timezone.utc)
+        patterns = [f"{prefix}_{before.strftime('%Y%m%d')}*{SUFFIX}",
+                    f"{prefix}_{day.replace('-', '')}*{SUFFIX}"]
+
+    paths = sorted(set(path for pattern in patterns
+                       for path in glob.glob(os.path.join(directory, pattern))))
+    timestamps, faces, status, records = [], [], [], []
+    for path in paths:
+        t, f, s, r = read_file(path)
+        if start is not None:
+            keep = (t >= start) & (t < end)
+            t, f, s = t[keep], f[keep], s[keep]
+            r = [r[i] for i in np.flatnonzero(keep).tolist()]
+        timestamps.append(t)
+        faces.append(f)
+        status.append(s)
+        records.extend(r)
+
+    timestamps = np.concatenate(timestamps) if timestamps else np.zeros(0, np.int64)
+    faces = np.concatenate(faces) if faces else np.zeros(0, np.uint8)
+    status = np.concatenate(status) if status else np.zeros(0, np.uint8)
+
+    face_landmarks, face_blendshapes, face_frame = [], [], []
+    for i in np.flatnonzero(faces).tolist():
+        arrays = landmarks.decode(records[i])
+        if not len(arrays["landmarks"]):
+            continue
+        face_landmarks.append(arrays["landmarks"])
+        face_blendshapes.append(arrays["blendshapes"])
+        face_frame.extend([i] * len(arrays["landmarks"]))
+
+    return {
+        "timestamp_ms": timestamps,
+        "faces": faces,
+        "status": status,
+        "landmarks": _pad(face_landmarks, 1, np.float32) if face_landmarks
+        else np.zeros((0, 0, 3), np.float32),
+        "blendshapes": _pad(face_blendshapes, 1, np.float32) if face_blendshapes
+        else np.zeros((0, 0), np.float32),
+        "frame": np.asarray(face_frame, dtype=np.int64),
+    }
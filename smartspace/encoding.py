@@ -0,0 +1,141 @@
+"""Single-pass frame encoding in a worker pool."""
+
+import time
+import threading
+import concurrent.futures
+import multiprocessing
+
+import cv2
+
+from .frame_ring import shared_array
+
+# codec name -> (file extension, OpenCV quality flag, VDMS AddImage format).
+# VDMS has no webp format, so webp frames can be encoded and archived but
+# not uploaded; build_batch_query() refuses them
+CODECS = {
+    "jpg": (".jpg", cv2.IMWRITE_JPEG_QUALITY, "jpg"),
+    "png": (".png", cv2.IMWRITE_PNG_COMPRESSION, "png"),
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY, None),
+}
+
+# Codecs VDMS stores
+UPLOAD_CODECS = [codec for codec, (_, _, fmt) in CODECS.items() if fmt]
+
+# For png the "quality" is the zlib compression level (0-9)
+DEFAULT_QUALITY = {"jpg": 90, "png": 1, "webp": 90}
+
+
+def encode_frame(image, codec: str = "jpg", quality: int = None,
+                 scale: float = 1.0):
+    """Encodes one frame, first downscaled by scale if below 1. Returns
+    (encoded ndarray, seconds spent)."""
+    ext, flag, _ = CODECS[codec]
+    if quality is None:
+        quality = DEFAULT_QUALITY[codec]
+    start = time.perf_counter()
+    if scale < 1.0:
+        image = cv2.resize(image, None, fx=scale, fy=scale,
+                           interpolation=cv2.INTER_AREA)
+    success, encoded = cv2.imencode(ext, image, [flag, int(quality)])
+    if not success:
+        raise ValueError(f"cv2.imencode failed for {codec}")
+    return encoded, time.perf_counter() - start
+
+
+def _encode_shared(location, codec: str, quality: int, scale: float):
+    # Runs in a worker: the frame is read straight from the FrameRing
+    return encode_frame(shared_array(*location), codec, quality, scale)
+
+
+def _warm_up():
+    return True
+
+
+class FrameEncoder(object):
+    """Encodes frames once, off the capture thread, in a process pool.
+
+    submit() returns a future for (encoded ndarray, encode seconds). At most
+    max_pending frames are being encoded or waiting for a worker; beyond
+    that submit() blocks, which throttles capture instead of letting raw
+    48 MB frames pile up in memory.
+
+    With a smartspace.frame_ring.FrameRing, frames that live in one of its
+    slots reach the worker processes as a location in shared memory rather
+    than a pickled copy; the slot is held until the frame is encoded.
+    """
+
+    def __init__(self, codec: str = "jpg", quality: int = None,
+                 workers: int = 2, max_pending: int = None,
+                 use_processes: bool = True, ring=None):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec: {codec}")
+
+        self.codec = codec
+        self.quality = DEFAULT_QUALITY[codec] if quality is None else quality
+        self.extension, _, self.vdms_format = CODECS[codec]
+        self.workers = workers
+        # Threads see the frames directly
+        self.ring = ring if use_processes else None
+
+        if use_processes:
+            # fork keeps worker start-up cheap; call start() before other
+            # threads exist so the workers are forked from a quiet process
+            self._pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("fork"))
+        else:
+            # cv2.imencode releases the GIL, so threads also run in parallel
+            self._pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="encoder")
+        self._slots = threading.BoundedSemaphore(max_pending or 2 * workers)
+        # future -> ring view being encoded, held so its slot is not
+        # reused while the worker reads it
+        self._shared = {}
+
+        self.frames = 0
+        self.encode_time = 0.0
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Spawns the worker processes up front."""
+        concurrent.futures.wait(
+            [self._pool.submit(_warm_up) for _ in range(self.workers)])
+
+    def submit(self, image, quality: int = None, scale: float = 1.0):
+        """quality (default: the encoder's) and scale apply to this frame
+        only, e.g. as chosen by smartspace.adaptive.QualityController."""
+        quality = self.quality if quality is None else quality
+        location = self.ring.locate(image) if self.ring is not None else None
+        self._slots.acquire()
+        try:
+            if location is None:
+                fut = self._pool.submit(encode_frame, image, self.codec,
+                                        quality, scale)
+            else:
+                fut = self._pool.submit(_encode_shared, location, self.codec,
+                                        quality, scale)
+        except BaseException:
+            self._slots.release()
+            raise
+        if location is not None:
+            with self._lock:
+                self._shared[fut] = image
+        fut.add_done_callback(self._done)
+        return fut
+
+    def _done(self, fut):
+        self._slots.release()
+        with self._lock:
+            self._shared.pop(fut, None)
+        if fut.cancelled() or fut.exception() is not None:
+            return
+        with self._lock:
+            self.frames += 1
+            self.encode_time += fut.result()[1]
+
+    def mean_encode_time(self):
+        with self._lock:
+            return self.encode_time / self.frames if self.frames else 0.0
+
+    def close(self):
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,144 @@
+"""Bounded frame queue between the capture loop and the VDMS sender."""
+
+import time
+import queue
+import threading
+import collections
+
+POLICIES = ("block", "drop_oldest", "drop_newest", "faces_only")
+
+
+class FrameQueue(object):
+    """Thread-safe bounded FIFO with a configurable overflow policy.
+
+    When the queue is full, put() does one of:
+        block:        wait for the consumer (backpressure on capture)
+        drop_oldest:  evict the oldest queued frame
+        drop_newest:  discard the frame being put
+        faces_only:   evict the oldest queued frame without faces; if every
+                      queued frame has faces, discard the new one unless it
+                      has faces too, in which case evict the oldest
+    get() blocks until a frame is available, so consumers never busy-poll.
+    """
+
+    def __init__(self, maxsize: int = 32, policy: str = "block",
+                 has_faces=None):
+        if maxsize <= 0:
+            raise ValueError("FrameQueue needs a positive maxsize")
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy}")
+
+        self.maxsize = maxsize
+        self.policy = policy
+        self.has_faces = has_faces or (lambda item: item.get("faces", 0) > 0)
+
+        self._items = collections.deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._closed = False
+
+        self.put_count = 0
+        self.get_count = 0
+        self.dropped_oldest = 0
+        self.dropped_newest = 0
+        self.blocked_time = 0.0
+        self.max_depth = 0
+
+    def put(self, item, timeout=None) -> bool:
+        """Adds a frame. Returns False if the frame was dropped.
+
+        With the block policy a timeout bounds the wait; the frame is
+        dropped (and counted) if no room was made in time.
+        """
+        with self._lock:
+            if self._closed:
+                raise ValueError("put() on a closed FrameQueue")
+            self.put_count += 1
+
+            if len(self._items) >= self.maxsize:
+                if self.policy == "block":
+                    start = time.monotonic()
+                    ok = self._not_full.wait_for(
+                        lambda: len(self._items) < self.maxsize or self._closed,
+                        timeout)
+                    self.blocked_time += time.monotonic() - start
+                    if not ok or self._closed:
+                        self.dropped_newest += 1
+                        return False
+                elif self.policy == "drop_oldest":
+                    self._items.popleft()
+                    self.dropped_oldest += 1
+                elif self.policy == "drop_newest":
+                    self.dropped_newest += 1
+                    return False
+                elif not self._evict_faceless():
+                    if not self.has_faces(item):
+                        self.dropped_newest += 1
+                        return False
+                    self._items.popleft()
+                    self.dropped_oldest += 1
+
+            self._items.append(item)
+            self.max_depth = max(self.max_depth, len(self._items))
+            self._not_empty.notify()
+            return True
+
+    def _evict_faceless(self):
+        for i, queued in enumerate(self._items):
+            if not self.has_faces(queued):
+                del self._items[i]
+                self.dropped_oldest += 1
+                return True
+        return False
+
+    def get(self, timeout=None):
+        """Removes and returns the oldest frame.
+
+        Raises queue.Empty if nothing arrived within timeout, or at once
+        when the queue is closed and drained.
+        """
+        with self._lock:
+            if not self._not_empty.wait_for(
+                    lambda: self._items or self._closed, timeout):
+                raise queue.Empty
+            if not self._items:
+                raise queue.Empty
+            item = self._items.popleft()
+            self.get_count += 1
+            self._not_full.notify()
+            return item
+
+    def get_nowait(self):
+        return self.get(timeout=0)
+
+    def close(self):
+        """Wakes all waiters; further puts fail and gets drain what is left."""
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def qsize(self):
+        with self._lock:
+            return len(self._items)
+
+    def dropped(self):
+        return self.dropped_oldest + self.dropped_newest
+
+    def stats(self):
+        with self._lock:
+            return {
+                "depth": len(self._items),
+                "maxsize": self.maxsize,
+                "max_depth": self.max_depth,
+                "put": self.put_count,
+                "get": self.get_count,
+                "dropped_oldest": self.dropped_oldest,
+                "dropped_newest": self.dropped_newest,
+                "blocked_seconds": round(self.blocked_time, 3),
+            }
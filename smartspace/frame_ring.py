@@ -0,0 +1,157 @@
+"""Shared-memory ring of frame slots for passing frames between processes.
+
+A 16MP frame is 48 MB; pickling it to another process copies it twice and
+costs about as much as encoding it. A FrameRing is one SharedMemory block
+cut into slots, each holding the planes of one capture (the full frame
+and, when configured, the low-res detection frame), so processes hand
+each other slot numbers and offsets instead of arrays.
+
+Free slot numbers circulate through a multiprocessing queue: the writer
+takes one with acquire(), fills it, and passes the number on. The reader
+turns it back into arrays with arrays(slot, track=True); the slot returns
+to the free queue once the last of those views is garbage collected, so a
+frame the gate drops, or whose encode has finished, frees its slot without
+any bookkeeping.
+"""
+
+import time
+import weakref
+import multiprocessing
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+# Planes start on page boundaries
+_ALIGN = 4096
+
+# Blocks attached by shared_array(), kept for the life of the process
+_attached = {}
+
+
+def _attach(name):
+    # Before Python 3.13 (track=False) attaching registers the block with
+    # the resource tracker as well, which then unlinks it when this
+    # process exits; only the creating process owns it
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def shared_array(name: str, offset: int, shape, dtype):
+    """The array at offset in shared memory block name, as described by
+    FrameRing.locate(). Used by worker processes; the block is attached on
+    first use."""
+    shm = _attached.get(name)
+    if shm is None:
+        shm = _attached[name] = _attach(name)
+    return np.ndarray(shape, dtype, shm.buf, offset)
+
+
+class FrameRing(object):
+    """slots captures of planes, a list of (shape, dtype), in shared memory.
+
+    Create it in the main process before forking the stages that use it;
+    processes started otherwise receive it pickled, which attaches to the
+    same block.
+    """
+
+    def __init__(self, slots: int, planes, context=None):
+        self.slots = slots
+        self.planes = [(tuple(int(n) for n in shape), np.dtype(dtype).str)
+                       for shape, dtype in planes]
+        self.offsets = []
+        offset = 0
+        for shape, dtype in self.planes:
+            self.offsets.append(offset)
+            nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            offset += -(-nbytes // _ALIGN) * _ALIGN
+        self.slot_bytes = offset
+
+        self._shm = shared_memory.SharedMemory(create=True, size=slots * self.slot_bytes)
+        self._owner = True
+        self.name = self._shm.name
+        self._address = self._buffer_address()
+
+        # SimpleQueue has no feeder thread, so creating the ring leaves
+        # the process safe to fork
+        context = context or multiprocessing.get_context("fork")
+        self._free = context.SimpleQueue()
+        for slot in range(slots):
+            self._free.put(slot)
+
+    def _buffer_address(self):
+        view = np.frombuffer(self._shm.buf, np.uint8)
+        address = view.ctypes.data
+        del view
+        return address
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["_shm"], state["_address"]
+        state["_owner"] = False
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._shm = _attach(self.name)
+        self._address = self._buffer_address()
+
+    @property
+    def nbytes(self) -> int:
+        return self.slots * self.slot_bytes
+
+    def acquire(self, timeout: float = None):
+        """A free slot number, or None if none frees up within timeout.
+
+        Meant for a single writer; several would race between the check
+        and the get.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._free.empty():
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(0.001)
+        return self._free.get()
+
+    def release(self, slot: int):
+        self._free.put(slot)
+
+    def arrays(self, slot: int, track: bool = False):
+        """Views of the slot's planes. With track the slot is released
+        once every view (and every view derived from them) is gone."""
+        raw = np.ndarray((self.slot_bytes,), np.uint8, self._shm.buf,
+                         slot * self.slot_bytes)
+        if track:
+            weakref.finalize(raw, self.release, slot).atexit = False
+        views = []
+        for (shape, dtype), offset in zip(self.planes, self.offsets):
+            nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            # Slices of raw keep raw as their base, so raw lives as long
+            # as any of them
+            views.append(raw[offset:offset + nbytes].view(dtype).reshape(shape))
+        return views
+
+    def locate(self, array):
+        """(name, offset, shape, dtype) of a C-contiguous array inside the
+        ring, for shared_array() in another process; None if the array
+        lives elsewhere."""
+        if not isinstance(array, np.ndarray) or not array.flags.c_contiguous:
+            return None
+        offset = array.ctypes.data - self._address
+        if offset < 0 or offset + array.nbytes > self.nbytes:
+            return None
+        return self.name, offset, array.shape, array.dtype.str
+
+    def close(self):
+        """Unmaps the block; the creating process also removes it."""
+        try:
+            self._shm.close()
+        except BufferError:
+            # Views still alive keep the mapping until they are collected
+            pass
+        if self._owner:
+            self._owner = False
+            self._shm.unlink()
@@ -0,0 +1,32 @@
+"""Helpers for preparing captured frames for detection."""
+
+import cv2
+
+
+def yuv420_to_bgr(yuv, width: int, height: int):
+    """Converts a Picamera2 YUV420 (I420) array to a BGR frame.
+
+    make_array() returns the planes stacked as (height * 3 / 2, stride).
+    The chroma planes are packed at half that stride, so a padded buffer
+    can't simply be cropped: pick a stream width that is a multiple of 64
+    so the stride equals the width. BGR matches the byte order of
+    Picamera2's "RGB888" main stream, so both streams look the same to the
+    detector.
+    """
+    if yuv.shape[1] != width:
+        raise ValueError(f"Low-res stride {yuv.shape[1]} != width {width}; "
+                         "use a width that is a multiple of 64")
+    return cv2.cvtColor(yuv[:height * 3 // 2], cv2.COLOR_YUV420p2BGR)
+
+
+def downscale(image, size):
+    """Cheap resize of a full-resolution frame to size (width, height).
+
+    Used when a source has no hardware low-res stream. INTER_AREA on an
+    integer factor is close to a box filter and much cheaper than the
+    detector's own internal resampling of the full frame.
+    """
+    width, height = size
+    if image.shape[1] == width and image.shape[0] == height:
+        return image
+    return cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
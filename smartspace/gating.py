@@ -0,0 +1,111 @@
+"""Presence- and motion-gated capture with pre/post-roll.
+
+Most frames show an empty room. A CaptureGate decides per frame, from the
+landmarker's face count and/or a cheap frame-difference motion score,
+whether the frame is kept (encoded, stored and uploaded). Frames before an
+event are held raw in a small ring buffer and released as pre-roll, the
+frames after it are kept as post-roll, and an empty room is still sampled
+at a low heartbeat rate so gaps in the data can be told apart from a dead
+node.
+"""
+
+import time
+import collections
+
+import cv2
+
+MODES = ("off", "faces", "motion", "any")
+
+
+class MotionDetector(object):
+    """Mean absolute difference between consecutive thumbnails (0-255)."""
+
+    def __init__(self, size=(160, 120)):
+        self.size = size
+        self._previous = None
+
+    def score(self, frame) -> float:
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        previous, self._previous = self._previous, small
+        if previous is None:
+            return 0.0
+        return float(cv2.absdiff(previous, small).mean())
+
+
+class CaptureGate(object):
+    """Chooses which frames to keep.
+
+    offer() takes every captured frame and returns the frames to keep now,
+    oldest first, each with item["gate"] set to "event", "pre_roll",
+    "post_roll", "heartbeat" or "all" (mode off).
+    """
+
+    def __init__(self, mode: str = "off", motion_threshold: float = 8.0,
+                 pre_roll: int = 2, post_roll: int = 2,
+                 heartbeat: float = 60.0):
+        if mode not in MODES:
+            raise ValueError(f"Unknown gate mode: {mode}")
+        self.mode = mode
+        self.motion_threshold = motion_threshold
+        self.post_roll = post_roll
+        self.heartbeat = heartbeat
+
+        self._ring = collections.deque(maxlen=pre_roll) if pre_roll > 0 else None
+        self._post_remaining = 0
+        self._last_kept = None
+
+        self.offered = 0
+        self.kept = collections.Counter()
+
+    def is_event(self, faces: int, motion: float) -> bool:
+        if self.mode == "faces":
+            return faces > 0
+        if self.mode == "motion":
+            return motion >= self.motion_threshold
+        return faces > 0 or motion >= self.motion_threshold
+
+    def offer(self, item, faces: int = 0, motion: float = 0.0, now: float = None):
+        now = time.time() if now is None else now
+        self.offered += 1
+
+        if self.mode == "off":
+            return self._keep([item], "all", now)
+
+        if self.is_event(faces, motion):
+            kept = []
+            if self._ring:
+                kept = self._keep(list(self._ring), "pre_roll", now)
+                self._ring.clear()
+            self._post_remaining = self.post_roll
+            return kept + self._keep([item], "event", now)
+
+        if self._post_remaining > 0:
+            self._post_remaining -= 1
+            return self._keep([item], "post_roll", now)
+
+        if self.heartbeat > 0 and (self._last_kept is None
+                                   or now - self._last_kept >= self.heartbeat):
+            if self._ring:
+                self._ring.clear()
+            return self._keep([item], "heartbeat", now)
+
+        if self._ring is not None:
+            # A full ring drops its oldest frame, which is never kept
+            self._ring.append(item)
+        return []
+
+    def _keep(self, items, reason, now):
+        for item in items:
+            item["gate"] = reason
+        self.kept[reason] += len(items)
+        self._last_kept = now
+        return items
+
+    def skipped(self):
+        return self.offered - sum(self.kept.values()) - (len(self._ring) if self._ring else 0)
+
+    def stats(self):
+        return {"offered": self.offered, "skipped": self.skipped(),
+                **{f"kept_{k}": v for k, v in self.kept.items()}}
@@ -0,0 +1,142 @@
+"""Compact binary encoding of MediaPipe FaceLandmarkerResult.
+
+Layout (little endian):
+
+    header   "SSLM" magic, u8 version, u8 dtype (0 float16, 1 float32),
+             u8 faces, u8 flags (1 blendshapes, 2 matrices),
+             u16 landmarks per face, u16 blendshapes per face
+    body     landmarks   faces x landmarks x 3 (x, y, z)     in dtype
+             blendshapes faces x blendshapes (scores)        in dtype
+             matrices    faces x 4 x 4                       float32
+
+An empty frame is just the 12 byte header. A face with float16 landmarks
+and blendshapes is about 3 KB, against ~50 KB for str(result).
+"""
+
+import base64
+import struct
+
+import numpy as np
+
+MAGIC = b"SSLM"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sBBBBHH")
+_DTYPES = {0: np.dtype("<f2"), 1: np.dtype("<f4")}
+_DTYPE_CODES = {"float16": 0, "float32": 1}
+_HAS_BLENDSHAPES = 1
+_HAS_MATRICES = 2
+
+
+def _category_index(category, position):
+    index = getattr(category, "index", None)
+    return position if index is None or index < 0 else index
+
+
+def result_to_arrays(result):
+    """Converts a FaceLandmarkerResult (or None) to a dict of NumPy arrays."""
+    faces = result.face_landmarks if result is not None else []
+    landmarks = np.array(
+        [[(l.x, l.y, l.z) for l in face] for face in faces],
+        dtype=np.float32).reshape(len(faces), len(faces[0]) if faces else 0, 3)
+
+    # Blendshape columns follow the category index, so every record lines
+    # up with MediaPipe's category list even if a face lacks some of them;
+    # missing scores are NaN
+    blendshapes = getattr(result, "face_blendshapes", None) or []
+    width = max((_category_index(c, i) + 1 for face in blendshapes
+                 for i, c in enumerate(face)), default=0)
+    blendshapes_array = np.full((len(blendshapes), width), np.nan, np.float32)
+    for row, face in zip(blendshapes_array, blendshapes):
+        for i, c in enumerate(face):
+            row[_category_index(c, i)] = c.score
+    blendshapes = blendshapes_array
+
+    matrices = getattr(result, "facial_transformation_matrixes", None) or []
+    matrices = np.array(matrices, dtype=np.float32).reshape(-1, 4, 4)
+
+    return {"landmarks": landmarks, "blendshapes": blendshapes,
+            "matrices": matrices}
+
+
+def pack_arrays(landmarks, blendshapes=None, matrices=None,
+                dtype: str = "float16") -> bytes:
+    code = _DTYPE_CODES[dtype]
+    dt = _DTYPES[code]
+    landmarks = np.asarray(landmarks, dtype=np.float32)
+    faces = landmarks.shape[0]
+    n_landmarks = landmarks.shape[1] if faces else 0
+
+    flags = 0
+    parts = [landmarks.astype(dt).tobytes()]
+    n_blendshapes = 0
+    if blendshapes is not None and len(blendshapes):
+        blendshapes = np.asarray(blendshapes, dtype=np.float32)
+        if blendshapes.shape[0] != faces:
+            raise ValueError("One row of blendshapes is needed per face")
+        flags |= _HAS_BLENDSHAPES
+        n_blendshapes = blendshapes.shape[1]
+        parts.append(blendshapes.astype(dt).tobytes())
+    if matrices is not None and len(matrices):
+        matrices = np.asarray(matrices, dtype=np.float32).reshape(-1, 4, 4)
+        if matrices.shape[0] != faces:
+            raise ValueError("One transformation matrix is needed per face")
+        flags |= _HAS_MATRICES
+        parts.append(matrices.astype("<f4").tobytes())
+
+    header = _HEADER.pack(MAGIC, VERSION, code, faces, flags,
+                          n_landmarks, n_blendshapes)
+    return header + b"".join(parts)
+
+
+def encode_result(result, dtype: str = "float16") -> bytes:
+    """Packs a FaceLandmarkerResult (or None for no result) into bytes."""
+    arrays = result_to_arrays(result)
+    return pack_arrays(arrays["landmarks"], arrays["blendshapes"],
+                       arrays["matrices"], dtype)
+
+
+def decode(data):
+    """Unpacks bytes from encode_result() into float32 NumPy arrays.
+
+    Returns a dict with "landmarks" (faces, landmarks, 3), "blendshapes"
+    (faces, blendshapes) and "matrices" (faces, 4, 4); arrays that were not
+    stored are empty.
+    """
+    view = memoryview(data)
+    magic, version, code, faces, flags, n_landmarks, n_blendshapes = \
+        _HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise ValueError("Not a packed landmark record")
+    if version != VERSION:
+        raise ValueError(f"Unsupported landmark record version {version}")
+    dt = _DTYPES[code]
+
+    offset = _HEADER.size
+
+    def take(dtype, shape):
+        nonlocal offset
+        count = int(np.prod(shape))
+        arr = np.frombuffer(view, dtype=dtype, count=count, offset=offset)
+        offset += count * dtype.itemsize
+        return arr.reshape(shape).astype(np.float32)
+
+    landmarks = take(dt, (faces, n_landmarks, 3))
+    blendshapes = np.zeros((faces, 0), dtype=np.float32)
+    matrices = np.zeros((0, 4, 4), dtype=np.float32)
+    if flags & _HAS_BLENDSHAPES:
+        blendshapes = take(dt, (faces, n_blendshapes))
+    if flags & _HAS_MATRICES:
+        matrices = take(np.dtype("<f4"), (faces, 4, 4))
+
+    return {"landmarks": landmarks, "blendshapes": blendshapes,
+            "matrices": matrices}
+
+
+def encode_result_b64(result, dtype: str = "float16") -> str:
+    """encode_result() as base64 text, for use as a VDMS string property."""
+    return base64.b64encode(encode_result(result, dtype)).decode("ascii")
+
+
+def decode_b64(text):
+    return decode(base64.b64decode(text))
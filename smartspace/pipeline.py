@@ -0,0 +1,495 @@
+"""Capture node stages in processes of their own.
+
+In the threaded pipeline capture, detection, encoding and upload share
+one Python process, so whatever holds the GIL holds up the rest while the
+Pi's other cores idle. The classes here run each stage in its own
+processes, wired together by a FrameRing so raw frames are never pickled:
+
+    CaptureProcess  source + CaptureScheduler, frames into ring slots
+    DetectorPool    landmarker processes reading the detection planes
+    FrameEncoder    encoder processes reading the frames (ring=...)
+    UploadProcess   spool or FrameQueue + BatchUploader + vdms_pool
+
+The main process keeps the light work: pairing results with frames,
+gating, labelling, the detection log, the archive and the stats endpoint.
+Only slot numbers, timestamps, packed landmarks and encoded frames cross
+process boundaries. The children are forked, so start() them before any
+thread exists, like FrameEncoder; they ignore SIGINT and are shut down by
+the main process, in pipeline order, with close().
+"""
+
+import time
+import queue
+import signal
+import threading
+import traceback
+import collections
+import multiprocessing
+
+import numpy as np
+
+from . import landmarks
+from .frame_ring import shared_array
+from .frame_queue import FrameQueue
+from .scheduler import CaptureScheduler
+from .spool import Spool
+from .uploader import BatchUploader, batch_report
+
+_context = multiprocessing.get_context("fork")
+
+
+def _child_init():
+    # Ctrl-C reaches the whole process group; the main process stops the
+    # stages in order instead
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _join(process, timeout: float):
+    process.join(timeout)
+    if process.is_alive():
+        process.terminate()
+        process.join()
+
+
+def _capture_main(source, ring, fps, phase, policy, go, stop, frames):
+    _child_init()
+    while not go.wait(0.1):
+        if stop.is_set():
+            return
+    scheduler = CaptureScheduler(fps, phase, policy) if fps > 0 else None
+    ring_full = 0
+    try:
+        source.start()
+        while not stop.is_set():
+            if scheduler is not None:
+                tick, jitter = scheduler.wait()
+                # A full ring means the stages downstream are behind: the
+                # tick is skipped, as after an overrun
+                slot = ring.acquire(timeout=0)
+                if slot is None:
+                    ring_full += 1
+                    continue
+            else:
+                slot = ring.acquire(timeout=0.1)
+                if slot is None:
+                    continue
+                tick, jitter = time.time(), 0.0
+
+            started = time.perf_counter()
+            try:
+                captured = source.read()
+                for plane, array in zip(ring.arrays(slot), captured):
+                    np.copyto(plane, array)
+            except BaseException:
+                ring.release(slot)
+                raise
+            stats = dict(scheduler.stats() if scheduler is not None else {},
+                         ring_full=ring_full)
+            frames.put((slot, tick, jitter, time.perf_counter() - started, stats))
+    except EOFError:
+        pass
+    except Exception:
+        traceback.print_exc()
+    finally:
+        source.close()
+        frames.put(None)
+
+
+class CaptureProcess(object):
+    """Runs a FrameSource on CaptureScheduler ticks in a child process,
+    which copies every frame into a FrameRing slot.
+
+    Takes the place of both the scheduler and the source of the threaded
+    pipeline: wait() returns the next frame's (tick, jitter) and read()
+    its (frame, detect_frame) as views into the ring, which free the slot
+    once dropped. Every wait() is followed by a read(). The ring's planes
+    are the frame and, optionally, the detection frame; without the latter
+    both views are the frame. fps 0 captures whenever a slot is free.
+    """
+
+    def __init__(self, source, ring, fps: float = 0.0, phase: float = 0.0,
+                 policy: str = "skip"):
+        self.ring = ring
+        self.frames = 0
+        self.capture_time = 0.0
+        self._frames = _context.Queue()
+        self._go = _context.Event()
+        self._stop = _context.Event()
+        self._process = _context.Process(
+            target=_capture_main, name="capture", daemon=True,
+            args=(source, ring, fps, phase, policy, self._go, self._stop,
+                  self._frames))
+        self._launched = False
+        self._slot = None
+        self._stats = {}
+
+    def launch(self):
+        """Forks the capture process, which waits for start()."""
+        if not self._launched:
+            self._process.start()
+            self._launched = True
+        return self
+
+    def start(self):
+        self.launch()
+        self._go.set()
+        return self
+
+    def wait(self):
+        if self._slot is not None:
+            self.ring.release(self._slot)
+            self._slot = None
+        while True:
+            try:
+                message = self._frames.get(timeout=1.0)
+                break
+            except queue.Empty:
+                if not self._process.is_alive():
+                    raise EOFError("Capture process exited")
+        if message is None:
+            raise EOFError("Capture finished")
+        self._slot, tick, jitter, self.capture_time, self._stats = message
+        return tick, jitter
+
+    def read(self):
+        planes = self.ring.arrays(self._slot, track=True)
+        self._slot = None
+        self.frames += 1
+        return planes[0], planes[-1]
+
+    def close(self):
+        if not self._launched:
+            return
+        self._stop.set()
+        self._go.set()
+        if self._slot is not None:
+            self.ring.release(self._slot)
+            self._slot = None
+        # Frames captured but never read give their slots back
+        while True:
+            try:
+                message = self._frames.get(timeout=1.0)
+            except queue.Empty:
+                if not self._process.is_alive():
+                    break
+                continue
+            if message is None:
+                break
+            self.ring.release(message[0])
+        _join(self._process, 5.0)
+        self._launched = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def stats(self):
+        return dict(self._stats, frames=self.frames,
+                    capture_ms=round(self.capture_time * 1000, 1))
+
+
+class Detection(collections.namedtuple("Detection", ["packed", "faces"])):
+    """A DetectorPool result: the landmarks packed by
+    smartspace.landmarks.encode_result() and the number of faces."""
+    __slots__ = ()
+
+
+def _detect_main(options, tasks, results):
+    _child_init()
+    # Imported here so the other stages run without mediapipe
+    import mediapipe as mp
+    from mediapipe.tasks import python
+    from mediapipe.tasks.python import vision
+
+    # VIDEO mode: each worker sees its frames in timestamp order and
+    # tracks faces between them
+    detector = vision.FaceLandmarker.create_from_options(vision.FaceLandmarkerOptions(
+        base_options=python.BaseOptions(model_asset_path=options["model"]),
+        running_mode=vision.RunningMode.VIDEO,
+        num_faces=options.get("num_faces", 1),
+        min_face_detection_confidence=options.get("min_face_detection_confidence", 0.5),
+        min_face_presence_confidence=options.get("min_face_presence_confidence", 0.5),
+        min_tracking_confidence=options.get("min_tracking_confidence", 0.5),
+        output_face_blendshapes=True))
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            timestamp_ms, location = task
+            started = time.perf_counter()
+            image = mp.Image(image_format=mp.ImageFormat.SRGB,
+                             data=shared_array(*location))
+            result = detector.detect_for_video(image, timestamp_ms)
+            detection = Detection(landmarks.encode_result(result),
+                                  len(result.face_landmarks))
+            results.put((timestamp_ms, detection, time.perf_counter() - started))
+    finally:
+        detector.close()
+
+
+class DetectorPool(object):
+    """Face landmarker processes reading detection frames from a FrameRing.
+
+    submit() queues a frame's location in the ring for the next free
+    worker, each of which runs its own FaceLandmarker; options holds the
+    model path and the FaceLandmarkerOptions (num_faces, min_*). Results
+    come back out of order and are passed to on_result(timestamp_ms,
+    Detection, seconds) in submission order, as ResultCorrelator expects;
+    one missing for longer than timeout is given up on. The frame's view
+    is held until its worker is done with it. With max_pending frames
+    queued a non-blocking submit() skips the frame, as the live-stream
+    landmarker does when busy.
+    """
+
+    def __init__(self, options: dict, ring, workers: int = 1,
+                 max_pending: int = None, timeout: float = 1.0):
+        self.ring = ring
+        self.workers = workers
+        self.timeout = timeout
+        self.on_result = None
+
+        self._tasks = _context.Queue(max_pending or 2 * workers)
+        self._results = _context.Queue()
+        self._processes = [
+            _context.Process(target=_detect_main, name=f"detector-{i}", daemon=True,
+                             args=(options, self._tasks, self._results))
+            for i in range(workers)]
+        self._lock = threading.Lock()
+        self._order = collections.deque()
+        self._waiting = set()
+        self._done = {}
+        self._inflight = {}
+        self._collector = None
+
+        self.submitted = 0
+        self.skipped = 0
+        self.lost = 0
+
+    def start(self):
+        """Forks the worker processes."""
+        for process in self._processes:
+            process.start()
+        return self
+
+    def submit(self, timestamp_ms: int, detect_image, block: bool = False) -> bool:
+        location = self.ring.locate(detect_image)
+        if location is None:
+            raise ValueError("DetectorPool frames must be views into its FrameRing")
+        if self._collector is None:
+            self._collector = threading.Thread(target=self._collect,
+                                               name="detector-results", daemon=True)
+            self._collector.start()
+        with self._lock:
+            self._order.append((timestamp_ms, time.monotonic()))
+            self._waiting.add(timestamp_ms)
+            self._inflight[timestamp_ms] = detect_image
+        try:
+            self._tasks.put((timestamp_ms, location), block=block)
+        except queue.Full:
+            with self._lock:
+                self._order.pop()
+                self._waiting.discard(timestamp_ms)
+                del self._inflight[timestamp_ms]
+                self.skipped += 1
+            return False
+        self.submitted += 1
+        return True
+
+    def _collect(self):
+        while True:
+            try:
+                message = self._results.get(timeout=0.1)
+            except queue.Empty:
+                message = ()
+            ready = []
+            with self._lock:
+                if message:
+                    timestamp_ms = message[0]
+                    self._inflight.pop(timestamp_ms, None)
+                    if timestamp_ms in self._waiting:
+                        self._done[timestamp_ms] = message
+                now = time.monotonic()
+                while self._order:
+                    timestamp_ms, submitted = self._order[0]
+                    if timestamp_ms in self._done:
+                        ready.append(self._done.pop(timestamp_ms))
+                    elif message is None or now - submitted > self.timeout:
+                        # Unpin the frame: if its worker died the result
+                        # never comes, and its ring slot would stay taken
+                        self.lost += 1
+                        self._inflight.pop(timestamp_ms, None)
+                    else:
+                        break
+                    self._order.popleft()
+                    self._waiting.discard(timestamp_ms)
+            if self.on_result is not None:
+                for timestamp_ms, detection, seconds in ready:
+                    self.on_result(timestamp_ms, detection, seconds)
+            if message is None:
+                return
+
+    def close(self):
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            _join(process, 10.0)
+        if self._collector is not None:
+            self._results.put(None)
+            self._collector.join()
+        self._inflight.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"submitted": self.submitted, "skipped": self.skipped,
+                    "lost": self.lost, "pending": len(self._order)}
+
+
+def _upload_main(config, frames, reports, backlog, dropped):
+    _child_init()
+    # Imported here: only the upload process talks to VDMS
+    import vdms
+
+    frame_queue = FrameQueue(config["queue_size"], config["queue_policy"])
+    spool = None
+    if config["spool_dir"]:
+        spool = Spool(config["spool_dir"], max_bytes=config["spool_bytes"])
+    capture_done = threading.Event()
+
+    def update():
+        backlog.value = spool.pending if spool is not None else frame_queue.qsize()
+        dropped.value = frame_queue.dropped()
+
+    def feed():
+        while True:
+            item = frames.get()
+            if item is None:
+                break
+            meta, encoded = item
+            if spool is not None:
+                spool.append(meta, encoded)
+            else:
+                frame_queue.put(dict(meta, image=encoded))
+            update()
+        capture_done.set()
+        frame_queue.close()
+
+    def on_batch(batch, nbytes, latency, response):
+        reports.put(("batch", batch_report(batch, nbytes, latency, response)))
+        update()
+
+    def on_error(batch, error):
+        reports.put(("error", len(batch), str(error)))
+
+    db = vdms.vdms_pool(config["servers"], config["port"], policy=config["policy"])
+    if db.connect() == 0:
+        print("Warning: no VDMS server reachable yet, retrying in background")
+    uploader = BatchUploader(db, frame_queue, config["batch_size"],
+                             config["batch_bytes"], config["batch_latency"],
+                             on_batch=on_batch, on_error=on_error)
+    feeder = threading.Thread(target=feed, name="upload-feed")
+    feeder.start()
+    if spool is not None:
+        uploader.drain_spool(spool, stop=capture_done,
+                             drain_timeout=config["drain_timeout"])
+        print(f"Spool: {spool.stats()}")
+    else:
+        uploader.run()
+    feeder.join()
+    update()
+    print(f"Frame queue: {frame_queue.stats()}")
+    reports.put(("stats", uploader.stats()))
+    db.close()
+    if spool is not None:
+        spool.close()
+
+
+class UploadProcess(object):
+    """The upload stage (spool or FrameQueue, BatchUploader, vdms_pool) in
+    a child process; the arguments are those of send_images_to_vdms.
+
+    put() passes an encoded frame and its metadata over a queue of
+    queue_size, blocking while it is full. Each uploaded batch comes back
+    as a smartspace.uploader.batch_report() dict to on_batch(report), and
+    each failed one to on_error(frames, message), on a thread of this
+    process, so stats and adaptive quality work as in the threaded
+    pipeline. close() lets the child finish (drain_timeout applies to the
+    spool) and waits for it.
+    """
+
+    def __init__(self, servers, port: int = 55555,
+                 policy: str = "least_outstanding", batch_size: int = 8,
+                 batch_bytes: int = 64 * 1024 * 1024, batch_latency: float = 2.0,
+                 spool_dir: str = "", spool_bytes: int = 2 * 1024 ** 3,
+                 queue_size: int = 32, queue_policy: str = "drop_oldest",
+                 drain_timeout: float = 30.0, on_batch=None, on_error=None):
+        self.config = {
+            "servers": list(servers), "port": port, "policy": policy,
+            "batch_size": batch_size, "batch_bytes": batch_bytes,
+            "batch_latency": batch_latency, "spool_dir": spool_dir,
+            "spool_bytes": spool_bytes, "queue_size": queue_size,
+            "queue_policy": queue_policy, "drain_timeout": drain_timeout,
+        }
+        self.on_batch = on_batch
+        self.on_error = on_error
+        self.uploader_stats = {}
+
+        self._frames = _context.Queue(queue_size)
+        self._reports = _context.Queue()
+        self._backlog = _context.Value("q", 0, lock=False)
+        self._dropped = _context.Value("q", 0, lock=False)
+        self._process = _context.Process(
+            target=_upload_main, name="upload", daemon=True,
+            args=(self.config, self._frames, self._reports, self._backlog,
+                  self._dropped))
+        self._reporter = None
+
+    def start(self):
+        """Forks the upload process."""
+        self._process.start()
+        return self
+
+    def _start_reporter(self):
+        # Started with the first frame rather than in start(), which runs
+        # before the other stages are forked
+        if self._reporter is None:
+            self._reporter = threading.Thread(target=self._report,
+                                              name="upload-reports", daemon=True)
+            self._reporter.start()
+
+    def put(self, meta: dict, encoded):
+        self._start_reporter()
+        self._frames.put((meta, encoded))
+
+    def _report(self):
+        while True:
+            message = self._reports.get()
+            if message is None:
+                return
+            kind, *rest = message
+            if kind == "batch" and self.on_batch is not None:
+                self.on_batch(rest[0])
+            elif kind == "error" and self.on_error is not None:
+                self.on_error(*rest)
+            elif kind == "stats":
+                self.uploader_stats = rest[0]
+
+    def backlog(self) -> int:
+        """Frames handed to put() but not yet accepted by VDMS."""
+        return self._backlog.value + self._frames.qsize()
+
+    def dropped(self) -> int:
+        return self._dropped.value
+
+    def close(self):
+        self._start_reporter()
+        self._frames.put(None)
+        self._process.join()
+        self._reports.put(None)
+        self._reporter.join()
+
+    def stats(self):
+        return dict(self.uploader_stats, backlog=self.backlog(),
+                    dropped=self.dropped())
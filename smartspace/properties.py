@@ -0,0 +1,78 @@
+"""Typed VDMS image properties and the indexes that keep queries fast.
+
+Besides the original string properties (ID, Timestamp, Date, ...) every
+frame carries typed ones that the server can index and compare natively:
+
+    TimestampMs  integer  capture time, epoch milliseconds (UTC)
+    TickMs       integer  wall-clock tick the capture was scheduled for
+    Time         _date    capture time as a VDMS date
+    Camera       integer  camera number (ss3 -> 3)
+    Faces        integer  faces found by the landmarker
+
+Time-range queries should constrain TimestampMs; create_indexes() sets up
+the matching property indexes on a server (control.py --bootstrap).
+"""
+
+import re
+from datetime import datetime, timezone
+
+# Entity class VDMS stores images under
+IMAGE_CLASS = "VD:IMG"
+
+# Indexed property -> VDMS index property_type
+INDEXES = {
+    "TimestampMs": "integer",
+    "TickMs": "integer",
+    "Camera": "integer",
+    "Faces": "integer",
+    "ID": "string",
+}
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def camera_number(node_id: str) -> int:
+    """The trailing number of a node ID ("ss12" -> 12), -1 if it has none."""
+    match = re.search(r"(\d+)$", node_id)
+    return int(match.group(1)) if match else -1
+
+
+def vdms_date(timestamp_ms: int):
+    """A VDMS date value, e.g. {"_date": "Sat Oct 18 10:00:00 UTC 2026"}."""
+    t = datetime.fromtimestamp(timestamp_ms / 1000, timezone.utc)
+    return {"_date": t.strftime("%a %b %d %H:%M:%S UTC %Y")}
+
+
+def format_timestamp(timestamp_ms: int) -> str:
+    """The string Timestamp property ("YYYY-mm-dd HH:MM:SS.mmm", UTC)."""
+    t = datetime.fromtimestamp(timestamp_ms / 1000, timezone.utc)
+    return t.strftime(TIMESTAMP_FORMAT)[:-3]
+
+
+def frame_properties(node_id: str, timestamp_ms: int, tick: float = None):
+    """Properties of a captured frame; Faces and the detection ones are
+    added once the landmarker result is known."""
+    props = {
+        "ID": node_id,
+        "Camera": camera_number(node_id),
+        "TimestampMs": timestamp_ms,
+        "Time": vdms_date(timestamp_ms),
+        "Timestamp": format_timestamp(timestamp_ms),
+        "Date": datetime.fromtimestamp(timestamp_ms / 1000).strftime("%Y-%m-%d"),
+        "Data": "YES",
+    }
+    if tick is not None:
+        # The same on every node for the same instant, to join cameras
+        props["TickMs"] = round(tick * 1000)
+        props["Tick"] = format_timestamp(props["TickMs"])
+    return props
+
+
+def create_indexes(db, indexes=None):
+    """Creates the property indexes on a VDMS server in one transaction.
+    Returns the response; an index that already exists is not an error."""
+    indexes = INDEXES if indexes is None else indexes
+    query = [{"CreateIndex": {"index_type": "entity", "class": IMAGE_CLASS,
+                              "property_key": key, "property_type": kind}}
+             for key, kind in indexes.items()]
+    return db.query(query)
@@ -0,0 +1,88 @@
+"""Capture triggers on absolute wall-clock ticks.
+
+Sleeping for "interval minus elapsed" after each frame drifts, and every
+node ends up with its own phase depending on when it was started. A
+CaptureScheduler instead fires on the ticks k / fps (plus an optional
+phase offset) of the synchronized wall clock, so with clocks in sync all
+cameras capture at the same instants and their frames share timestamps.
+
+After an overrun (a capture that took longer than the tick period) the
+missed ticks are either skipped, resuming on the next future tick, or
+caught up by firing them immediately, at most max_catch_up in a row
+before the rest are skipped.
+"""
+
+import time
+import math
+
+POLICIES = ("skip", "catch_up")
+
+
+class CaptureScheduler(object):
+    """wait() sleeps until the next tick and returns (tick, jitter), tick
+    being the scheduled wall-clock time and jitter how late (seconds) the
+    trigger actually fired."""
+
+    def __init__(self, fps: float, phase: float = 0.0, policy: str = "skip",
+                 max_catch_up: int = 2, spin: float = 0.002):
+        if fps <= 0:
+            raise ValueError("CaptureScheduler needs a positive fps")
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overrun policy: {policy}")
+        self.period = 1.0 / fps
+        self.phase = phase % self.period
+        self.policy = policy
+        self.max_catch_up = max_catch_up
+        # The last few ms before a tick are spent polling the clock, since
+        # sleep() alone can wake several ms late
+        self.spin = spin
+
+        self._next = None
+        self._behind = 0
+
+        self.ticks = 0
+        self.skipped = 0
+        self.caught_up = 0
+        self.max_jitter = 0.0
+
+    def _tick_after(self, t):
+        return math.ceil((t - self.phase) / self.period) * self.period + self.phase
+
+    def wait(self):
+        now = time.time()
+        if self._next is None or now < self._next - 2 * self.period:
+            # First tick, or the clock was stepped back (e.g. by a sync)
+            self._next = self._tick_after(now)
+            self._behind = 0
+
+        if now >= self._next + self.period:
+            # More than one tick is overdue
+            if self.policy == "catch_up" and self._behind < self.max_catch_up:
+                # Fire the oldest overdue tick immediately
+                self._behind += 1
+                self.caught_up += 1
+            else:
+                upcoming = self._tick_after(now)
+                self.skipped += round((upcoming - self._next) / self.period)
+                self._next = upcoming
+                self._behind = 0
+        else:
+            self._behind = 0
+
+        tick = self._next
+        remaining = tick - time.time()
+        if remaining > self.spin:
+            time.sleep(remaining - self.spin)
+        while time.time() < tick:
+            pass
+        jitter = time.time() - tick
+
+        self._next = tick + self.period
+        self.ticks += 1
+        self.max_jitter = max(self.max_jitter, jitter)
+        return tick, jitter
+
+    def stats(self):
+        return {"ticks": self.ticks, "skipped": self.skipped,
+                "caught_up": self.caught_up,
+                "max_jitter_ms": round(self.max_jitter * 1000, 3)}
@@ -0,0 +1,224 @@
+"""Frame sources for the capture pipeline.
+
+Every source returns (frame, detect_frame) from read(): the full-resolution
+frame that is stored and uploaded, and the frame the landmarker should see,
+which is a low-res copy when a detection size is configured and the frame
+itself otherwise. Only PicameraSource needs a Pi; the synthetic and replay
+sources let the rest of the pipeline run and be load-tested anywhere.
+"""
+
+import os
+import time
+
+import cv2
+import numpy as np
+
+from . import frames
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+class FrameSource(object):
+    """Base class; subclasses implement _open(), _read() and _close()."""
+
+    def __init__(self, fps: float = 0, detect_size=None):
+        self.fps = fps
+        self.detect_size = detect_size
+        self.frames = 0
+        self._next_frame = None
+
+    def start(self):
+        self._open()
+        self._next_frame = time.monotonic()
+        return self
+
+    def read(self):
+        # Sources that don't pace themselves are throttled to fps here;
+        # fps 0 means as fast as frames can be produced
+        if self.fps > 0:
+            delay = self._next_frame - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._next_frame = max(self._next_frame, time.monotonic() - 1) + 1 / self.fps
+        frame, detect_frame = self._read()
+        if detect_frame is None:
+            detect_frame = frame
+            if self.detect_size:
+                detect_frame = frames.downscale(frame, self.detect_size)
+        self.frames += 1
+        return frame, detect_frame
+
+    def close(self):
+        self._close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _open(self):
+        pass
+
+    def _read(self):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+
+class PicameraSource(FrameSource):
+    """Picamera2 capture, with a hardware low-res stream for detection."""
+
+    def __init__(self, width: int, height: int, camera_num: int = 0,
+                 detect_size=None):
+        # The sensor paces capture_request(), so no software throttling
+        super().__init__(0, detect_size)
+        self.width = width
+        self.height = height
+        self.camera_num = camera_num
+        self.picam2 = None
+
+    def _open(self):
+        # Imported here so the rest of the pipeline runs without picamera2
+        from picamera2 import Picamera2
+
+        # With a detection size the ISP also produces a low-res stream, so
+        # the landmarker never sees (or copies) the 16MP frame; landmarks
+        # are normalized, so they apply to the full-res frame unchanged.
+        self.picam2 = Picamera2(self.camera_num)
+        streams = {"main": {"format": 'RGB888', "size": (self.width, self.height)}}
+        if self.detect_size:
+            streams["lores"] = {"format": 'YUV420', "size": tuple(self.detect_size)}
+        self.picam2.configure(self.picam2.create_preview_configuration(**streams))
+        self.picam2.set_controls({"AfMode": 0, "LensPosition": 4})
+        self.picam2.start()
+
+    def _read(self):
+        if not self.detect_size:
+            return self.picam2.capture_array(), None
+        request = self.picam2.capture_request()
+        try:
+            frame = request.make_array("main")
+            detect_frame = frames.yuv420_to_bgr(request.make_array("lores"),
+                                                *self.detect_size)
+        finally:
+            request.release()
+        return frame, detect_frame
+
+    def _close(self):
+        if self.picam2 is not None:
+            self.picam2.stop()
+            self.picam2.close()
+            self.picam2 = None
+
+
+class SyntheticSource(FrameSource):
+    """Generated frames at a configurable resolution and rate.
+
+    A handful of noise frames with a moving bar are rendered up front and
+    cycled, so producing a frame costs nothing and the measured throughput
+    is that of the stages downstream. Noise keeps encoders from
+    compressing the frames unrealistically well.
+    """
+
+    def __init__(self, width: int = 4656, height: int = 3496, fps: float = 0,
+                 detect_size=None, distinct_frames: int = 4, seed: int = 0):
+        super().__init__(fps, detect_size)
+        self.width = width
+        self.height = height
+        self.distinct_frames = distinct_frames
+        self.seed = seed
+        self._frames = []
+        self._detect_frames = []
+
+    def _open(self):
+        rng = np.random.default_rng(self.seed)
+        bar = max(1, self.width // 16)
+        for i in range(self.distinct_frames):
+            frame = rng.integers(0, 64, (self.height, self.width, 3), dtype=np.uint8)
+            x = (i * self.width // self.distinct_frames) % self.width
+            frame[:, x:x + bar] = 255
+            self._frames.append(frame)
+            if self.detect_size:
+                self._detect_frames.append(frames.downscale(frame, self.detect_size))
+
+    def _read(self):
+        i = self.frames % self.distinct_frames
+        return self._frames[i], self._detect_frames[i] if self._detect_frames else None
+
+    def _close(self):
+        self._frames = []
+        self._detect_frames = []
+
+
+class ReplaySource(FrameSource):
+    """Replays a directory of images or a video file, optionally looping.
+
+    Frames are resized to (width, height) when given, so recordings can
+    stand in for any camera resolution.
+    """
+
+    def __init__(self, path: str, width: int = 0, height: int = 0,
+                 fps: float = 0, detect_size=None, loop: bool = True):
+        super().__init__(fps, detect_size)
+        self.path = path
+        self.width = width
+        self.height = height
+        self.loop = loop
+        self._files = None
+        self._video = None
+
+    def _open(self):
+        if os.path.isdir(self.path):
+            self._files = sorted(
+                os.path.join(self.path, name) for name in os.listdir(self.path)
+                if name.lower().endswith(IMAGE_EXTENSIONS))
+            if not self._files:
+                raise ValueError(f"No images found in {self.path}")
+        else:
+            self._video = cv2.VideoCapture(self.path)
+            if not self._video.isOpened():
+                raise ValueError(f"Could not open video {self.path}")
+
+    def _next_raw(self):
+        if self._files is not None:
+            if self.frames >= len(self._files) and not self.loop:
+                raise EOFError("Replay finished")
+            frame = cv2.imread(self._files[self.frames % len(self._files)])
+            if frame is None:
+                raise ValueError(f"Could not read {self._files[self.frames % len(self._files)]}")
+            return frame
+
+        ok, frame = self._video.read()
+        if not ok and self.loop and self.frames > 0:
+            self._video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self._video.read()
+        if not ok:
+            raise EOFError("Replay finished")
+        return frame
+
+    def _read(self):
+        frame = self._next_raw()
+        if self.width and self.height:
+            frame = cv2.resize(frame, (self.width, self.height))
+        return frame, None
+
+    def _close(self):
+        if self._video is not None:
+            self._video.release()
+            self._video = None
+
+
+def open_source(spec: str, width: int, height: int, fps: float = 0,
+                detect_size=None, camera_num: int = 0) -> FrameSource:
+    """Builds a source from a --source value.
+
+    "picamera" is the Pi camera, "synthetic" generated frames, and anything
+    else a directory of images or a video file to replay.
+    """
+    if spec == "picamera":
+        return PicameraSource(width, height, camera_num, detect_size)
+    if spec == "synthetic":
+        return SyntheticSource(width, height, fps, detect_size)
+    return ReplaySource(spec, width, height, fps, detect_size)
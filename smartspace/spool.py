@@ -0,0 +1,352 @@
+"""Durable on-disk spool of encoded frames waiting for upload.
+
+Frames are appended to numbered segment files in a directory. The single
+consumer reads from a persisted cursor and only moves it forward with
+ack() once VDMS has accepted the frames, so whatever is in the spool
+survives a VDMS outage, a network blip or a node restart. A disk budget
+caps the spool: when it is exceeded the oldest segments are evicted,
+uploaded or not.
+
+Record layout (little endian):
+
+    "SSPL" magic | u32 meta length | u64 blob length | u32 crc32(meta)
+    meta (JSON)  | blob
+
+A record cut short by a crash fails the length or CRC check and ends its
+segment; writes after a restart always go to a fresh segment.
+
+Frames VDMS will never accept (a bad property or format aborts the whole
+transaction they are in) are moved aside with set_aside() into
+dead_letter.seg, in the same record layout, so they no longer hold up the
+frames behind them and can still be inspected or replayed.
+"""
+
+import os
+import json
+import zlib
+import struct
+import threading
+
+_HEADER = struct.Struct("<4sIQI")
+_MAGIC = b"SSPL"
+_SUFFIX = ".seg"
+_CURSOR = "cursor.json"
+_DEAD_LETTER = "dead_letter" + _SUFFIX
+
+
+class _Segment(object):
+    def __init__(self, seq, path, size=0, records=0):
+        self.seq = seq
+        self.path = path
+        self.size = size
+        self.records = records
+
+
+class Spool(object):
+    """Append-only segment spool with one acknowledging consumer.
+
+    append() never blocks on the network, only on the local disk. The
+    consumer calls read_batch() and then ack(token) after a successful
+    upload; without an ack the same records are returned again.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = 64 * 1024 * 1024,
+                 max_bytes: int = 4 * 1024 ** 3, fsync: bool = False):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.fsync = fsync
+
+        self._lock = threading.Lock()
+        self._readable = threading.Condition(self._lock)
+        self._segments = []
+        self._writer = None
+        self._closed = False
+
+        self.appended = 0
+        self.acked = 0
+        self.evicted = 0
+        self.set_aside_count = 0
+        self.pending = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+
+    # -- recovery -------------------------------------------------------
+
+    def _recover(self):
+        seqs = sorted(int(name[:-len(_SUFFIX)]) for name in os.listdir(self.directory)
+                      if name.endswith(_SUFFIX) and name[:-len(_SUFFIX)].isdigit())
+        cursor = self._load_cursor()
+        for seq in seqs:
+            path = self._path(seq)
+            if cursor and seq < cursor[0]:
+                os.remove(path)  # fully acked before the restart
+                continue
+            size, records = self._scan(path)
+            self._segments.append(_Segment(seq, path, size, records))
+
+        self._cursor = cursor or (self._segments[0].seq if self._segments else 0, 0)
+        for seg in self._segments:
+            start = self._cursor[1] if seg.seq == self._cursor[0] else 0
+            if seg.seq >= self._cursor[0]:
+                self.pending += self._count(seg.path, start, seg.size)
+
+        next_seq = self._segments[-1].seq + 1 if self._segments else self._cursor[0]
+        self._open_writer(max(next_seq, self._cursor[0]))
+
+    def _scan(self, path):
+        """Returns (valid size, record count), ignoring a torn tail."""
+        size = 0
+        records = 0
+        with open(path, "rb") as f:
+            while True:
+                n = self._skip_record(f)
+                if n is None:
+                    break
+                size += n
+                records += 1
+        return size, records
+
+    def _count(self, path, start, end):
+        records = 0
+        with open(path, "rb") as f:
+            f.seek(start)
+            while f.tell() < end and self._skip_record(f) is not None:
+                records += 1
+        return records
+
+    def _skip_record(self, f):
+        header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            return None
+        magic, meta_len, blob_len, crc = _HEADER.unpack(header)
+        if magic != _MAGIC:
+            return None
+        meta = f.read(meta_len)
+        if len(meta) < meta_len or zlib.crc32(meta) != crc:
+            return None
+        here = f.tell()
+        end = f.seek(0, os.SEEK_END)
+        if end - here < blob_len:
+            return None
+        f.seek(here + blob_len)
+        return _HEADER.size + meta_len + blob_len
+
+    def _load_cursor(self):
+        try:
+            with open(os.path.join(self.directory, _CURSOR)) as f:
+                c = json.load(f)
+            return (c["segment"], c["offset"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _save_cursor(self):
+        path = os.path.join(self.directory, _CURSOR)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"segment": self._cursor[0], "offset": self._cursor[1]}, f)
+        os.replace(tmp, path)
+
+    # -- writing --------------------------------------------------------
+
+    def _path(self, seq):
+        return os.path.join(self.directory, f"{seq:012d}{_SUFFIX}")
+
+    def _open_writer(self, seq):
+        seg = _Segment(seq, self._path(seq))
+        self._writer = open(seg.path, "ab")
+        self._segments.append(seg)
+
+    def _rotate(self):
+        self._writer.flush()
+        if self.fsync:
+            os.fsync(self._writer.fileno())
+        self._writer.close()
+        self._open_writer(self._segments[-1].seq + 1)
+
+    def append(self, meta: dict, blob):
+        """Appends one frame: meta is JSON-serializable, blob any buffer."""
+        header, meta, blob = self._record(meta, blob)
+        with self._lock:
+            if self._closed:
+                raise ValueError("append() on a closed Spool")
+            seg = self._segments[-1]
+            if seg.size and seg.size + len(blob) > self.segment_bytes:
+                self._rotate()
+                seg = self._segments[-1]
+            self._writer.write(header)
+            self._writer.write(meta)
+            self._writer.write(blob)
+            self._writer.flush()
+            if self.fsync:
+                os.fsync(self._writer.fileno())
+            seg.size += _HEADER.size + len(meta) + len(blob)
+            seg.records += 1
+            self.appended += 1
+            self.pending += 1
+            self._enforce_budget()
+            self._readable.notify()
+
+    @staticmethod
+    def _record(meta, blob):
+        meta = json.dumps(meta).encode("utf-8")
+        blob = memoryview(blob).cast("B")
+        return _HEADER.pack(_MAGIC, len(meta), len(blob), zlib.crc32(meta)), meta, blob
+
+    def set_aside(self, meta: dict, blob):
+        """Appends one frame to the dead letter file. The caller still
+        acks it, which is what takes it out of the spool."""
+        header, meta, blob = self._record(meta, blob)
+        with self._lock:
+            with open(os.path.join(self.directory, _DEAD_LETTER), "ab") as f:
+                f.write(header)
+                f.write(meta)
+                f.write(blob)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            self.set_aside_count += 1
+
+    def _enforce_budget(self):
+        while self.total_bytes() > self.max_bytes and len(self._segments) > 1:
+            oldest = self._segments.pop(0)
+            if oldest.seq >= self._cursor[0]:
+                start = self._cursor[1] if oldest.seq == self._cursor[0] else 0
+                lost = self._count(oldest.path, start, oldest.size)
+                self.evicted += lost
+                self.pending -= lost
+                self._cursor = (self._segments[0].seq, 0)
+                self._save_cursor()
+            os.remove(oldest.path)
+
+    # -- reading --------------------------------------------------------
+
+    def read_batch(self, max_records: int, max_bytes: int,
+                   timeout: float = None, linger: float = 0.0):
+        """Returns (records, token) from the acknowledged position.
+
+        Waits up to timeout for a first record, then up to linger for
+        max_records to be available, so a live stream is still batched
+        while a backlog is read back at full disk speed. records is a list
+        of (meta dict, blob bytearray); pass token to ack() once they are
+        safely stored elsewhere.
+        """
+        with self._lock:
+            if not self._readable.wait_for(
+                    lambda: self.pending > 0 or self._closed, timeout):
+                return [], None
+            if linger > 0 and self.pending < max_records:
+                self._readable.wait_for(
+                    lambda: self.pending >= max_records or self._closed, linger)
+            # Only where to read is taken under the lock; the records are
+            # read after releasing it, so append() never waits behind a
+            # backlog being replayed. Only this consumer moves the cursor.
+            seq, offset = self._cursor
+            segments = [(seg.seq, seg.path, seg.size)
+                        for seg in self._segments if seg.seq >= seq]
+
+        records = []
+        nbytes = 0
+        # Records read per segment, so ack() can leave out any segment
+        # evicted while the batch was out
+        counts = []
+        for seg_seq, path, size in segments:
+            if seg_seq > seq:
+                seq, offset = seg_seq, 0
+            read = len(records)
+            try:
+                f = open(path, "rb")
+            except FileNotFoundError:
+                break  # evicted meanwhile; ack() ignores the token
+            with f:
+                while offset < size and len(records) < max_records \
+                        and (not records or nbytes < max_bytes):
+                    f.seek(offset)
+                    record = self._read_record(f)
+                    if record is None:
+                        offset = size  # torn tail, skip the rest
+                        break
+                    meta, blob, length = record
+                    records.append((meta, blob))
+                    nbytes += len(blob)
+                    offset += length
+            if len(records) > read:
+                counts.append((seg_seq, len(records) - read))
+            if len(records) >= max_records or nbytes >= max_bytes:
+                break
+        return records, (seq, offset, counts)
+
+    def _read_record(self, f):
+        header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            return None
+        magic, meta_len, blob_len, crc = _HEADER.unpack(header)
+        if magic != _MAGIC:
+            return None
+        meta = f.read(meta_len)
+        if len(meta) < meta_len or zlib.crc32(meta) != crc:
+            return None
+        blob = bytearray(blob_len)
+        if f.readinto(blob) < blob_len:
+            return None
+        return json.loads(meta), blob, _HEADER.size + meta_len + blob_len
+
+    def ack(self, token):
+        """Marks everything up to token as uploaded and frees old segments."""
+        if token is None:
+            return
+        seq, offset, counts = token
+        with self._lock:
+            if seq < self._cursor[0]:
+                return  # evicted while the batch was being uploaded
+            # Records of segments evicted meanwhile were already taken off
+            # pending by the eviction
+            records = sum(n for seg_seq, n in counts if seg_seq >= self._cursor[0])
+            self._cursor = (seq, offset)
+            self.acked += records
+            self.pending -= records
+            # Segments before the cursor, and the cursor's own once fully
+            # read and no longer written to, are done
+            while len(self._segments) > 1:
+                seg = self._segments[0]
+                if seg.seq < seq or (seg.seq == seq and offset >= seg.size):
+                    os.remove(seg.path)
+                    self._segments.pop(0)
+                    if seg.seq == seq:
+                        self._cursor = (self._segments[0].seq, 0)
+                else:
+                    break
+            self._save_cursor()
+
+    # -- state ----------------------------------------------------------
+
+    def total_bytes(self):
+        return sum(seg.size for seg in self._segments)
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            if self._writer is not None:
+                self._writer.flush()
+                if self.fsync:
+                    os.fsync(self._writer.fileno())
+                self._writer.close()
+                self._writer = None
+            self._readable.notify_all()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": self.pending,
+                "segments": len(self._segments),
+                "bytes": self.total_bytes(),
+                "appended": self.appended,
+                "acked": self.acked,
+                "evicted": self.evicted,
+                "set_aside": self.set_aside_count,
+            }
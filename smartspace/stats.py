@@ -0,0 +1,208 @@
+"""Hot-path timing histograms, counters and gauges, and a stats endpoint.
+
+Recording a sample is a bisect and two additions under a lock, cheap
+enough for every frame. A StatsServer publishes the registry on a local
+port as JSON (/stats) and Prometheus text (/metrics), and a reporter
+thread can print a one-line summary periodically.
+"""
+
+import json
+import time
+import bisect
+import threading
+import contextlib
+import http.server
+
+# Histogram bucket upper bounds in seconds; the last bucket is open ended
+BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5,
+           1.0, 2.0, 5.0, 10.0, 30.0)
+
+
+class Histogram(object):
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, q: float) -> float:
+        """Estimates a percentile by interpolating inside its bucket."""
+        with self._lock:
+            if self.count == 0:
+                return 0.0
+            rank = q * self.count
+            seen = 0
+            for i, n in enumerate(self.counts):
+                if n and seen + n >= rank:
+                    lo = self.buckets[i - 1] if i > 0 else 0.0
+                    hi = self.buckets[i] if i < len(self.buckets) else self.max
+                    return min(self.max, lo + (hi - lo) * (rank - seen) / n)
+                seen += n
+            return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.sum / self.count * 1000, 2) if self.count else 0.0,
+            "p50_ms": round(self.percentile(0.50) * 1000, 2),
+            "p90_ms": round(self.percentile(0.90) * 1000, 2),
+            "p99_ms": round(self.percentile(0.99) * 1000, 2),
+            "max_ms": round(self.max * 1000, 2),
+        }
+
+
+class Stats(object):
+    """Registry of named timers, counters and gauges.
+
+    Gauges are callables evaluated when a snapshot is taken, so reading
+    queue depth and similar costs nothing on the hot path.
+    """
+
+    def __init__(self, prefix: str = "smartspace"):
+        self.prefix = prefix
+        self.started = time.time()
+        self.timers = {}
+        self.counters = {}
+        self.gauges = {}
+        self.labels = {}
+        self._lock = threading.Lock()
+
+    def timer(self, name) -> Histogram:
+        h = self.timers.get(name)
+        if h is None:
+            with self._lock:
+                h = self.timers.setdefault(name, Histogram())
+        return h
+
+    def record(self, name, seconds: float):
+        self.timer(name).record(seconds)
+
+    @contextlib.contextmanager
+    def time(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name, fn):
+        self.gauges[name] = fn
+
+    def label(self, name, value):
+        """Static information reported alongside the metrics (e.g. node ID)."""
+        self.labels[name] = value
+
+    def snapshot(self):
+        gauges = {}
+        for name, fn in list(self.gauges.items()):
+            try:
+                gauges[name] = fn()
+            except Exception as e:
+                gauges[name] = None
+                print(f"Gauge {name} failed: {e}")
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            "labels": dict(self.labels),
+            "uptime_s": round(time.time() - self.started, 1),
+            "timers": {name: h.snapshot() for name, h in list(self.timers.items())},
+            "counters": counters,
+            "gauges": gauges,
+        }
+
+    def prometheus(self):
+        """Renders the registry in the Prometheus text exposition format."""
+        p = self.prefix
+        labels = ",".join(f'{k}="{v}"' for k, v in self.labels.items())
+        lines = []
+        for name, h in list(self.timers.items()):
+            metric = f"{p}_{name}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            with h._lock:
+                counts = list(h.counts)
+                total, count = h.sum, h.count
+            cumulative = 0
+            for bound, n in zip(list(h.buckets) + ["+Inf"], counts):
+                cumulative += n
+                le = f'le="{bound}"'
+                lines.append(f"{metric}_bucket{{{','.join(filter(None, [labels, le]))}}} {cumulative}")
+            lines.append(f"{metric}_sum{{{labels}}} {total}")
+            lines.append(f"{metric}_count{{{labels}}} {count}")
+        snap = self.snapshot()
+        for name, value in snap["counters"].items():
+            lines.append(f"# TYPE {p}_{name}_total counter")
+            lines.append(f"{p}_{name}_total{{{labels}}} {value}")
+        for name, value in snap["gauges"].items():
+            if isinstance(value, (int, float)):
+                lines.append(f"# TYPE {p}_{name} gauge")
+                lines.append(f"{p}_{name}{{{labels}}} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary_line(self):
+        snap = self.snapshot()
+        parts = [f"{name}={t['p50_ms']:.0f}/{t['p99_ms']:.0f}ms"
+                 for name, t in snap["timers"].items() if t["count"]]
+        parts += [f"{name}={value}" for name, value in snap["gauges"].items()]
+        parts += [f"{name}={value}" for name, value in snap["counters"].items()]
+        return "Stats (p50/p99): " + " ".join(parts)
+
+    def start_reporter(self, interval: float):
+        """Prints summary_line() every interval seconds on a daemon thread."""
+        def report():
+            while True:
+                time.sleep(interval)
+                print(self.summary_line())
+
+        thread = threading.Thread(target=report, name="stats-reporter", daemon=True)
+        thread.start()
+        return thread
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        stats = self.server.stats
+        if self.path in ("/", "/stats"):
+            body = json.dumps(stats.snapshot()).encode()
+            ctype = "application/json"
+        elif self.path == "/metrics":
+            body = stats.prometheus().encode()
+            ctype = "text/plain; version=0.0.4"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # keep scrapes out of the node's log
+
+
+class StatsServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, stats, host="127.0.0.1", port=8765):
+        self.stats = stats
+        super().__init__((host, port), _Handler)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="stats-server",
+                         daemon=True).start()
+        return self
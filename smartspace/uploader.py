@@ -0,0 +1,264 @@
+"""Batched upload of queued frames to VDMS."""
+
+import time
+import queue
+
+
+def build_batch_query(batch):
+    """Returns (all_queries, blob_arr) adding every frame in one transaction.
+
+    A frame without a "format" is added with VDMS's default; one whose
+    format is None was encoded to a codec VDMS cannot store (webp) and
+    raises ValueError.
+    """
+    all_queries = []
+    blob_arr = []
+    for image in batch:
+        addImage = {}
+        if "format" in image:
+            if image["format"] is None:
+                raise ValueError("Frame encoded to a format VDMS has no "
+                                 "AddImage format for")
+            addImage["format"] = image["format"]
+        addImage["properties"] = image["props"]
+
+        query = {}
+        query["AddImage"] = addImage
+
+        all_queries.append(query)
+        blob_arr.append(image["image"])
+    return all_queries, blob_arr
+
+
+def rejected(response):
+    """The commands of a VDMS response that failed. VDMS answers a
+    transaction it rejects as a whole with a single error dict instead of
+    a list; that is returned as the only failure."""
+    if not isinstance(response, list):
+        return [response]
+    return [r for r in response
+            if not isinstance(r, dict)
+            or any(isinstance(v, dict) and v.get("status", 0) != 0
+                   for v in r.values())]
+
+
+def batch_report(batch, nbytes, latency, response):
+    """What on_batch is told about an upload, as a picklable dict: frame
+    count, bytes, round trip, each frame's wait in the queue (from its
+    queued_at), mean encode time, the commands VDMS rejected and how many
+    frames that cost (the whole batch if the transaction failed, with the
+    server's info)."""
+    started = time.time() - latency
+    failed = rejected(response)
+    report = {
+        "frames": len(batch),
+        "nbytes": nbytes,
+        "latency": latency,
+        "queue_waits": [started - image["queued_at"] for image in batch
+                        if "queued_at" in image],
+        "encode_ms": sum(image.get("encode_ms", 0) for image in batch) / len(batch),
+        "failed": failed,
+        "failed_frames": len(failed),
+    }
+    if not isinstance(response, list):
+        report["failed_frames"] = len(batch)
+        report["info"] = (response.get("info", str(response))
+                          if isinstance(response, dict) else str(response))
+    return report
+
+
+class BatchUploader(object):
+    """Drains a FrameQueue into VDMS in multi-command transactions.
+
+    A batch is flushed as soon as it holds batch_size frames or batch_bytes
+    of image data, or batch_latency seconds after its first frame arrived.
+    When the link falls behind the queue fills up and batches grow to the
+    limits, so each round trip carries more frames.
+
+    db is anything with a vdms-style query() (vdms.vdms, vdms.vdms_pool).
+    on_batch(batch, nbytes, latency, response) is called after every
+    upload a server answered, rejected commands included, and
+    on_error(batch, exc) when no server took it.
+    """
+
+    def __init__(self, db, frame_queue, batch_size: int = 8,
+                 batch_bytes: int = 64 * 1024 * 1024,
+                 batch_latency: float = 2.0, on_batch=None, on_error=None):
+        self.db = db
+        self.frame_queue = frame_queue
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        self.batch_latency = batch_latency
+        self.on_batch = on_batch
+        self.on_error = on_error
+
+        self.batches = 0
+        self.failed_batches = 0
+        self.rejected_batches = 0
+        self.retried_batches = 0
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.upload_time = 0.0
+
+    def upload(self, batch, keep: bool = False):
+        """Uploads one batch. Returns the VDMS response, or None on failure.
+
+        With keep the frames are still held elsewhere (the spool) and will
+        be retried, so a failure is counted as a retry rather than reported
+        to on_error as dropped frames.
+        """
+        all_queries, blob_arr = build_batch_query(batch)
+        nbytes = sum(memoryview(b).nbytes for b in blob_arr)
+
+        start = time.time()
+        try:
+            response, _ = self.db.query(all_queries, [blob_arr])
+        except ConnectionError as e:
+            if keep:
+                self.retried_batches += 1
+            else:
+                self.failed_batches += 1
+                if self.on_error is not None:
+                    self.on_error(batch, e)
+            return None
+        latency = time.time() - start
+
+        self.batches += 1
+        if rejected(response):
+            self.rejected_batches += 1
+        else:
+            self.frames_sent += len(batch)
+            self.bytes_sent += nbytes
+        self.upload_time += latency
+        if self.on_batch is not None:
+            self.on_batch(batch, nbytes, latency, response)
+        return response
+
+    def run(self, until: float = None, stop=None):
+        """Uploads until the time.time() deadline until, the stop Event is
+        set, or the queue is closed and drained; then flushes what is left.
+        """
+        batch = []
+        nbytes = 0
+        deadline = None
+
+        while not (stop is not None and stop.is_set()):
+            now = time.time()
+            if until is not None and now >= until:
+                break
+            if self.frame_queue.closed and self.frame_queue.qsize() == 0:
+                break
+
+            # Block until the next frame arrives or the open batch is due;
+            # wake at least once a second to notice stop requests
+            wait = 1.0 if until is None else until - now
+            if deadline is not None:
+                wait = deadline - now
+            try:
+                image = self.frame_queue.get(timeout=max(0.0, min(wait, 1.0)))
+            except queue.Empty:
+                image = None
+
+            if image is not None:
+                if not batch:
+                    deadline = time.time() + self.batch_latency
+                batch.append(image)
+                nbytes += memoryview(image["image"]).nbytes
+
+            if batch and (len(batch) >= self.batch_size
+                          or nbytes >= self.batch_bytes
+                          or time.time() >= deadline):
+                self.upload(batch)
+                batch = []
+                nbytes = 0
+                deadline = None
+
+        if batch:
+            self.upload(batch)
+
+    def drain_spool(self, spool, stop=None, drain_timeout: float = 30.0,
+                    max_backoff: float = 30.0, max_rejects: int = 3):
+        """Uploads frames from a Spool, acknowledging each accepted batch.
+
+        A batch is acknowledged only once VDMS accepted every command in
+        it. When no server takes it, or VDMS rejects any of it, it stays
+        in the spool and is retried with exponential backoff, so nothing is
+        lost during an outage and the backlog is read back in full batches
+        once a server returns. A batch rejected max_rejects times in a row
+        holds a frame VDMS will never take, which would otherwise block
+        the spool for good: it is uploaded in halves until the frames
+        rejected on their own are found, and those are set aside
+        (Spool.set_aside) and logged. A server dropping out midway leaves
+        the batch to be retried whole, so the halves already accepted may
+        be uploaded twice. After the stop Event is set, uploading continues
+        until the spool is empty or drain_timeout expires; the rest waits
+        for the next run.
+        """
+        backoff = 0.0
+        rejects = 0
+        drain_until = None
+        while True:
+            stopping = stop is not None and stop.is_set()
+            if stopping:
+                if drain_until is None:
+                    drain_until = time.time() + drain_timeout
+                if spool.pending == 0 or time.time() >= drain_until:
+                    break
+
+            records, token = spool.read_batch(
+                self.batch_size, self.batch_bytes, timeout=1.0,
+                linger=0.0 if stopping else self.batch_latency)
+            if not records:
+                continue
+
+            batch = [dict(meta, image=blob) for meta, blob in records]
+            response = self.upload(batch, keep=True)
+            if response is not None and rejected(response):
+                rejects += 1
+                if rejects >= max_rejects and self._set_aside_rejected(
+                        spool, batch, response):
+                    response = []
+            if response is None or rejected(response):
+                backoff = min(max_backoff, max(1.0, backoff * 2))
+                if stopping:
+                    # stop is already set, so stop.wait() would not wait
+                    time.sleep(max(0.0, min(backoff, drain_until - time.time())))
+                elif stop is not None:
+                    stop.wait(backoff)
+                else:
+                    time.sleep(backoff)
+                continue
+            backoff = 0.0
+            rejects = 0
+            spool.ack(token)
+
+    def _set_aside_rejected(self, spool, batch, response):
+        """Splits a rejected batch until the frames VDMS rejects on their
+        own are isolated, and sets those aside. Returns False if a server
+        stopped answering first."""
+        if len(batch) == 1:
+            frame = batch[0]
+            print(f"Setting aside frame {frame.get('props')} rejected by "
+                  f"VDMS: {rejected(response)}")
+            spool.set_aside({k: v for k, v in frame.items() if k != "image"},
+                            frame["image"])
+            return True
+        for half in (batch[:len(batch) // 2], batch[len(batch) // 2:]):
+            response = self.upload(half, keep=True)
+            if response is None:
+                return False
+            if rejected(response) and not self._set_aside_rejected(
+                    spool, half, response):
+                return False
+        return True
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "rejected_batches": self.rejected_batches,
+            "retried_batches": self.retried_batches,
+            "frames_sent": self.frames_sent,
+            "bytes_sent": self.bytes_sent,
+            "upload_seconds": round(self.upload_time, 3),
+        }
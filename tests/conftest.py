@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# The packages live at the top of the repository, which has no setup.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench import vdms_standin  # noqa: E402
+
+
+@pytest.fixture
+def standin():
+    """A VDMS stand-in on a free port; yields the server."""
+    server = vdms_standin.start("127.0.0.1", 0)
+    yield server
+    server.shutdown()
+    server.server_close()
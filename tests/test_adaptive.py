@@ -0,0 +1,59 @@
+from smartspace.adaptive import QualityController
+
+
+def _ticks(controller, backlogs, start=0.0):
+    """Feeds one backlog per interval; returns the level after each."""
+    return [controller.settings(backlog, now=start + i * controller.interval)[0]
+            for i, backlog in enumerate(backlogs)]
+
+
+def test_ladder():
+    assert QualityController().levels == [
+        (90, 1.0), (80, 1.0), (70, 1.0), (60, 1.0), (50, 1.0), (50, 0.75), (50, 0.5)]
+    # Lossless: only the resolution steps
+    assert QualityController(codec="png", quality=6).levels == [
+        (6, 1.0), (6, 0.75), (6, 0.5)]
+
+
+def test_steps_down_while_the_backlog_grows():
+    controller = QualityController(target_backlog=16)
+    # Over target and shrinking, or under target but not yet low, holds
+    assert _ticks(controller, [0, 20, 25, 18, 30, 12]) == [0, 1, 2, 2, 3, 3]
+    assert controller.settings(12, now=10.0)[1:] == (60, 1.0)
+    assert controller.steps_down == 3
+
+
+def test_bottom_rung_is_the_floor():
+    controller = QualityController(codec="png", target_backlog=1)
+    assert _ticks(controller, [0] + list(range(2, 8))) == [0, 1, 2, 2, 2, 2, 2]
+    assert controller.stats()["scale"] == 0.5
+
+
+def test_slow_round_trip_steps_down():
+    controller = QualityController(rtt_limit=0.5)
+    controller.observe(1000, 1.0)
+    assert _ticks(controller, [0, 0]) == [0, 1]
+
+
+def test_recovers_after_hold():
+    controller = QualityController(target_backlog=16, hold=10)
+    assert _ticks(controller, [0, 20, 25]) == [0, 1, 2]
+    # Low from t=6: one rung up once the backlog has been low and the
+    # level unchanged for hold seconds, the next rung hold seconds later
+    levels = _ticks(controller, [0] * 12, start=6.0)
+    assert levels == [2] * 5 + [1] * 5 + [0] * 2
+    assert controller.steps_up == 2
+
+
+def test_no_step_up_without_headroom():
+    controller = QualityController(target_backlog=16, hold=2)
+    levels = []
+    for i, backlog in enumerate([0, 20] + [0] * 8):
+        # The link is busy all the time for the current frames, so frames
+        # twice the size would not fit
+        for _ in range(4):
+            controller.observe(1000, 0.5)
+        controller.observe_frame(controller.level, 1000)
+        levels.append(controller.settings(backlog, now=i * 2.0)[0])
+    assert levels == [0] + [1] * 9
+    assert controller.steps_up == 0
@@ -0,0 +1,81 @@
+import os
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from smartspace.archive import ArchiveWriter
+
+NOON = int(datetime(2026, 10, 18, 12, tzinfo=timezone.utc).timestamp() * 1000)
+DAY = 24 * 3600 * 1000
+
+
+@pytest.fixture
+def utc(monkeypatch):
+    # Archive names are in local time
+    monkeypatch.setenv("TZ", "UTC")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def _archive(tmp_path, frames, **kwargs):
+    archive = ArchiveWriter(str(tmp_path), **kwargs)
+    archive.start()
+    paths = [archive.submit(data, ts, ".jpg") for ts, data in frames]
+    archive.close()
+    return archive, paths
+
+
+def test_names_files_by_day_and_millisecond(tmp_path, utc):
+    written = []
+    archive, _ = _archive(tmp_path, [(NOON + 7, b"abc")],
+                          on_write=lambda *a: written.append(a))
+    path = tmp_path / "2026-10-18" / "image_20261018_120000_007.jpg"
+    assert path.read_bytes() == b"abc"
+    assert [(p, n) for p, n, _ in written] == [(str(path), 3)]
+    assert archive.stats()["written"] == 1
+
+
+def test_same_millisecond_never_overwrites(tmp_path, utc):
+    frames = [(NOON, b"first"), (NOON, b"second"), (NOON, b"third")]
+    _archive(tmp_path, frames)
+    # A writer started later, as after a restart, finds the names taken too
+    _archive(tmp_path, [(NOON, b"fourth")])
+
+    day = tmp_path / "2026-10-18"
+    assert sorted(os.listdir(day)) == ["image_20261018_120000_000.jpg",
+                                       "image_20261018_120000_000_1.jpg",
+                                       "image_20261018_120000_000_2.jpg",
+                                       "image_20261018_120000_000_3.jpg"]
+    assert (day / "image_20261018_120000_000.jpg").read_bytes() == b"first"
+    assert (day / "image_20261018_120000_000_3.jpg").read_bytes() == b"fourth"
+
+
+def test_evicts_oldest_files_over_budget(tmp_path, utc):
+    frames = [(NOON - DAY + i, bytes(100)) for i in range(3)] \
+        + [(NOON + i, bytes(100)) for i in range(3)]
+    archive, _ = _archive(tmp_path, frames, max_bytes=350, batch_size=1)
+
+    stats = archive.stats()
+    assert (stats["evicted"], stats["bytes"]) == (3, 300)
+    # The emptied day directory goes with its files
+    assert os.listdir(tmp_path) == ["2026-10-18"]
+    assert len(os.listdir(tmp_path / "2026-10-18")) == 3
+
+
+def test_budget_counts_files_already_on_disk(tmp_path, utc):
+    _archive(tmp_path, [(NOON + i, bytes(100)) for i in range(3)])
+    archive, _ = _archive(tmp_path, [(NOON + 10, bytes(100))], max_bytes=250)
+    assert archive.stats()["evicted"] == 2
+    assert sorted(os.listdir(tmp_path / "2026-10-18")) \
+        == ["image_20261018_120000_002.jpg", "image_20261018_120000_010.jpg"]
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    archive = ArchiveWriter(str(tmp_path), queue_size=2)
+    # Not started: nothing drains the queue
+    assert [archive.submit(b"x", NOON + i, ".jpg") is not None
+            for i in range(3)] == [True, True, False]
+    assert archive.stats()["dropped"] == 1
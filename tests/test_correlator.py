@@ -0,0 +1,110 @@
+import queue
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from smartspace.correlator import ResultCorrelator
+
+
+def _result(faces):
+    return SimpleNamespace(face_landmarks=[[]] * faces)
+
+
+def _drain(correlator):
+    out = []
+    while True:
+        try:
+            item, result, status = correlator.get(timeout=0)
+        except queue.Empty:
+            return out
+        out.append((item["n"], result, status))
+
+
+def test_pairs_results_with_their_frames():
+    correlator = ResultCorrelator(capacity=8)
+    for ts in (10, 20, 30):
+        correlator.add_frame(ts, {"n": ts})
+    a, b = _result(1), _result(0)
+    correlator.add_result(20, a)
+    correlator.add_result(30, b)
+    # A result for a frame already released is late
+    correlator.add_result(10, _result(2))
+
+    assert _drain(correlator) == [(10, None, "skipped"), (20, a, "matched"),
+                                  (30, b, "matched")]
+    stats = correlator.stats()
+    assert (stats["matched"], stats["skipped"], stats["late"]) == (2, 1, 1)
+    assert stats["pending"] == 0
+
+
+def test_evicts_when_the_ring_is_full():
+    correlator = ResultCorrelator(capacity=2)
+    for ts in range(4):
+        correlator.add_frame(ts, {"n": ts})
+    assert [(n, s) for n, _, s in _drain(correlator)] == [(0, "evicted"),
+                                                          (1, "evicted")]
+    assert correlator.pending() == 2
+
+
+def test_times_out_frames_without_results():
+    correlator = ResultCorrelator(capacity=4, timeout=0.0)
+    correlator.add_frame(1, {"n": 1})
+    correlator.add_frame(2, {"n": 2})
+    correlator.expire()
+    assert [s for _, _, s in _drain(correlator)] == ["timeout", "timeout"]
+
+
+def test_ready_queue_is_bounded():
+    correlator = ResultCorrelator(capacity=16, ready_size=4)
+    for ts in range(10):
+        correlator.add_frame(ts, {"n": ts})
+        correlator.add_result(ts, _result(0))
+    assert [n for n, _, _ in _drain(correlator)] == [6, 7, 8, 9]
+    assert correlator.stats()["dropped"] == 6
+
+
+def test_faces_only_keeps_frames_with_faces():
+    correlator = ResultCorrelator(capacity=16, ready_size=2, policy="faces_only")
+    for ts, faces in enumerate([1, 0, 0, 1, 0]):
+        correlator.add_frame(ts, {"n": ts})
+        correlator.add_result(ts, _result(faces))
+    assert [n for n, _, _ in _drain(correlator)] == [0, 3]
+
+
+def test_blocked_consumer_does_not_hold_up_capture():
+    correlator = ResultCorrelator(capacity=4, ready_size=1, policy="block")
+    correlator.add_frame(0, {"n": 0})
+    correlator.add_result(0, _result(1))
+
+    # The ready queue is full, so the result callback waits in put()...
+    correlator.add_frame(1, {"n": 1})
+    callback = threading.Thread(target=correlator.add_result, args=(1, _result(1)),
+                                daemon=True)
+    callback.start()
+    callback.join(0.2)
+    assert callback.is_alive()
+
+    # ...without holding up the capture thread
+    capture = threading.Thread(target=correlator.add_frame, args=(2, {"n": 2}),
+                               daemon=True)
+    capture.start()
+    capture.join(1)
+    assert not capture.is_alive()
+    assert correlator.pending() == 1
+
+    assert correlator.get(timeout=1)[0]["n"] == 0
+    callback.join(1)
+    assert not callback.is_alive()
+    assert correlator.get(timeout=1)[0]["n"] == 1
+
+
+def test_timestamps_increase():
+    correlator = ResultCorrelator()
+    stamps = [correlator.next_timestamp() for _ in range(100)]
+    assert stamps == sorted(set(stamps))
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        ResultCorrelator(policy="bogus")
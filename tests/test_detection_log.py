@@ -0,0 +1,93 @@
+import os
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import numpy as np
+
+from smartspace import detection_log, landmarks
+from smartspace.detection_log import DetectionLog
+
+MIDNIGHT = int(datetime(2026, 10, 18, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _face(n=5, value=0.5, blendshapes=()):
+    return SimpleNamespace(
+        face_landmarks=[[SimpleNamespace(x=value, y=value, z=value)] * n],
+        face_blendshapes=[[SimpleNamespace(index=i, score=s) for i, s in blendshapes]]
+        if blendshapes else [])
+
+
+def test_write_then_load(tmp_path):
+    log = DetectionLog(str(tmp_path), "ss1", flush_records=3)
+    written = []
+    for i in range(10):
+        ts = MIDNIGHT + 3_600_000 + i * 100
+        faces = i % 3 == 0
+        packed = landmarks.encode_result(_face(value=i / 10) if faces else None)
+        log.append(ts, packed, int(faces), "matched" if faces else "skipped")
+        written.append((ts, int(faces)))
+    log.close()
+    assert log.records == 10
+
+    loaded = detection_log.load(str(tmp_path))
+    assert loaded["timestamp_ms"].tolist() == [ts for ts, _ in written]
+    assert loaded["faces"].tolist() == [f for _, f in written]
+    assert [detection_log.STATUS_NAMES[s] for s in loaded["status"].tolist()] \
+        == ["matched" if f else "skipped" for _, f in written]
+    assert loaded["frame"].tolist() == [0, 3, 6, 9]
+    assert loaded["landmarks"].shape == (4, 5, 3)
+    np.testing.assert_allclose(loaded["landmarks"][:, 0, 0], [0, 0.3, 0.6, 0.9],
+                               atol=1e-3)
+
+
+def test_days_split_on_record_time(tmp_path):
+    # One buffer spanning midnight, flushed at once
+    log = DetectionLog(str(tmp_path), "ss1", flush_records=100)
+    stamps = [MIDNIGHT - 2000, MIDNIGHT - 1, MIDNIGHT, MIDNIGHT + 1000]
+    for ts in stamps:
+        log.append(ts, landmarks.encode_result(None))
+    log.close()
+
+    assert sorted(os.listdir(tmp_path)) == ["ss1_20261017_235958_000.sdl",
+                                            "ss1_20261018_000000_000.sdl"]
+    before = detection_log.load(str(tmp_path), "2026-10-17")
+    after = detection_log.load(str(tmp_path), "2026-10-18")
+    assert before["timestamp_ms"].tolist() == stamps[:2]
+    assert after["timestamp_ms"].tolist() == stamps[2:]
+
+
+def test_pads_faces_to_the_widest_record(tmp_path):
+    log = DetectionLog(str(tmp_path), "ss1")
+    log.append(MIDNIGHT, landmarks.encode_result(_face(blendshapes=[(0, 0.1), (1, 0.2)])), 1)
+    log.append(MIDNIGHT + 1, landmarks.encode_result(_face(blendshapes=[(0, 0.3), (3, 0.4)])), 1)
+    log.append(MIDNIGHT + 2, landmarks.encode_result(_face(n=3)), 1)
+    log.close()
+
+    loaded = detection_log.load(str(tmp_path))
+    assert loaded["landmarks"].shape == (3, 5, 3)
+    assert np.isnan(loaded["landmarks"][2, 3:]).all()
+    np.testing.assert_allclose(loaded["blendshapes"], [
+        [0.1, 0.2, np.nan, np.nan],
+        [0.3, np.nan, np.nan, 0.4],
+        [np.nan] * 4], atol=1e-3)
+
+
+def test_blendshapes_follow_category_index():
+    face = [SimpleNamespace(x=0, y=0, z=0)]
+    result = SimpleNamespace(face_landmarks=[face], face_blendshapes=[
+        [SimpleNamespace(index=3, score=0.5), SimpleNamespace(index=0, score=0.25)]])
+    blendshapes = landmarks.decode(landmarks.encode_result(result))["blendshapes"]
+    np.testing.assert_array_equal(blendshapes[:, [0, 3]], [[0.25, 0.5]])
+    assert np.isnan(blendshapes[0, 1:3]).all()
+
+
+def test_torn_chunk_is_ignored(tmp_path):
+    log = DetectionLog(str(tmp_path), "ss1", flush_records=2)
+    for i in range(4):
+        log.append(MIDNIGHT + i, landmarks.encode_result(None))
+    log.close()
+    path = os.path.join(tmp_path, os.listdir(tmp_path)[0])
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 5)
+    assert detection_log.load(str(tmp_path))["timestamp_ms"].tolist() \
+        == [MIDNIGHT, MIDNIGHT + 1]
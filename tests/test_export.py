@@ -0,0 +1,105 @@
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import export
+import vdms
+from bench import vdms_standin
+from smartspace.properties import format_timestamp
+
+START = datetime(2026, 10, 18, 12, tzinfo=timezone.utc)
+
+
+def _upload(server, frames):
+    db = vdms.vdms()
+    db.connect("127.0.0.1", server.server_address[1])
+    query, blobs = [], []
+    for tick, ms in frames:
+        query.append({"AddImage": {"format": "jpg", "properties": {
+            "ID": "ss1", "Timestamp": format_timestamp(ms), "TimestampMs": ms,
+            "Tick": tick}}})
+        blobs.append(b"\xff\xd8\xff" + tick.to_bytes(2, "little"))
+    db.query(query, [blobs])
+    db.disconnect()
+
+
+def _frames(n, ties=3):
+    base = round(START.timestamp() * 1000)
+    return [(tick, base + (tick // ties) * 1000) for tick in range(n)]
+
+
+def _exporter(servers, out, **kwargs):
+    return export.Exporter([f"127.0.0.1:{s.server_address[1]}" for s in servers],
+                           0, ["ss1"], START, START + timedelta(minutes=1), str(out),
+                           page_size=4, properties=["Tick"], **kwargs)
+
+
+def _exported(out):
+    with open(os.path.join(out, "ss1", "metadata.jsonl")) as f:
+        ticks = [json.loads(line)["Tick"] for line in f]
+    files = {}
+    for directory, _, names in os.walk(os.path.join(out, "ss1")):
+        for name in names:
+            if name.endswith(".jpg"):
+                with open(os.path.join(directory, name), "rb") as f:
+                    files[name] = int.from_bytes(f.read()[3:], "little")
+    return ticks, files
+
+
+def test_ties_across_pages_and_servers(tmp_path, standin):
+    other = vdms_standin.start("127.0.0.1", 0)
+    try:
+        frames = _frames(50)
+        # Frames of one millisecond on both servers, as pool failover leaves
+        _upload(standin, frames[0::2])
+        _upload(other, frames[1::2])
+        exporter = _exporter([standin, other], tmp_path, connections=2)
+        assert exporter.run(progress_interval=60)
+    finally:
+        other.shutdown()
+        other.server_close()
+
+    ticks, files = _exported(tmp_path)
+    assert sorted(ticks) == list(range(50))
+    assert sorted(files.values()) == list(range(50))
+    assert "20261018_120000_000_2.jpg" in files
+    assert not [n for n in os.listdir(tmp_path / "ss1" / "2026-10-18")
+                if n.endswith(".part")]
+
+
+class _Crash(Exception):
+    pass
+
+
+def test_resumes_from_the_journal(tmp_path, standin, monkeypatch):
+    _upload(standin, _frames(30))
+    commit = export.Exporter._commit_page
+    pages = []
+
+    def crash_on_third_page(self, camera, key, entities, *args):
+        pages.append(len(entities))
+        if len(pages) == 3:
+            # The metadata reaches the disk, the journal entry does not
+            with open(self._metadata_path(camera), "a") as f:
+                f.writelines(json.dumps(props) + "\n" for props in entities)
+            raise _Crash
+        return commit(self, camera, key, entities, *args)
+
+    monkeypatch.setattr(export.Exporter, "_commit_page", crash_on_third_page)
+    exporter = _exporter([standin], tmp_path)
+    with pytest.raises(_Crash):
+        exporter._worker(exporter.servers[0])
+    exporter.journal.close()
+    monkeypatch.undo()
+
+    exporter = _exporter([standin], tmp_path)
+    assert exporter.run(progress_interval=60)
+    # The two journaled pages are not fetched again
+    assert exporter.frames == 30 - 8
+
+    ticks, files = _exported(tmp_path)
+    assert ticks == list(range(30))
+    assert sorted(files.values()) == list(range(30))
+    assert len(files) == 30
@@ -0,0 +1,79 @@
+import queue
+import threading
+
+import pytest
+
+from smartspace.frame_queue import FrameQueue
+
+
+def _fill(frames, faces):
+    return [frames.put({"n": n, "faces": f}) for n, f in enumerate(faces)]
+
+
+def _drain(frames):
+    frames.close()
+    out = []
+    while True:
+        try:
+            out.append(frames.get()["n"])
+        except queue.Empty:
+            return out
+
+
+def test_block_waits_for_room():
+    frames = FrameQueue(2, "block")
+    _fill(frames, [0, 0])
+    # Times out and drops the frame when nothing makes room
+    assert not frames.put({"n": 2}, timeout=0.05)
+    assert frames.stats()["dropped_newest"] == 1
+
+    putter = threading.Thread(target=frames.put, args=({"n": 3},), daemon=True)
+    putter.start()
+    putter.join(0.1)
+    assert putter.is_alive()
+    assert frames.get()["n"] == 0
+    putter.join(1)
+    assert not putter.is_alive()
+    assert _drain(frames) == [1, 3]
+
+
+def test_drop_oldest():
+    frames = FrameQueue(3, "drop_oldest")
+    assert _fill(frames, [0] * 5) == [True] * 5
+    assert _drain(frames) == [2, 3, 4]
+    assert frames.stats()["dropped_oldest"] == 2
+
+
+def test_drop_newest():
+    frames = FrameQueue(3, "drop_newest")
+    assert _fill(frames, [0] * 5) == [True, True, True, False, False]
+    assert _drain(frames) == [0, 1, 2]
+    assert frames.stats()["dropped_newest"] == 2
+
+
+def test_faces_only():
+    frames = FrameQueue(3, "faces_only")
+    # Frames 1 and 3 have no faces and make room first; then, with only
+    # faces queued, faceless frame 5 is dropped and face frame 6 evicts 0
+    assert _fill(frames, [1, 0, 1, 0, 1, 0, 1]) \
+        == [True, True, True, True, True, False, True]
+    assert _drain(frames) == [2, 4, 6]
+    assert frames.dropped() == 4
+
+
+def test_get_after_close():
+    frames = FrameQueue(2)
+    frames.put({"n": 0})
+    frames.close()
+    with pytest.raises(ValueError):
+        frames.put({"n": 1})
+    assert frames.get()["n"] == 0
+    with pytest.raises(queue.Empty):
+        frames.get()
+
+
+def test_rejects_bad_arguments():
+    with pytest.raises(ValueError):
+        FrameQueue(0)
+    with pytest.raises(ValueError):
+        FrameQueue(2, "drop_random")
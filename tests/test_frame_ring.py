@@ -0,0 +1,125 @@
+import gc
+import threading
+
+import numpy as np
+import pytest
+
+from smartspace.frame_ring import FrameRing, shared_array
+from smartspace.pipeline import CaptureProcess
+from smartspace.sources import FrameSource
+
+
+@pytest.fixture
+def ring():
+    ring = FrameRing(3, [((4, 4), "uint8"), ((2, 2), "float32")])
+    yield ring
+    gc.collect()
+    ring.close()
+
+
+def _free(ring):
+    """Takes every free slot; returns their numbers."""
+    slots = []
+    while True:
+        slot = ring.acquire(timeout=0)
+        if slot is None:
+            return sorted(slots)
+        slots.append(slot)
+
+
+def test_tracked_views_free_their_slot(ring):
+    assert _free(ring) == [0, 1, 2]
+    frame, detect = ring.arrays(1, track=True)
+    assert (frame.shape, detect.dtype) == ((4, 4), np.float32)
+    # A view derived from the planes keeps the slot too
+    corner = frame[:2, :2]
+    del frame, detect
+    assert ring.acquire(timeout=0.01) is None
+    del corner
+    assert ring.acquire(timeout=0) == 1
+
+
+def test_locate_finds_arrays_in_the_ring(ring):
+    frame, detect = ring.arrays(2)
+    frame[:] = 7
+    name, offset, shape, dtype = ring.locate(frame)
+    assert offset == 2 * ring.slot_bytes
+    np.testing.assert_array_equal(shared_array(name, offset, shape, dtype), frame)
+    assert ring.locate(detect)[1] % 4096 == 0
+    assert ring.locate(np.zeros((4, 4), np.uint8)) is None
+    # Not contiguous, so not describable by an offset
+    assert ring.locate(frame[:, :2]) is None
+
+
+class _Counting(FrameSource):
+    """Frames filled with their number; fails on frame fail_at."""
+
+    def __init__(self, count, fail_at=None):
+        super().__init__()
+        self.count = count
+        self.fail_at = fail_at
+
+    def _read(self):
+        if self.frames == self.fail_at:
+            raise RuntimeError("camera gone")
+        if self.frames == self.count:
+            raise EOFError
+        return np.full((4, 4), self.frames, np.uint8), None
+
+
+def _capture(ring, source):
+    """Reads every frame of a CaptureProcess, dropping each before the
+    next; returns the frame numbers. Fails instead of hanging if slots
+    were not given back."""
+    seen = []
+
+    def run():
+        with CaptureProcess(source, ring) as capture:
+            try:
+                while True:
+                    capture.wait()
+                    seen.append(int(capture.read()[0][0, 0]))
+            except EOFError:
+                pass
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(20)
+    assert not thread.is_alive()
+    return seen
+
+
+def test_capture_reuses_slots():
+    ring = FrameRing(2, [((4, 4), "uint8")])
+    try:
+        # More frames than slots: each read frame's slot comes back
+        assert _capture(ring, _Counting(8)) == list(range(8))
+        assert _free(ring) == [0, 1]
+    finally:
+        ring.close()
+
+
+def test_capture_error_gives_slots_back():
+    ring = FrameRing(2, [((4, 4), "uint8")])
+    try:
+        assert _capture(ring, _Counting(8, fail_at=3)) == [0, 1, 2]
+        # Including the slot taken for the read that failed
+        assert _free(ring) == [0, 1]
+    finally:
+        ring.close()
+
+
+def test_close_gives_unread_slots_back():
+    ring = FrameRing(3, [((4, 4), "uint8")])
+    try:
+        capture = CaptureProcess(_Counting(100), ring).start()
+        capture.wait()
+        held = capture.read()
+        # The other slots fill with frames that are never read
+        capture.wait()
+        capture.close()
+        assert _free(ring) == [1, 2]
+        del held
+        assert _free(ring) == [0]
+    finally:
+        ring.close()
@@ -0,0 +1,57 @@
+import json
+import socket
+import struct
+import threading
+
+import numpy as np
+import pytest
+
+from vdms import framing, queryMessage_pb2
+
+
+def _frame(query, blobs=None):
+    return b"".join(bytes(b) for b in framing.encode_message(query, blobs))
+
+
+def test_encode_matches_protobuf():
+    query = [{"AddImage": {"properties": {"ID": "ss1"}}}]
+    blobs = [b"\xff\xd8\xff" + bytes(100), bytes(range(256)) * 1000]
+    frame = _frame(query, [blobs])
+
+    message = queryMessage_pb2.queryMessage()
+    message.ParseFromString(frame[4:])
+    assert json.loads(message.json) == query
+    assert list(message.blobs) == blobs
+    assert struct.unpack("@I", frame[:4])[0] == len(frame) - 4
+
+
+def test_parse_round_trip_without_copies():
+    image = np.arange(3 * 4 * 3, dtype=np.uint8).reshape(3, 4, 3)
+    frame = bytearray(_frame({"q": 1}, [image, b"", memoryview(b"abc")]))
+    text, blobs = framing.parse_message(memoryview(frame)[4:])
+
+    assert json.loads(text) == {"q": 1}
+    assert [bytes(b) for b in blobs] == [image.tobytes(), b"", b"abc"]
+    # Blobs are views of the receive buffer
+    assert all(b.obj is frame for b in blobs)
+
+
+def test_truncated_message():
+    frame = _frame({"q": 1}, [bytes(64)])
+    with pytest.raises((ValueError, IndexError)):
+        framing.parse_message(memoryview(frame)[4:-10])
+
+
+def test_send_and_receive_over_a_socket():
+    a, b = socket.socketpair()
+    blobs = [bytes([i]) * (200_000 + i) for i in range(3)]
+    sender = threading.Thread(target=framing.send_message,
+                              args=(a, {"q": "x"}, [blobs]))
+    sender.start()
+    text, received = framing.recv_message(b)
+    sender.join()
+    a.close()
+    b.close()
+
+    assert json.loads(text) == {"q": "x"}
+    assert [bytes(r) for r in received] == blobs
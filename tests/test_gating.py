@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from smartspace.gating import CaptureGate, MotionDetector
+
+
+def _run(gate, faces):
+    kept = []
+    for n, f in enumerate(faces):
+        kept += [(item["n"], item["gate"])
+                 for item in gate.offer({"n": n}, faces=f, now=float(n))]
+    return kept
+
+
+def test_faceless_face_faceless():
+    gate = CaptureGate("faces", pre_roll=2, post_roll=2, heartbeat=10)
+    faces = [0] * 5 + [1, 1] + [0] * 13
+    assert _run(gate, faces) == [
+        (0, "heartbeat"),
+        # Frames 1 and 2 fell out of the two-frame ring
+        (3, "pre_roll"), (4, "pre_roll"), (5, "event"), (6, "event"),
+        (7, "post_roll"), (8, "post_roll"),
+        # Ten seconds after the last kept frame
+        (18, "heartbeat"),
+    ]
+    stats = gate.stats()
+    assert (stats["offered"], stats["kept_event"], stats["kept_pre_roll"],
+            stats["kept_post_roll"], stats["kept_heartbeat"]) == (20, 2, 2, 2, 2)
+    # Frame 19 is still held as pre-roll
+    assert stats["skipped"] == 20 - 8 - 1
+
+
+def test_heartbeat_off_keeps_only_events():
+    gate = CaptureGate("faces", pre_roll=0, post_roll=1, heartbeat=0)
+    assert _run(gate, [0, 0, 1, 0, 0]) == [(2, "event"), (3, "post_roll")]
+
+
+def test_off_keeps_everything():
+    gate = CaptureGate("off")
+    assert _run(gate, [0, 1, 0]) == [(0, "all"), (1, "all"), (2, "all")]
+
+
+def test_motion_events():
+    gate = CaptureGate("motion", motion_threshold=5, pre_roll=0, post_roll=0,
+                       heartbeat=0)
+    assert gate.offer({}, faces=1, motion=1) == []
+    assert gate.offer({}, faces=0, motion=5) == [{"gate": "event"}]
+    assert CaptureGate("any").is_event(1, 0)
+
+
+def test_motion_score():
+    motion = MotionDetector(size=(8, 8))
+    still = np.zeros((32, 32, 3), np.uint8)
+    assert motion.score(still) == 0.0
+    assert motion.score(still) == 0.0
+    assert motion.score(still + 40) == pytest.approx(40)
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        CaptureGate("sometimes")
@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from smartspace import landmarks
+
+
+def _result(faces, n=478, blendshapes=52, seed=0):
+    rng = np.random.default_rng(seed)
+    points = rng.uniform(-0.2, 1.2, (faces, n, 3))
+    scores = rng.uniform(0, 1, (faces, blendshapes))
+    return SimpleNamespace(
+        face_landmarks=[[SimpleNamespace(x=x, y=y, z=z) for x, y, z in face]
+                        for face in points],
+        face_blendshapes=[[SimpleNamespace(index=i, score=s) for i, s in enumerate(face)]
+                          for face in scores],
+        facial_transformation_matrixes=[rng.normal(size=(4, 4)) for _ in range(faces)],
+    ), points, scores
+
+
+@pytest.mark.parametrize("dtype, tolerance", [("float16", 1e-3), ("float32", 1e-6)])
+def test_round_trip(dtype, tolerance):
+    result, points, scores = _result(2)
+    packed = landmarks.encode_result(result, dtype)
+    arrays = landmarks.decode(packed)
+
+    assert arrays["landmarks"].shape == (2, 478, 3)
+    assert arrays["blendshapes"].shape == (2, 52)
+    assert arrays["matrices"].shape == (2, 4, 4)
+    # float16 keeps 11 significant bits: under 1e-3 for values below 2
+    assert np.abs(arrays["landmarks"] - points).max() < tolerance
+    assert np.abs(arrays["blendshapes"] - scores).max() < tolerance
+    np.testing.assert_allclose(
+        arrays["matrices"],
+        np.array(result.facial_transformation_matrixes, np.float32))
+
+
+def test_float16_is_compact():
+    result, _, _ = _result(1)
+    assert len(landmarks.encode_result(result)) < 3200
+
+
+def test_no_faces():
+    for result in (None, SimpleNamespace(face_landmarks=[], face_blendshapes=[],
+                                         facial_transformation_matrixes=[])):
+        packed = landmarks.encode_result(result)
+        assert len(packed) == 12
+        arrays = landmarks.decode(packed)
+        assert arrays["landmarks"].shape[0] == 0
+        assert arrays["blendshapes"].shape[0] == 0
+        assert arrays["matrices"].shape == (0, 4, 4)
+
+
+def test_base64_round_trip():
+    result, points, _ = _result(1, n=5, blendshapes=0)
+    arrays = landmarks.decode_b64(landmarks.encode_result_b64(result))
+    assert np.abs(arrays["landmarks"] - points).max() < 1e-3
+
+
+def test_rejects_other_data():
+    with pytest.raises(ValueError):
+        landmarks.decode(b"XXXX" + bytes(8))
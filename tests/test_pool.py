@@ -0,0 +1,97 @@
+import socket
+import time
+
+import pytest
+
+from bench import vdms_standin
+from vdms.vdms_pool import vdms_pool
+
+FIND = [{"FindImage": {"results": {"count": ""}, "blob": False}}]
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _servers(*servers):
+    return [f"127.0.0.1:{s.server_address[1]}" for s in servers]
+
+
+def test_spreads_queries_over_servers(standin):
+    other = vdms_standin.start("127.0.0.1", 0)
+    pool = vdms_pool(_servers(standin, other), health_interval=0)
+    try:
+        assert pool.connect() == 2
+        for _ in range(10):
+            response, _ = pool.query(FIND)
+            assert response[0]["FindImage"]["status"] == 0
+        assert [s["queries"] for s in pool.status()] == [5, 5]
+    finally:
+        pool.close()
+        other.shutdown()
+        other.server_close()
+
+
+def test_fails_over_when_a_connection_breaks(standin):
+    other = vdms_standin.start("127.0.0.1", 0)
+    pool = vdms_pool(_servers(standin, other), health_interval=0,
+                     policy="round_robin")
+    try:
+        pool.connect()
+        broken = pool.servers[0]
+        broken.client.conn.close()
+        for _ in range(4):
+            pool.query(FIND)
+
+        status = pool.status()
+        assert not status[0]["alive"] and status[0]["failures"] == 1
+        assert status[1]["queries"] == 4
+        assert broken.next_retry > time.monotonic()
+    finally:
+        pool.close()
+        other.shutdown()
+        other.server_close()
+
+
+def test_no_server_raises():
+    pool = vdms_pool([f"127.0.0.1:{_free_port()}"], health_interval=0,
+                     query_timeout=1)
+    assert pool.connect() == 0
+    with pytest.raises(ConnectionError):
+        pool.query(FIND)
+    pool.close()
+
+
+def test_backoff_doubles_up_to_the_limit():
+    pool = vdms_pool(["127.0.0.1:1"], health_interval=0, max_backoff=5)
+    s = pool.servers[0]
+    backoffs = []
+    for _ in range(5):
+        pool._mark_dead(s, "down")
+        backoffs.append(s.backoff)
+    assert backoffs == [1, 2, 4, 5, 5]
+    assert s.failures == 5
+
+
+def test_health_check_brings_a_server_back():
+    port = _free_port()
+    pool = vdms_pool([f"127.0.0.1:{port}"], health_interval=0.05,
+                     query_timeout=1)
+    server = None
+    try:
+        assert pool.connect() == 0
+        server = vdms_standin.start("127.0.0.1", port)
+        pool.servers[0].next_retry = 0.0
+        deadline = time.monotonic() + 5
+        while not pool.servers[0].alive and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert pool.servers[0].alive
+        response, _ = pool.query(FIND)
+        assert response[0]["FindImage"]["status"] == 0
+    finally:
+        pool.close()
+        if server is not None:
+            server.shutdown()
+            server.server_close()
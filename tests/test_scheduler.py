@@ -0,0 +1,50 @@
+import time
+
+import pytest
+
+from smartspace.scheduler import CaptureScheduler
+
+
+def _on_grid(t, period, phase):
+    # Within float precision of a wall-clock time, about 1e-7 s
+    k = round((t - phase) / period)
+    return abs(t - (k * period + phase)) < 1e-5
+
+
+def test_ticks_fall_on_the_wall_clock_grid():
+    scheduler = CaptureScheduler(fps=50, phase=0.007)
+    ticks = []
+    for _ in range(5):
+        tick, jitter = scheduler.wait()
+        assert time.time() >= tick and jitter >= 0
+        ticks.append(tick)
+
+    assert all(_on_grid(t, 0.02, 0.007) for t in ticks)
+    assert [round((b - a) / 0.02) for a, b in zip(ticks, ticks[1:])] == [1] * 4
+    assert scheduler.stats()["ticks"] == 5
+
+
+def test_overrun_skips_missed_ticks():
+    scheduler = CaptureScheduler(fps=50)
+    first, _ = scheduler.wait()
+    time.sleep(0.1)
+    tick, _ = scheduler.wait()
+    assert tick > time.time() - 0.02
+    assert scheduler.skipped == round((tick - first) / 0.02) - 1 >= 4
+
+
+def test_overrun_catches_up_a_few_ticks():
+    scheduler = CaptureScheduler(fps=50, policy="catch_up", max_catch_up=2)
+    first, _ = scheduler.wait()
+    time.sleep(0.1)
+    ticks = [scheduler.wait()[0] for _ in range(3)]
+    # Two overdue ticks fire at once, then the rest are skipped
+    assert [round((t - first) / 0.02) for t in ticks[:2]] == [1, 2]
+    assert scheduler.caught_up == 2 and scheduler.skipped >= 2
+
+
+def test_rejects_bad_settings():
+    with pytest.raises(ValueError):
+        CaptureScheduler(fps=0)
+    with pytest.raises(ValueError):
+        CaptureScheduler(fps=10, policy="bogus")
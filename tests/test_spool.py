@@ -0,0 +1,191 @@
+import os
+import threading
+import time
+
+import vdms
+from smartspace.frame_queue import FrameQueue
+from smartspace.spool import Spool
+from smartspace.uploader import BatchUploader
+
+
+class _RejectingDB(object):
+    """Answers every transaction like VDMS rejecting its first command."""
+
+    def __init__(self, response=None):
+        self.response = response
+        self.calls = 0
+
+    def query(self, query, blob_array=None):
+        self.calls += 1
+        if self.response is not None:
+            return self.response, []
+        return [{"AddImage": {"status": -1, "info": "bad image"}}] \
+            + [{"AddImage": {"status": 0}}] * (len(query) - 1), []
+
+
+def _fill(spool, n, start=0, size=100):
+    for i in range(start, start + n):
+        spool.append({"i": i}, bytes([i % 256]) * size)
+
+
+def _frames(tmp_path, n):
+    spool = Spool(str(tmp_path))
+    for i in range(n):
+        spool.append({"props": {"ID": "ss1", "Tick": i}, "format": "jpg"}, b"\xff\xd8\xff")
+    return spool
+
+
+def _ids(records):
+    return [meta["i"] for meta, _ in records]
+
+
+def test_reads_in_order_and_acks(tmp_path):
+    spool = Spool(str(tmp_path), segment_bytes=1000)
+    _fill(spool, 25)
+    assert spool.stats()["segments"] > 1
+
+    seen = []
+    while spool.pending:
+        records, token = spool.read_batch(4, 1 << 20, timeout=0)
+        assert bytes(records[0][1]) == bytes([records[0][0]["i"]]) * 100
+        seen += _ids(records)
+        spool.ack(token)
+    assert seen == list(range(25))
+    assert spool.stats()["acked"] == 25
+    spool.close()
+
+
+def test_unacked_batch_is_read_again(tmp_path):
+    spool = Spool(str(tmp_path))
+    _fill(spool, 5)
+    first, _ = spool.read_batch(3, 1 << 20, timeout=0)
+    again, token = spool.read_batch(3, 1 << 20, timeout=0)
+    assert _ids(first) == _ids(again) == [0, 1, 2]
+    spool.ack(token)
+    rest, _ = spool.read_batch(3, 1 << 20, timeout=0)
+    assert _ids(rest) == [3, 4]
+    spool.close()
+
+
+def test_recovers_from_cursor_after_a_crash(tmp_path):
+    spool = Spool(str(tmp_path), segment_bytes=1000)
+    _fill(spool, 12)
+    records, token = spool.read_batch(5, 1 << 20, timeout=0)
+    spool.ack(token)
+    # Crash: no close(), and the last record is cut short
+    spool._writer.flush()
+    last = spool._segments[-1].path
+    with open(last, "r+b") as f:
+        f.truncate(os.path.getsize(last) - 10)
+
+    spool = Spool(str(tmp_path), segment_bytes=1000)
+    assert spool.pending == 6
+    records, token = spool.read_batch(100, 1 << 20, timeout=0)
+    assert _ids(records) == list(range(5, 11))
+
+    # New records go to a fresh segment, after the surviving ones
+    _fill(spool, 2, start=100)
+    spool.ack(token)
+    records, _ = spool.read_batch(100, 1 << 20, timeout=0)
+    assert _ids(records) == [100, 101]
+    spool.close()
+
+
+def test_budget_evicts_oldest_segments(tmp_path):
+    spool = Spool(str(tmp_path), segment_bytes=1000, max_bytes=3000)
+    _fill(spool, 60)
+    stats = spool.stats()
+    assert stats["bytes"] <= 3000
+    assert stats["evicted"] > 0
+    assert stats["pending"] == 60 - stats["evicted"]
+
+    records, _ = spool.read_batch(100, 1 << 20, timeout=0)
+    assert _ids(records) == list(range(60 - len(records), 60))
+    spool.close()
+
+
+def test_ack_after_eviction_counts_each_record_once(tmp_path):
+    # Three 328-byte records per segment, three segments within budget
+    spool = Spool(str(tmp_path), segment_bytes=1000, max_bytes=3000)
+    _fill(spool, 9, size=300)
+    records, token = spool.read_batch(5, 1 << 20, timeout=0)
+    assert _ids(records) == list(range(5))
+
+    # A fourth segment evicts the first while the batch is out
+    _fill(spool, 1, start=9, size=300)
+    assert spool.evicted == 3
+    spool.ack(token)
+    assert spool.acked == 2
+    assert spool.pending == 10 - 5
+
+    records, token = spool.read_batch(100, 1 << 20, timeout=0)
+    assert _ids(records) == list(range(5, 10))
+    spool.ack(token)
+    assert spool.pending == 0 and spool.acked == 7
+    spool.close()
+
+
+def test_drain_uploads_and_acks(tmp_path, standin):
+    spool = _frames(tmp_path, 20)
+    db = vdms.vdms()
+    db.connect("127.0.0.1", standin.server_address[1])
+    uploader = BatchUploader(db, FrameQueue(4), batch_size=8)
+    stop = threading.Event()
+    stop.set()
+    uploader.drain_spool(spool, stop, drain_timeout=5)
+    db.disconnect()
+
+    assert spool.pending == 0 and spool.acked == 20
+    assert len(standin.store.images) == 20
+    assert uploader.stats()["frames_sent"] == 20
+    spool.close()
+
+
+def test_rejected_batches_stay_in_the_spool(tmp_path):
+    for db in (_RejectingDB(), _RejectingDB({"status": -1, "info": "parse error"})):
+        spool = _frames(tmp_path / str(id(db)), 4)
+        errors = []
+        uploader = BatchUploader(db, FrameQueue(4), batch_size=8,
+                                 on_error=lambda batch, e: errors.append(e))
+        stop = threading.Event()
+        stop.set()
+        started = time.monotonic()
+        uploader.drain_spool(spool, stop, drain_timeout=1.5)
+
+        # Not acked, backed off (1 s) rather than retried in a tight loop,
+        # and neither dropped nor counted as sent
+        assert spool.pending == 4 and spool.acked == 0
+        assert db.calls == 2
+        assert 1.0 <= time.monotonic() - started < 3.0
+        assert uploader.rejected_batches == 2
+        assert uploader.frames_sent == 0 and not errors
+        spool.close()
+
+
+def test_poison_frame_is_set_aside(tmp_path, standin):
+    spool = Spool(str(tmp_path))
+    for i in range(20):
+        spool.append({"props": {"ID": "ss1", "Tick": i},
+                      "format": "bmp" if i == 5 else "jpg"}, bytes([i]))
+    db = vdms.vdms()
+    db.connect("127.0.0.1", standin.server_address[1])
+    uploader = BatchUploader(db, FrameQueue(4), batch_size=8)
+    stop = threading.Event()
+    stop.set()
+    uploader.drain_spool(spool, stop, drain_timeout=10, max_rejects=2)
+    db.disconnect()
+
+    # Retried once (after a 1 s backoff), then split down to the bad frame
+    assert spool.pending == 0
+    assert spool.stats()["set_aside"] == 1
+    ticks = [img[0]["Tick"] for img in standin.store.images]
+    assert sorted(ticks) == [i for i in range(20) if i != 5]
+
+    # The dead letter file reads back as a spool segment
+    os.makedirs(tmp_path / "dead")
+    os.replace(tmp_path / "dead_letter.seg", tmp_path / "dead" / "000000000000.seg")
+    dead = Spool(str(tmp_path / "dead"))
+    records, _ = dead.read_batch(10, 1 << 20, timeout=0)
+    assert [(meta["props"]["Tick"], bytes(blob)) for meta, blob in records] == [(5, b"\x05")]
+    spool.close()
+    dead.close()
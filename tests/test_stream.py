@@ -0,0 +1,26 @@
+import json
+import socket
+import threading
+
+from vdms import framing
+
+
+def test_stream_saves_and_skips_blobs(tmp_path):
+    a, b = socket.socketpair()
+    blobs = [b"one", b"two" * 1000, b"three"]
+    sender = threading.Thread(target=framing.send_message,
+                              args=(a, {"q": "y"}, blobs))
+    sender.start()
+    text, stream = framing.recv_stream(b, chunk_size=64)
+    paths = [str(tmp_path / "0"), None, str(tmp_path / "2")]
+    with stream:
+        saved = stream.save(lambda i: paths[i])
+    sender.join()
+    a.close()
+    b.close()
+
+    assert json.loads(text) == {"q": "y"}
+    assert saved == [(paths[0], 3), (paths[2], 5)]
+    assert (tmp_path / "0").read_bytes() == b"one"
+    assert (tmp_path / "2").read_bytes() == b"three"
+    assert stream.count == 3 and stream.done
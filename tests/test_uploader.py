@@ -0,0 +1,50 @@
+import time
+
+import pytest
+
+import vdms
+from smartspace.frame_queue import FrameQueue
+from smartspace.uploader import BatchUploader, batch_report, build_batch_query, rejected
+
+
+def test_rejected():
+    assert rejected([{"AddImage": {"status": 0}}] * 2) == []
+    assert rejected([{"AddImage": {"status": 0}}, {"AddImage": {"status": -1}}]) \
+        == [{"AddImage": {"status": -1}}]
+    assert rejected({"status": -1, "info": "parse error"}) \
+        == [{"status": -1, "info": "parse error"}]
+
+
+def test_report_of_a_transaction_rejected_whole():
+    batch = [{"props": {}, "image": b"x", "queued_at": time.time()}] * 3
+    report = batch_report(batch, 3, 0.1, {"status": -1, "info": "parse error"})
+    assert report["failed_frames"] == 3
+    assert report["info"] == "parse error"
+
+
+def test_uploads_queued_frames_in_batches(standin):
+    frames = FrameQueue(32)
+    for i in range(19):
+        frames.put({"props": {"ID": "ss1", "Tick": i}, "format": "jpg",
+                    "image": b"\xff\xd8\xff" + bytes([i])})
+    frames.close()
+
+    db = vdms.vdms()
+    db.connect("127.0.0.1", standin.server_address[1])
+    reports = []
+    uploader = BatchUploader(db, frames, batch_size=8, batch_latency=10,
+                             on_batch=lambda *a: reports.append(batch_report(*a)))
+    uploader.run()
+    db.disconnect()
+
+    assert [r["frames"] for r in reports] == [8, 8, 3]
+    assert all(r["failed_frames"] == 0 for r in reports)
+    assert [img[0]["Tick"] for img in standin.store.images] == list(range(19))
+    assert uploader.stats()["frames_sent"] == 19
+
+
+def test_refuses_frames_vdms_cannot_store():
+    with pytest.raises(ValueError):
+        build_batch_query([{"props": {}, "format": None, "image": b"RIFF"}])
+    queries, _ = build_batch_query([{"props": {}, "image": b"x"}])
+    assert queries == [{"AddImage": {"properties": {}}}]
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from bench import vdms_standin
+from vdms.vdms_async import vdms_async
+
+
+def _find(tick):
+    return [{"FindImage": {"constraints": {"Tick": ["==", tick]},
+                           "results": {"list": ["Tick"]}}}]
+
+
+async def _connect(server, **kwargs):
+    db = vdms_async(**kwargs)
+    assert await db.connect("127.0.0.1", server.server_address[1])
+    return db
+
+
+def test_pipelined_responses_match_their_queries(standin):
+    async def main():
+        db = await _connect(standin, max_in_flight=4)
+        # Blobs of different sizes, so a response read out of step would
+        # be caught on its length as well as its content
+        adds = [([{"AddImage": {"format": "jpg", "properties": {"Tick": i}}}],
+                 [bytes([i]) * (1 + 997 * i % 5000)]) for i in range(20)]
+        await db.query_many(adds)
+
+        order = [7, 3, 19, 0, 12, 12, 5, 18, 1, 9]
+        futures, most = [], 0
+        for tick in order:
+            futures.append(await db.submit(_find(tick)))
+            most = max(most, db.in_flight())
+        results = await asyncio.gather(*futures)
+        await db.disconnect()
+        return adds, order, results, most
+
+    adds, order, results, most = asyncio.run(main())
+    for tick, (response, blobs) in zip(order, results):
+        assert response[0]["FindImage"]["entities"] == [{"Tick": tick}]
+        assert blobs == adds[tick][1]
+    assert 1 < most <= 4
+
+
+def test_in_flight_is_bounded():
+    server = vdms_standin.start("127.0.0.1", 0, latency=0.02)
+    try:
+        async def main():
+            db = await _connect(server, max_in_flight=2)
+            futures, most = [], 0
+            for tick in range(6):
+                futures.append(await db.submit(_find(tick)))
+                most = max(most, db.in_flight())
+            await asyncio.gather(*futures)
+            await db.disconnect()
+            return most
+
+        assert asyncio.run(main()) == 2
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_disconnect_fails_pending_queries():
+    server = vdms_standin.start("127.0.0.1", 0, latency=0.5)
+    try:
+        async def main():
+            db = await _connect(server)
+            future = await db.submit(_find(0))
+            await db.disconnect()
+            with pytest.raises(ConnectionError):
+                await future
+            with pytest.raises(ConnectionError):
+                await db.submit(_find(0))
+
+        asyncio.run(main())
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -1,3 +1,5 @@
 name = "vdms"
 
 from .vdms import *
+from .vdms_async import vdms_async
+from .vdms_pool import vdms_pool
@@ -0,0 +1,362 @@
+"""Zero-copy framing of queryMessage protobufs on a VDMS connection.
+
+A frame on the wire is a native 4-byte length followed by a serialized
+queryMessage { string json = 1; repeated bytes blobs = 2; }. The message is
+simple enough to encode and decode by hand, which lets us send image blobs
+straight from the caller's buffers with scatter-gather I/O and hand
+response blobs back as memoryview slices of a single receive buffer,
+instead of copying every blob into and out of protobuf objects.
+
+For large retrievals recv_stream() goes further and does not hold the
+response at all: its BlobStream reads the blobs off the socket one at a
+time as they are consumed.
+"""
+
+import ssl
+import json
+import struct
+
+# Linux IOV_MAX; sendmsg() rejects longer buffer lists
+_IOV_MAX = 1024
+# Pieces below this are coalesced before going through TLS, which has no
+# sendmsg() and would otherwise emit one record per protobuf tag
+_COALESCE = 64 * 1024
+
+_JSON_TAG = b"\x0a"  # field 1, length delimited
+_BLOB_TAG = b"\x12"  # field 2, length delimited
+
+
+def _varint(n):
+    out = bytearray()
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def _as_bytes_view(b):
+    mv = memoryview(b)
+    if mv.ndim != 1 or mv.format != "B":
+        mv = mv.cast("B")
+    return mv
+
+
+def flatten_blobs(blob_array):
+    """Accepts both a "list of lists" and a flat "list", like vdms.query()."""
+    blobs = []
+    for im in blob_array or []:
+        if isinstance(im, list):
+            blobs.extend(im)
+        else:
+            blobs.append(im)
+    return blobs
+
+
+def encode_message(query, blob_array=None):
+    """Returns the buffers of one frame, referencing the blobs in place."""
+    if not isinstance(query, str):  # assumes json
+        query = json.dumps(query)
+    query = query.encode("utf-8")
+
+    buffers = []
+    size = 0
+    if query:
+        head = _JSON_TAG + _varint(len(query))
+        buffers += [head, query]
+        size += len(head) + len(query)
+    for b in flatten_blobs(blob_array):
+        mv = _as_bytes_view(b)
+        head = _BLOB_TAG + _varint(len(mv))
+        buffers += [head, mv]
+        size += len(head) + len(mv)
+
+    return [struct.pack("@I", size)] + buffers
+
+
+def send_message(conn, query, blob_array=None):
+    """Sends one frame, handling partial writes. Returns bytes sent."""
+    buffers = encode_message(query, blob_array)
+    total = sum(len(b) for b in buffers)
+    if isinstance(conn, ssl.SSLSocket):
+        _send_coalesced(conn, buffers)
+    else:
+        _sendmsg_all(conn, buffers)
+    return total
+
+
+def _sendmsg_all(conn, buffers):
+    buffers = [_as_bytes_view(b) for b in buffers if len(b)]
+    i = 0
+    while i < len(buffers):
+        sent = conn.sendmsg(buffers[i:i + _IOV_MAX])
+        while sent > 0:
+            n = len(buffers[i])
+            if sent >= n:
+                sent -= n
+                i += 1
+            else:
+                buffers[i] = buffers[i][sent:]
+                sent = 0
+
+
+def _send_coalesced(conn, buffers):
+    small = bytearray()
+    for b in buffers:
+        if len(b) < _COALESCE:
+            small += b
+            continue
+        if small:
+            conn.sendall(small)
+            small = bytearray()
+        conn.sendall(b)
+    if small:
+        conn.sendall(small)
+
+
+def recv_exact_into(conn, view):
+    """Fills view completely from conn. Raises ConnectionError on EOF."""
+    got = 0
+    n = len(view)
+    while got < n:
+        k = conn.recv_into(view[got:], n - got)
+        if k == 0:
+            raise ConnectionError("VDMS connection closed by peer")
+        got += k
+
+
+def recv_message(conn, buffer=None):
+    """Receives one frame and returns (json string, list of blob memoryviews).
+
+    The frame is read with recv_into() into a single buffer allocated for
+    its exact size, or into buffer if one is passed and large enough; the
+    returned blobs are slices of that buffer, so a reused buffer must not
+    be refilled while they are still needed.
+    """
+    header = bytearray(4)
+    recv_exact_into(conn, memoryview(header))
+    n = struct.unpack("@I", header)[0]
+
+    if buffer is None or len(buffer) < n:
+        buffer = bytearray(n)
+    view = memoryview(buffer)[:n]
+    recv_exact_into(conn, view)
+    return parse_message(view)
+
+
+def _read_varint(view, pos):
+    result = 0
+    shift = 0
+    while True:
+        b = view[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return result, pos
+        shift += 7
+
+
+def parse_message(view):
+    """Decodes a serialized queryMessage without copying the blobs."""
+    view = _as_bytes_view(view)
+    json_str = ""
+    blobs = []
+    pos = 0
+    end = len(view)
+    while pos < end:
+        key, pos = _read_varint(view, pos)
+        field, wire = key >> 3, key & 0x07
+        if wire == 2:
+            length, pos = _read_varint(view, pos)
+            chunk = view[pos:pos + length]
+            pos += length
+            if field == 1:
+                json_str = str(chunk, "utf-8")
+            elif field == 2:
+                blobs.append(chunk)
+        elif wire == 0:
+            _, pos = _read_varint(view, pos)
+        elif wire == 1:
+            pos += 8
+        elif wire == 5:
+            pos += 4
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire}")
+    if pos != end:
+        raise ValueError("Truncated queryMessage")
+    return json_str, blobs
+
+
+class _StreamReader(object):
+    """Reads a known number of bytes from conn, small pieces through a
+    read-ahead buffer and large ones straight into the caller's memory."""
+
+    def __init__(self, conn, remaining, readahead=64 * 1024):
+        self.conn = conn
+        self.remaining = remaining  # bytes of the frame not yet consumed
+        self._buf = bytearray(readahead)
+        self._pos = 0
+        self._end = 0
+
+    def _fill(self):
+        # Only called once the buffer is used up; never reads past the frame
+        k = self.conn.recv_into(self._buf, min(len(self._buf), self.remaining))
+        if k == 0:
+            raise ConnectionError("VDMS connection closed by peer")
+        self._pos = 0
+        self._end = k
+
+    def read_byte(self):
+        if self._pos == self._end:
+            self._fill()
+        b = self._buf[self._pos]
+        self._pos += 1
+        self.remaining -= 1
+        return b
+
+    def read_varint(self):
+        result = 0
+        shift = 0
+        while True:
+            b = self.read_byte()
+            result |= (b & 0x7F) << shift
+            if not b & 0x80:
+                return result
+            shift += 7
+
+    def read_into(self, view):
+        n = len(view)
+        buffered = min(n, self._end - self._pos)
+        view[:buffered] = self._buf[self._pos:self._pos + buffered]
+        self._pos += buffered
+        recv_exact_into(self.conn, view[buffered:])
+        self.remaining -= n
+
+    def skip(self, n, scratch):
+        while n > 0:
+            k = min(n, len(scratch))
+            self.read_into(scratch[:k])
+            n -= k
+
+
+class BlobStream(object):
+    """Iterates over the blobs of one response as they arrive.
+
+    Each blob is received into a single buffer that is reused (and grown to
+    the largest blob seen), so memory stays flat however many blobs the
+    response holds; a yielded memoryview is only valid until the next one
+    is requested. save() writes the blobs straight to files instead, in
+    pieces of chunk_size bytes. A stream must be exhausted, or close()d,
+    before the connection carries another query.
+    """
+
+    def __init__(self, reader, buffer=None, chunk_size: int = 1024 * 1024):
+        self._reader = reader
+        self._buffer = buffer if buffer is not None else bytearray(0)
+        self._scratch = memoryview(bytearray(chunk_size))
+        self._pending = None
+        self.json = ""
+        self.count = 0
+        self.nbytes = 0
+
+    @property
+    def done(self):
+        return self._pending is None and self._reader.remaining == 0
+
+    def _next_blob_length(self):
+        """Reads up to the next blob field; returns its length or None."""
+        if self._pending is not None:
+            length, self._pending = self._pending, None
+            return length
+        r = self._reader
+        while r.remaining > 0:
+            key = r.read_varint()
+            field, wire = key >> 3, key & 0x07
+            if wire == 2:
+                length = r.read_varint()
+                if field == 2:
+                    return length
+                if field == 1:
+                    raw = bytearray(length)
+                    r.read_into(memoryview(raw))
+                    self.json = raw.decode("utf-8")
+                else:
+                    r.skip(length, self._scratch)
+            elif wire == 0:
+                r.read_varint()
+            elif wire in (1, 5):
+                r.skip(8 if wire == 1 else 4, self._scratch)
+            else:
+                raise ValueError(f"Unsupported protobuf wire type {wire}")
+        return None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        length = self._next_blob_length()
+        if length is None:
+            raise StopIteration
+        if len(self._buffer) < length:
+            self._buffer = bytearray(length)
+        view = memoryview(self._buffer)[:length]
+        self._reader.read_into(view)
+        self.count += 1
+        self.nbytes += length
+        return view
+
+    def save(self, path_for):
+        """Writes every remaining blob to the file path_for(index) names,
+        or discards it where path_for returns None. Returns a list of
+        (path, size) of the blobs written."""
+        saved = []
+        while True:
+            length = self._next_blob_length()
+            if length is None:
+                return saved
+            path = path_for(self.count)
+            if path is None:
+                self._reader.skip(length, self._scratch)
+                self.count += 1
+                self.nbytes += length
+                continue
+            with open(path, "wb") as f:
+                left = length
+                while left > 0:
+                    piece = self._scratch[:min(left, len(self._scratch))]
+                    self._reader.read_into(piece)
+                    f.write(piece)
+                    left -= len(piece)
+            self.count += 1
+            self.nbytes += length
+            saved.append((path, length))
+
+    def close(self):
+        """Discards whatever is left of the response."""
+        self._pending = None
+        if self._reader.remaining > 0:
+            self._reader.skip(self._reader.remaining, self._scratch)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def recv_stream(conn, buffer=None, chunk_size: int = 1024 * 1024):
+    """Starts receiving one frame and returns (json string, BlobStream).
+
+    Only the frame header and the JSON are read here; VDMS serializes the
+    JSON before the blobs, which are then read one at a time as the
+    stream is consumed.
+    """
+    header = bytearray(4)
+    recv_exact_into(conn, memoryview(header))
+    n = struct.unpack("@I", header)[0]
+
+    stream = BlobStream(_StreamReader(conn, n), buffer, chunk_size)
+    # Reading up to the first blob's header gets the JSON; the stream
+    # resumes from that header
+    stream._pending = stream._next_blob_length()
+    return stream.json, stream
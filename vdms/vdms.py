@@ -38,6 +38,7 @@ from threading import Thread
 
 # VDMS Protobuf import (autogenerated)
 from . import queryMessage_pb2
+from . import framing
 
 
 class vdms(object):
@@ -56,6 +57,7 @@ class vdms(object):
         self.cert_file = client_cert_file
         self.key_file = client_key_file
         self.dataNotUsed = []
+        self.stream = None
         self.init_connection()
         self.last_response = ""
 
@@ -79,9 +81,11 @@ class vdms(object):
 
         self.connected = False
 
-    def connect(self, host="localhost", port=55555):
+    def connect(self, host="localhost", port=55555, timeout=None):
         if self.connected is False:
             self.init_connection()
+            if timeout is not None:
+                self.sock.settimeout(timeout)
 
             if self.use_tls:
                 context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
@@ -92,9 +96,10 @@ class vdms(object):
                     context.load_cert_chain(
                         certfile=self.cert_file, keyfile=self.key_file
                     )
-                self.sock.settimeout(
-                    5
-                )  # 5 seconds timeout as the server will hang if a tls client attempts to connect to a non-tls enabled server
+                # The server hangs when a TLS client connects to a non-TLS
+                # server, so the handshake is never left without a timeout;
+                # 5 seconds unless the caller gave one
+                self.sock.settimeout(5 if timeout is None else timeout)
                 self.conn = context.wrap_socket(self.sock, server_hostname=host)
             else:
                 self.conn = self.sock
@@ -121,21 +126,9 @@ class vdms(object):
 
     # Receives a json struct as a string
     def query(self, query, blob_array=None):
-        # Check the query type
-        if blob_array is None:
-            blob_array = []
-        if not isinstance(query, str):  # assumes json
-            query_str = json.dumps(query)
-        else:
-            query_str = query
-
         if not self.connected:
             return "NOT CONNECTED"
 
-        quer = queryMessage_pb2.queryMessage()
-        # quer has .json and .blob
-        quer.json = query_str
-
         # We allow both a "list of lists" or a "list"
         # to be passed as blobs.
         # This is because we originally forced a "list of lists",
@@ -143,41 +136,53 @@ class vdms(object):
         # But most of the apps pass a "list of list" as a param,
         # and we don't want to break backward-compatibility.
         # So we now allow both.
-        for im in blob_array:
-            if isinstance(im, list):
-                # extend will insert the entire list at the end
-                quer.blobs.extend(im)
-            else:
-                # append will just insert a single element at the end
-                quer.blobs.append(im)
-
-        # Serialize with protobuf and send
-        data = quer.SerializeToString()
-        sent_len = struct.pack("@I", len(data))  # send size first
-        self.conn.send(sent_len)
-        self.conn.send(data)
-
-        # Recieve response
-        recv_len = self.conn.recv(4)
-        recv_len = struct.unpack("@I", recv_len)[0]
-        response = b""
-        while len(response) < recv_len:
-            packet = self.conn.recv(recv_len - len(response))
-            if not packet:
-                return None
-            response += packet
-
-        querRes = queryMessage_pb2.queryMessage()
-        querRes.ParseFromString(response)
-
-        response_blob_array = []
-        for b in querRes.blobs:
-            response_blob_array.append(b)
-
-        self.last_response = json.loads(querRes.json)
+        self.finish_stream()
+        # The blobs are written straight from the caller's buffers with
+        # scatter-gather I/O rather than copied into a protobuf message.
+        framing.send_message(self.conn, query, blob_array)
+
+        # Recieve response into a single buffer; blobs come back as
+        # memoryview slices of it
+        try:
+            response, response_blob_array = framing.recv_message(self.conn)
+        except ConnectionError:
+            return None
+
+        self.last_response = json.loads(response)
 
         return (self.last_response, response_blob_array)
 
+    # Like query(), but returns (response, framing.BlobStream): the
+    # response blobs are received one at a time as the stream is iterated
+    # (or saved to files), into one reused buffer, so memory stays flat
+    # however many images a FindImage returns. The next query on this
+    # connection discards whatever the caller left unread.
+    def query_stream(self, query, blob_array=None, buffer=None):
+        if not self.connected:
+            return "NOT CONNECTED"
+
+        self.finish_stream()
+        framing.send_message(self.conn, query, blob_array)
+
+        try:
+            response, self.stream = framing.recv_stream(self.conn, buffer)
+        except ConnectionError:
+            return None
+
+        self.last_response = json.loads(response)
+
+        return (self.last_response, self.stream)
+
+    # Reads and discards the rest of an unfinished query_stream() response,
+    # keeping the connection in step with the server
+    def finish_stream(self):
+        if self.stream is not None:
+            try:
+                self.stream.close()
+            except ConnectionError:
+                self.connected = False
+            self.stream = None
+
     def get_last_response(self):
         return self.last_response
 
@@ -0,0 +1,185 @@
+import ssl
+import json
+import socket
+import struct
+import asyncio
+import collections
+
+from . import framing
+
+
+class vdms_async(object):
+    """asyncio client that keeps several queries in flight on one connection.
+
+    VDMS answers requests on a connection strictly in the order they were
+    received, so requests are written back to back without waiting for the
+    previous response, and a single reader task resolves the pending
+    futures first-in first-out. Throughput is then bounded by bandwidth
+    instead of one round trip per query.
+    """
+
+    def __init__(
+        self,
+        use_tls: bool = False,
+        ca_cert_file: str = "",
+        client_cert_file: str = "",
+        client_key_file: str = "",
+        max_in_flight: int = 8,
+    ):
+        self.reader = None
+        self.writer = None
+        self.connected = False
+        self.use_tls = use_tls
+        self.ca_file = ca_cert_file
+        self.cert_file = client_cert_file
+        self.key_file = client_key_file
+        self.max_in_flight = max_in_flight
+        self.last_response = ""
+        self._pending = collections.deque()
+        self._send_lock = None
+        self._slots = None
+        self._reader_task = None
+
+    async def connect(self, host="localhost", port=55555):
+        if self.connected is True:
+            print("Connection is already active")
+            return False
+
+        context = None
+        if self.use_tls:
+            context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+            context.minimum_version = ssl.TLSVersion.TLSv1_2
+            if self.ca_file != "":
+                context.load_verify_locations(cafile=self.ca_file)
+            if self.cert_file != "" and self.key_file != "":
+                context.load_cert_chain(
+                    certfile=self.cert_file, keyfile=self.key_file
+                )
+
+        # Same 5 second guard as the blocking client: the server hangs if a
+        # tls client attempts to connect to a non-tls enabled server
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(
+                host, port, ssl=context, server_hostname=host if context else None
+            ),
+            timeout=5 if self.use_tls else None,
+        )
+
+        sock = self.writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        self._send_lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._pending.clear()
+        self._reader_task = asyncio.get_running_loop().create_task(
+            self._read_responses()
+        )
+        self.connected = True
+        return True
+
+    async def disconnect(self):
+        if self.connected is False:
+            print("There is not an active connection")
+            return False
+
+        self.connected = False
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+            self._reader_task = None
+        self._fail_pending(ConnectionError("VDMS connection closed"))
+        return True
+
+    def is_connected(self):
+        return self.connected
+
+    def in_flight(self):
+        return len(self._pending)
+
+    async def submit(self, query, blob_array=None):
+        """Sends a query and returns a future for its (response, blobs) pair.
+
+        Waits only while max_in_flight requests are already outstanding, so
+        callers can keep the connection busy by submitting ahead of results.
+        """
+        if not self.connected:
+            raise ConnectionError("NOT CONNECTED")
+
+        buffers = framing.encode_message(query, blob_array)
+
+        await self._slots.acquire()
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        fut.add_done_callback(lambda _: self._slots.release())
+
+        async with self._send_lock:
+            # Appending and writing without an await in between keeps the
+            # pending queue in the same order as the bytes on the wire.
+            self._pending.append(fut)
+            try:
+                self.writer.writelines(buffers)
+                await self.writer.drain()
+            except (ConnectionError, OSError) as e:
+                self.connected = False
+                self._fail_pending(ConnectionError(f"VDMS connection lost: {e}"))
+                raise
+
+        return fut
+
+    async def query(self, query, blob_array=None):
+        fut = await self.submit(query, blob_array)
+        return await fut
+
+    async def query_many(self, queries):
+        """Pipelines a list of (query, blob_array) pairs, results in order."""
+        futs = [await self.submit(q, b) for q, b in queries]
+        return await asyncio.gather(*futs)
+
+    async def _read_responses(self):
+        try:
+            while True:
+                recv_len = await self.reader.readexactly(4)
+                recv_len = struct.unpack("@I", recv_len)[0]
+                response = await self.reader.readexactly(recv_len)
+
+                response, blobs = framing.parse_message(memoryview(response))
+                self.last_response = json.loads(response)
+
+                if not self._pending:
+                    continue
+                fut = self._pending.popleft()
+                if not fut.done():
+                    fut.set_result((self.last_response, blobs))
+        except asyncio.CancelledError:
+            raise
+        except (asyncio.IncompleteReadError, ConnectionError, OSError) as e:
+            self.connected = False
+            self._fail_pending(ConnectionError(f"VDMS connection lost: {e}"))
+        except Exception as e:
+            self.connected = False
+            self._fail_pending(e)
+
+    def _fail_pending(self, exc):
+        while self._pending:
+            fut = self._pending.popleft()
+            if not fut.done():
+                fut.set_exception(exc)
+
+    def get_last_response(self):
+        return self.last_response
+
+    def get_last_response_str(self):
+        return json.dumps(self.last_response, indent=4, sort_keys=False)
+
+    def print_last_response(self):
+        print(self.get_last_response_str())
+
@@ -0,0 +1,244 @@
+import time
+import select
+import threading
+
+from .vdms import vdms
+
+
+class _server(object):
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.client = None
+        self.lock = threading.Lock()
+        self.alive = False
+        self.outstanding = 0
+        self.queries = 0
+        self.failures = 0
+        self.last_error = ""
+        self.backoff = 0.0
+        self.next_retry = 0.0
+
+    def name(self):
+        return f"{self.host}:{self.port}"
+
+
+class vdms_pool(object):
+    """Holds one connection per VDMS server and spreads queries across them.
+
+    policy is "least_outstanding" (fewest queries in flight, ties rotated) or
+    "round_robin". A query that fails on one server marks it dead and is
+    retried on the next live one, and a background thread reconnects dead
+    servers with exponential backoff, so losing a server never blocks the
+    caller for longer than one query timeout.
+    """
+
+    def __init__(
+        self,
+        servers,
+        port: int = 55555,
+        policy: str = "least_outstanding",
+        health_interval: float = 5.0,
+        query_timeout: float = 30.0,
+        max_backoff: float = 60.0,
+        use_tls: bool = False,
+        ca_cert_file: str = "",
+        client_cert_file: str = "",
+        client_key_file: str = "",
+    ):
+        if policy not in ("least_outstanding", "round_robin"):
+            raise ValueError(f"Unknown load balancing policy: {policy}")
+
+        self.servers = []
+        for s in servers:
+            host, _, p = str(s).partition(":")
+            self.servers.append(_server(host, int(p) if p else port))
+        if not self.servers:
+            raise ValueError("vdms_pool needs at least one server")
+
+        self.policy = policy
+        self.health_interval = health_interval
+        self.query_timeout = query_timeout
+        self.max_backoff = max_backoff
+        self.use_tls = use_tls
+        self.ca_file = ca_cert_file
+        self.cert_file = client_cert_file
+        self.key_file = client_key_file
+
+        self._state_lock = threading.Lock()
+        self._next = 0
+        self._stop = threading.Event()
+        self._health_thread = None
+
+    def connect(self):
+        """Connects to every reachable server and starts health checking.
+
+        Returns the number of servers that are up. Unreachable servers are
+        retried in the background rather than raising here.
+        """
+        for s in self.servers:
+            with s.lock:
+                self._reconnect(s)
+
+        if self._health_thread is None and self.health_interval > 0:
+            self._stop.clear()
+            self._health_thread = threading.Thread(
+                target=self._health_loop, name="vdms-pool-health", daemon=True
+            )
+            self._health_thread.start()
+
+        return sum(1 for s in self.servers if s.alive)
+
+    def close(self):
+        self._stop.set()
+        if self._health_thread is not None:
+            self._health_thread.join()
+            self._health_thread = None
+        for s in self.servers:
+            with s.lock:
+                self._drop(s)
+
+    def query(self, query, blob_array=None):
+        """Runs a query on a live server, failing over until one succeeds.
+
+        Raises ConnectionError when no server could answer.
+        """
+        tried = set()
+        while True:
+            s = self._acquire(tried)
+            if s is None:
+                raise ConnectionError(
+                    "No VDMS server available: "
+                    + ", ".join(f"{x.name()} ({x.last_error})" for x in self.servers)
+                )
+            tried.add(s)
+            try:
+                if not s.alive and not self._reconnect(s):
+                    continue
+                try:
+                    result = s.client.query(query, blob_array)
+                except (OSError, ValueError) as e:
+                    self._mark_dead(s, e)
+                    continue
+                if not isinstance(result, tuple):
+                    # query() returns None on EOF and a string if the
+                    # connection was never established
+                    self._mark_dead(s, result or "connection closed")
+                    continue
+                s.queries += 1
+                return result
+            finally:
+                with self._state_lock:
+                    s.outstanding -= 1
+                s.lock.release()
+
+    def status(self):
+        return [
+            {
+                "server": s.name(),
+                "alive": s.alive,
+                "outstanding": s.outstanding,
+                "queries": s.queries,
+                "failures": s.failures,
+                "last_error": s.last_error,
+            }
+            for s in self.servers
+        ]
+
+    def _candidates(self, tried):
+        now = time.monotonic()
+        with self._state_lock:
+            live = [s for s in self.servers if s not in tried and s.alive]
+            if live:
+                # Rotate over the live servers only, so a dead one doesn't
+                # skew the share of its neighbour
+                k = self._next % len(live)
+                self._next += 1
+                live = live[k:] + live[:k]
+            if self.policy == "least_outstanding":
+                # sort() is stable, so equal loads keep the rotated order
+                live.sort(key=lambda s: s.outstanding)
+            # Dead servers whose backoff expired are tried last
+            dead = [
+                s for s in self.servers
+                if s not in tried and not s.alive and s.next_retry <= now
+            ]
+            return live + dead
+
+    def _acquire(self, tried):
+        candidates = self._candidates(tried)
+        if not candidates:
+            return None
+        # Prefer a server that is free right now; otherwise queue behind the
+        # best one rather than spinning.
+        for s in candidates:
+            if s.lock.acquire(blocking=False):
+                break
+        else:
+            s = candidates[0]
+            s.lock.acquire()
+        with self._state_lock:
+            s.outstanding += 1
+        return s
+
+    def _reconnect(self, s):
+        # Caller holds s.lock
+        self._drop(s)
+        try:
+            client = vdms(
+                use_tls=self.use_tls,
+                ca_cert_file=self.ca_file,
+                client_cert_file=self.cert_file,
+                client_key_file=self.key_file,
+            )
+            client.connect(s.host, s.port, timeout=self.query_timeout)
+        except (OSError, ValueError) as e:
+            self._mark_dead(s, e)
+            return False
+        s.client = client
+        s.alive = True
+        s.backoff = 0.0
+        s.last_error = ""
+        return True
+
+    def _drop(self, s):
+        if s.client is not None and s.client.is_connected():
+            try:
+                s.client.disconnect()
+            except OSError:
+                pass
+        s.client = None
+        s.alive = False
+
+    def _mark_dead(self, s, error):
+        self._drop(s)
+        s.failures += 1
+        s.last_error = str(error)
+        s.backoff = min(self.max_backoff, max(1.0, s.backoff * 2))
+        s.next_retry = time.monotonic() + s.backoff
+        print(f"VDMS server {s.name()} marked down: {s.last_error}")
+
+    def _probe(self, s):
+        # An idle connection should have nothing to read; readable means
+        # the server closed it (or sent garbage) and it can't be reused.
+        try:
+            readable, _, _ = select.select([s.client.conn], [], [], 0)
+        except (OSError, ValueError) as e:
+            self._mark_dead(s, e)
+            return
+        if readable:
+            self._mark_dead(s, "connection closed by server")
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_interval):
+            now = time.monotonic()
+            for s in self.servers:
+                if not s.lock.acquire(blocking=False):
+                    continue  # busy with a query, so evidently healthy
+                try:
+                    if s.alive:
+                        self._probe(s)
+                    elif s.next_retry <= now and self._reconnect(s):
+                        print(f"VDMS server {s.name()} is back up")
+                finally:
+                    s.lock.release()